@@ -0,0 +1,17 @@
+from django.urls import include, path, re_path
+
+from rest_framework_tus.async_views import AsyncUploadView
+from rest_framework_tus.views import UploadViewSet
+
+app_name = "rest_framework_tus"
+
+upload_view = AsyncUploadView.as_view()
+
+api_urlpatterns = [
+    re_path(r"^files/$", upload_view, name="upload-list"),
+    re_path(rf"^files/(?P<guid>{UploadViewSet.lookup_value_regex})/$", upload_view, name="upload-detail"),
+]
+
+urlpatterns = [
+    path(r"", include((api_urlpatterns, "rest_framework_tus"), namespace="api")),
+]
@@ -0,0 +1,250 @@
+import asyncio
+import functools
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
+from django.views import View
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from asgiref.sync import sync_to_async
+
+from . import settings as tus_settings
+from .cache import add_cached_head_headers, get_cached_head_headers
+from .parsers import TusUploadStreamParser
+from .views import UploadViewSet, get_head_headers, get_upload_lock_class, has_required_tus_header
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_upload_executor():
+    """
+    Returns the (process-wide) executor that reads, hashes and writes the chunks of the async views. It has
+      `TUS_ASYNC_WORKERS` threads, which bounds the amount of chunks that are written at the same time.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=tus_settings.TUS_ASYNC_WORKERS, thread_name_prefix="tus-upload")
+        return _executor
+
+
+class AsyncUploadView(View):
+    """
+    Async variant of `UploadViewSet`, for ASGI servers. HEAD and PATCH requests are handled on the event loop (the
+      upload is looked up in a thread, see `aget_object`), while the chunk is read, hashed and written by the executor
+      of `get_upload_executor`. The ASGI handler receives the request body before the view is called, so a slow client
+      doesn't occupy a thread while it's sending. POST, DELETE and OPTIONS requests are short, and are handled by
+      `viewset_class` in a thread.
+
+    Note that Django's ASGI handler spools the request body to a temporary file (kept in memory up to
+      `FILE_UPLOAD_MAX_MEMORY_SIZE` bytes) before the view is called. Large chunks are therefore written to disk twice:
+      once by the ASGI handler, and once to the chunk store. Keep the chunks of the clients small, or use the sync views
+      (under WSGI) to write large chunks straight from the request body.
+
+    When a request is cancelled (e.g. because the client disconnected) while its chunk is being written, the view waits
+      for the executor to finish writing before the upload lock is released.
+
+    Authentication, permissions, throttling and the other hooks (e.g. `validate_chunk`) are those of `viewset_class`.
+      Note that `validate_chunk` is called from the executor, so it shouldn't query the database.
+    """
+
+    viewset_class = UploadViewSet
+    http_method_names = ["post", "head", "patch", "delete", "options"]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # CSRF is enforced by the authentication classes of the viewset (like DRF does)
+        view.csrf_exempt = True
+        return view
+
+    def get_viewset(self, request, action):
+        """
+        Returns an initialized instance of `viewset_class` for the given action
+        """
+        viewset = self.viewset_class()
+        viewset.action_map = {request.method.lower(): action}
+        viewset.args = self.args
+        viewset.kwargs = self.kwargs
+        viewset.request = viewset.initialize_request(request, *self.args, **self.kwargs)
+        viewset.headers = viewset.default_response_headers
+        viewset.format_kwarg = None
+        return viewset
+
+    async def handle(self, request, action, handler):
+        viewset = self.get_viewset(request, action)
+        try:
+            await sync_to_async(viewset.initial)(viewset.request, *self.args, **self.kwargs)
+            response = await handler(viewset)
+        except Exception as e:
+            response = await sync_to_async(viewset.handle_exception)(e)
+        return viewset.finalize_response(viewset.request, response, *self.args, **self.kwargs)
+
+    async def delegate(self, request, actions):
+        """
+        Lets `viewset_class` handle the request, in a thread. Methods that aren't in `actions` aren't allowed.
+        """
+        view = self.viewset_class.as_view(dict(actions, options="options"))
+        return await sync_to_async(view)(request, *self.args, **self.kwargs)
+
+    async def aget_object(self, viewset):
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        try:
+            # `QuerySet.afirst` requires Django 4.1
+            upload = await sync_to_async(
+                queryset.filter(**{viewset.lookup_field: self.kwargs[lookup_url_kwarg]}).first
+            )()
+        except (TypeError, ValueError, DjangoValidationError):
+            upload = None
+        if upload is None:
+            raise Http404
+        await sync_to_async(viewset.check_object_permissions)(viewset.request, upload)
+        return upload
+
+    async def post(self, request, *args, **kwargs):
+        if self.kwargs:
+            return await self.delegate(request, {})
+        return await self.delegate(request, {"post": "create"})
+
+    async def delete(self, request, *args, **kwargs):
+        if not self.kwargs:
+            return await self.delegate(request, {})
+        return await self.delegate(request, {"delete": "destroy"})
+
+    async def options(self, request, *args, **kwargs):
+        return await self.delegate(request, {})
+
+    async def head(self, request, *args, **kwargs):
+        if not self.kwargs:
+            return await self.delegate(request, {})
+        return await self.handle(request, "info", self.info)
+
+    async def patch(self, request, *args, **kwargs):
+        if not self.kwargs:
+            return await self.delegate(request, {})
+        return await self.handle(request, "partial_update", self.partial_update)
+
+    async def info(self, viewset):
+        request = viewset.request
+
+        # Validate tus header
+        if not has_required_tus_header(request):
+            return Response('Missing "{}" header.'.format("Tus-Resumable"), status=status.HTTP_400_BAD_REQUEST)
+
+        # Try to answer from the cache, without touching the database
+        headers = None
+        if viewset.is_head_cache_enabled():
+            headers = await sync_to_async(get_cached_head_headers)(
+                self.kwargs[viewset.lookup_url_kwarg or viewset.lookup_field]
+            )
+
+        if headers is None:
+            try:
+                upload = await self.aget_object(viewset)
+            except Http404:
+                # Instead of simply trowing a 404, we need to add a cache-control header to the response
+                return Response("Not found.", headers={"Cache-Control": "no-store"}, status=status.HTTP_404_NOT_FOUND)
+
+            headers = get_head_headers(upload)
+            await sync_to_async(add_cached_head_headers)(upload, headers)
+
+        return Response(headers=dict(headers, **{"Cache-Control": "no-store"}), status=status.HTTP_200_OK)
+
+    async def partial_update(self, viewset):
+        request = viewset.request
+
+        # Validate tus header
+        if not has_required_tus_header(request):
+            return Response('Missing "{}" header.'.format("Tus-Resumable"), status=status.HTTP_400_BAD_REQUEST)
+
+        # Validate content type
+        if not viewset._is_valid_content_type(request):
+            return Response(
+                'Invalid value for "Content-Type" header: {}. Expected "{}".'.format(
+                    request.META["CONTENT_TYPE"],
+                    TusUploadStreamParser.media_type,
+                ),
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Retrieve object
+        upload = await self.aget_object(viewset)
+
+        # Final uploads are assembled from partial uploads, and can't be modified
+        if upload.is_final():
+            return Response("Unable to modify a final upload.", status=status.HTTP_403_FORBIDDEN)
+
+        # Chunks at different offsets are written concurrently, the extents are merged under a row lock
+        if viewset.is_parallel_writes_enabled(upload):
+            return await self.receive_chunk(viewset, upload)
+
+        # Make sure no other request modifies the upload in the meantime. The lock is acquired and released in the
+        #  thread of the request, as it might hold a database transaction.
+        lock = get_upload_lock_class(viewset)(upload)
+        await sync_to_async(lock.__enter__)()
+        exc_info = (None, None, None)
+        try:
+            response = await self.receive_chunk(viewset, upload)
+
+            # A completed upload can't be modified anymore
+            if upload.is_complete():
+                await sync_to_async(lock.discard)()
+
+            return response
+        except BaseException:
+            exc_info = sys.exc_info()
+            raise
+        finally:
+            await sync_to_async(lock.__exit__)(*exc_info)
+
+    async def receive_chunk(self, viewset, upload):
+        request = viewset.request
+
+        # Validate the request before reading the chunk
+        response = await sync_to_async(viewset.begin_chunk)(request, upload)
+        if response is not None:
+            return response
+
+        # Chunks that are received out of order are written in place, within the range they reserved
+        reservation = await sync_to_async(viewset.reserve_chunk)(request, upload)
+
+        try:
+            # Read, hash and write the chunk in the executor
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                get_upload_executor(), functools.partial(viewset.write_chunk, request, upload)
+            )
+            try:
+                num_bytes_written, checksum_matched, chunk_digest_hasher = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The executor can't be interrupted, make sure it's done before the lock (or reservation) is released
+                await self.wait_for_write(future)
+                raise
+            except Exception as e:
+                return await sync_to_async(viewset.handle_write_error)(request, upload, e)
+
+            return await sync_to_async(viewset.accept_chunk)(
+                request, upload, num_bytes_written, checksum_matched, chunk_digest_hasher, reservation=reservation
+            )
+        finally:
+            if reservation is not None:
+                await sync_to_async(upload.release_extent)(reservation)
+
+    @staticmethod
+    async def wait_for_write(future):
+        """
+        Waits for the `write_chunk` future of a cancelled request
+        """
+        while not future.done():
+            try:
+                await asyncio.wait({future})
+            except asyncio.CancelledError:
+                # Cancelled again, the write still has to finish
+                continue
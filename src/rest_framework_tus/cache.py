@@ -0,0 +1,91 @@
+import uuid
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import settings as tus_settings
+
+
+def get_head_cache():
+    """
+    Returns the cache that holds the HEAD response headers of uploads, or None if the HEAD cache is disabled
+    """
+    if not tus_settings.TUS_HEAD_CACHE:
+        return None
+    return caches[tus_settings.TUS_HEAD_CACHE]
+
+
+def get_head_cache_key(guid):
+    # Normalize the guid, so it doesn't matter how it was formatted in the URL
+    return f"rest_framework_tus:head:{uuid.UUID(str(guid))}"
+
+
+def get_cached_head_headers(guid):
+    """
+    Returns the cached HEAD response headers for the upload with the given guid
+
+    :param guid:
+    :return dict: The headers, or None if they are not cached
+    """
+    cache = get_head_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(get_head_cache_key(guid))
+    except ValueError:
+        # Not a valid guid
+        return None
+
+
+def set_cached_head_headers(upload, headers):
+    """
+    Caches the HEAD response headers for the given upload, until it expires
+
+    :param upload:
+    :param dict headers:
+    """
+    cache = get_head_cache()
+    if cache is None:
+        return
+
+    timeout = get_head_cache_timeout(upload)
+    if timeout <= 0:
+        cache.delete(get_head_cache_key(upload.guid))
+    else:
+        cache.set(get_head_cache_key(upload.guid), headers, timeout=timeout)
+
+
+def add_cached_head_headers(upload, headers):
+    """
+    Caches the HEAD response headers for the given upload, unless they're cached already. Used on a cache miss, as the
+      headers might have been read from the database before a concurrent PATCH request cached newer ones.
+
+    :param upload:
+    :param dict headers:
+    """
+    cache = get_head_cache()
+    if cache is None:
+        return
+
+    timeout = get_head_cache_timeout(upload)
+    if timeout > 0:
+        cache.add(get_head_cache_key(upload.guid), headers, timeout=timeout)
+
+
+def get_head_cache_timeout(upload):
+    timeout = tus_settings.TUS_HEAD_CACHE_TIMEOUT
+    if upload.expires:
+        timeout = min(timeout, (upload.expires - timezone.now()).total_seconds())
+    return timeout
+
+
+def delete_cached_head_headers(guid):
+    cache = get_head_cache()
+    if cache is not None:
+        cache.delete(get_head_cache_key(guid))
+
+
+def delete_cached_head_headers_many(guids):
+    cache = get_head_cache()
+    if cache is not None and guids:
+        cache.delete_many([get_head_cache_key(guid) for guid in guids])
@@ -0,0 +1,69 @@
+import zlib
+
+from . import tus_api_checksum_algorithms
+
+try:
+    import crc32c
+except ImportError:
+    crc32c = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Factories of the hash objects of the checksum algorithms that aren't provided by hashlib
+checksum_hasher_factories = {}
+
+
+class CRCHasher:
+    """
+    Hash object (like the ones of hashlib) for a CRC function with the signature of `zlib.crc32`
+    """
+
+    digest_size = 4
+
+    def __init__(self, name, function, value=0):
+        self.name = name
+        self.function = function
+        self.value = value
+
+    def update(self, data):
+        self.value = self.function(data, self.value)
+
+    def digest(self):
+        return self.value.to_bytes(self.digest_size, "big")
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+    def copy(self):
+        return self.__class__(self.name, self.function, self.value)
+
+
+def register_checksum_algorithm(name, factory):
+    """
+    Registers a checksum algorithm, which is advertised in the "Tus-Checksum-Algorithm" header
+
+    :param str name: The name of the algorithm, as used in the "Upload-Checksum" header
+    :param callable factory: Returns a new hash object (with the `update` and `hexdigest` methods of hashlib's)
+    """
+    checksum_hasher_factories[name] = factory
+    if name not in tus_api_checksum_algorithms:
+        tus_api_checksum_algorithms.append(name)
+
+
+def get_checksum_hasher_factory(name):
+    """
+    Returns the factory of a registered checksum algorithm, or None for the algorithms of hashlib
+    """
+    return checksum_hasher_factories.get(name)
+
+
+register_checksum_algorithm("crc32", lambda: CRCHasher("crc32", zlib.crc32))
+
+if crc32c is not None:
+    register_checksum_algorithm("crc32c", lambda: CRCHasher("crc32c", crc32c.crc32c))
+
+if xxhash is not None:
+    register_checksum_algorithm("xxh3", xxhash.xxh3_64)
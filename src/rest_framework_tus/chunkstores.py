@@ -0,0 +1,412 @@
+import io
+import os
+import tempfile
+from abc import ABCMeta, abstractmethod
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from . import settings as tus_settings
+from .cleanup import remove_file
+from .compat import storages
+from .durability import CHUNK, DurabilityPolicy
+from .filehandles import file_handle_cache
+from .utils import copy_file, open_direct, pwrite_buffers, write_buffers_to_file
+
+
+class AbstractChunkStore(metaclass=ABCMeta):
+    """
+    Holds the data of an upload while it is being received, until it is finalized by the save handler
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+
+    @classmethod
+    def create(cls, upload_model, guid, upload_length):
+        """
+        Prepares the store for a new upload
+
+        :param upload_model:
+        :param uuid.UUID guid:
+        :param int upload_length:
+        :return dict: The fields to set on the new upload
+        """
+        return {}
+
+    @classmethod
+    def discard(cls, guid, temporary_file_path):
+        """
+        Removes the data of an upload that has been deleted (without the upload itself)
+
+        :param uuid.UUID guid:
+        :param str temporary_file_path:
+        :return bool: Whether or not any data has been removed
+        """
+        return False
+
+    def prepare(self):
+        """
+        Makes sure the store can receive data, before a chunk is written
+        """
+        pass
+
+    def exists(self):
+        return True
+
+    @abstractmethod
+    def write(self, offset, buffers):
+        """
+        Writes an iterable of buffers, starting at the given offset
+
+        :param int offset:
+        :param iterable buffers:
+        :return int: The amount of bytes written
+        """
+        pass
+
+    @abstractmethod
+    def truncate(self, offset):
+        """
+        Rolls back the data that was written beyond the given offset
+        """
+        pass
+
+    def discard_chunk(self, offset):
+        """
+        Drops the data of a chunk that was written out of order at the given offset, but wasn't accepted. The ranges
+          that haven't been received are overwritten later on, so by default nothing needs to be done.
+        """
+        pass
+
+    @abstractmethod
+    def open(self):
+        """
+        Returns a file object to read the data of the upload from start to end
+        """
+        pass
+
+    def read(self, offset, length):
+        """
+        Reads at most `length` bytes of the written data, starting at the given offset
+
+        :param int offset:
+        :param int length:
+        :return bytes:
+        """
+        with self.open() as fh:
+            if fh.seekable():
+                fh.seek(offset)
+            else:
+                while offset > 0:
+                    skipped = len(fh.read(min(offset, tus_settings.TUS_STREAMING_BUFFER_SIZE)))
+                    if not skipped:
+                        break
+                    offset -= skipped
+            return fh.read(length)
+
+    @abstractmethod
+    def delete(self):
+        pass
+
+    def sync(self):
+        """
+        Flushes the written data to durable storage
+        """
+        pass
+
+    def close(self):
+        """
+        Releases the resources held for writing, no more data will be written
+        """
+        pass
+
+    def concatenate(self, partial_uploads):
+        """
+        Writes the data of the given (complete) partial uploads, one after the other. The upload_offset is left
+          untouched.
+
+        :param list partial_uploads:
+        :return int: The amount of bytes written
+        """
+        num_bytes_written = 0
+
+        for partial_upload in partial_uploads:
+            with partial_upload.get_chunk_store().open() as fh:
+                buffers = iter(lambda: fh.read(tus_settings.TUS_STREAMING_BUFFER_SIZE), b"")
+                num_bytes = self.write(num_bytes_written, buffers)
+            if num_bytes != partial_upload.upload_length:
+                raise ValueError(f"Data of partial upload {partial_upload.guid} is incomplete.")
+            num_bytes_written += num_bytes
+
+        return num_bytes_written
+
+
+class LocalFileChunkStore(AbstractChunkStore):
+    """
+    Writes the data to a temporary file on the local file system (default). Every request for an upload needs to be
+      handled by the node that holds its temporary file.
+    """
+
+    use_file_handle_cache = True
+
+    @classmethod
+    def create(cls, upload_model, guid, upload_length):
+        return {"temporary_file_path": upload_model.create_temporary_file(guid, upload_length)}
+
+    @classmethod
+    def discard(cls, guid, temporary_file_path):
+        return bool(temporary_file_path) and remove_file(temporary_file_path)
+
+    def prepare(self):
+        self.upload.get_or_create_temporary_file()
+
+    def exists(self):
+        return self.upload.temporary_file_exists()
+
+    def get_durability_policy(self):
+        return DurabilityPolicy()
+
+    def write(self, offset, buffers):
+        """
+        The written data is synced to disk according to the `TUS_DURABILITY` policy before this method returns. When
+          `TUS_FILE_HANDLE_CACHE_SIZE` is set, the temporary file is kept open for the next chunk. Aligned buffers are
+          written with O_DIRECT when `TUS_DIRECT_IO` is enabled.
+        """
+        path = self.upload.temporary_file_path
+
+        def complete(num_bytes):
+            return offset + num_bytes == self.upload.upload_length
+
+        options = {
+            "durability": self.get_durability_policy(),
+            "complete": complete,
+            "direct_fd": open_direct(path) if tus_settings.TUS_DIRECT_IO else None,
+            "drop_cache": tus_settings.TUS_PAGE_CACHE_HINTS,
+        }
+
+        try:
+            if self.use_file_handle_cache and file_handle_cache.enabled:
+                with file_handle_cache.open(path) as fd:
+                    return pwrite_buffers(fd, offset, buffers, **options)
+
+            return write_buffers_to_file(path, offset, buffers, makedirs=True, **options)
+        finally:
+            if options["direct_fd"] is not None:
+                os.close(options["direct_fd"])
+
+    def truncate(self, offset):
+        # Preallocated files keep their size, the data beyond the offset will be overwritten
+        if tus_settings.TUS_PREALLOCATE and self.upload.upload_length > 0:
+            return
+
+        if self.exists():
+            os.truncate(self.upload.temporary_file_path, offset)
+
+    def open(self):
+        return open(self.upload.temporary_file_path, "rb")
+
+    def delete(self):
+        self.close()
+        self.discard(self.upload.guid, self.upload.temporary_file_path)
+
+    def sync(self):
+        fd = os.open(self.upload.temporary_file_path, os.O_RDONLY)
+        try:
+            self.get_durability_policy().sync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        if self.upload.temporary_file_path:
+            file_handle_cache.discard(self.upload.temporary_file_path)
+
+    def concatenate(self, partial_uploads):
+        """
+        The data is copied in the kernel (see `copy_file`), so it doesn't pass through Python, and it is synced to
+          disk unless the `TUS_DURABILITY` policy is "none".
+        """
+        num_bytes_written = 0
+
+        with open(self.upload.temporary_file_path, "r+b") as fh:
+            for partial_upload in partial_uploads:
+                with open(partial_upload.temporary_file_path, "rb") as partial_fh:
+                    num_bytes = copy_file(partial_fh.fileno(), fh.fileno(), partial_upload.upload_length)
+                if num_bytes != partial_upload.upload_length:
+                    raise ValueError(f"Temporary file of partial upload {partial_upload.guid} is incomplete.")
+                num_bytes_written += num_bytes
+
+            self.get_durability_policy().chunk_written(fh.fileno(), complete=True)
+
+        return num_bytes_written
+
+
+class SharedDirectoryChunkStore(LocalFileChunkStore):
+    """
+    Writes the data to a temporary file in `TUS_UPLOAD_DIR`, on a file system that is shared by all nodes (e.g. NFS),
+      so any node can handle any request. The file is opened and closed for every chunk (close-to-open consistency),
+      and synced before the upload_offset is advanced. Use a lock class that works across nodes.
+    """
+
+    use_file_handle_cache = False
+
+    def get_durability_policy(self):
+        # Other nodes may continue the upload, so every chunk has to be on disk before it's accepted
+        return DurabilityPolicy(mode=CHUNK)
+
+
+class StorageChunkStore(AbstractChunkStore):
+    """
+    Writes every chunk as a separate, immutable object to a Django `Storage` (`TUS_CHUNK_STORE_STORAGE`), named after
+      the offset it was written at. Any node can handle any request, and the objects are read one after the other
+      when the upload is finalized.
+    """
+
+    @classmethod
+    def get_storage(cls):
+        if tus_settings.TUS_CHUNK_STORE_STORAGE is None:
+            return default_storage
+        if storages is None:
+            raise ImproperlyConfigured("CHUNK_STORE_STORAGE requires Django 4.2 or later")
+        return storages[tus_settings.TUS_CHUNK_STORE_STORAGE]
+
+    @classmethod
+    def get_directory(cls, guid):
+        return f"{tus_settings.TUS_CHUNK_STORE_PREFIX}/{guid}"
+
+    @classmethod
+    def get_chunks(cls, guid):
+        """
+        Returns the `(offset, name)` tuples of the objects of an upload, ordered by offset
+        """
+        directory = cls.get_directory(guid)
+        try:
+            _, file_names = cls.get_storage().listdir(directory)
+        except FileNotFoundError:
+            return []
+        chunks = []
+        for file_name in file_names:
+            # The storage might have appended a suffix to the name, and other objects are skipped
+            try:
+                offset = int(file_name[:20])
+            except ValueError:
+                continue
+            chunks.append((offset, f"{directory}/{file_name}"))
+        return sorted(chunks)
+
+    @classmethod
+    def discard(cls, guid, temporary_file_path):
+        chunks = cls.get_chunks(guid)
+        for _, name in chunks:
+            cls.get_storage().delete(name)
+        return bool(chunks)
+
+    def write(self, offset, buffers):
+        num_bytes_written = 0
+
+        with tempfile.SpooledTemporaryFile(max_size=tus_settings.TUS_CHUNK_STORE_SPOOL_SIZE) as spool:
+            for buffer in buffers:
+                spool.write(buffer)
+                num_bytes_written += len(buffer)
+
+            if not num_bytes_written:
+                return 0
+
+            # Replace the data of a previous attempt at this offset
+            name = f"{self.get_directory(self.upload.guid)}/{offset:020d}"
+            storage = self.get_storage()
+            storage.delete(name)
+
+            spool.seek(0)
+            storage.save(name, File(spool, name=name))
+
+        return num_bytes_written
+
+    def truncate(self, offset):
+        for chunk_offset, name in self.get_chunks(self.upload.guid):
+            if chunk_offset >= offset:
+                self.get_storage().delete(name)
+
+    def discard_chunk(self, offset):
+        # The object would be read along with the objects that are written in its range later on
+        for chunk_offset, name in self.get_chunks(self.upload.guid):
+            if chunk_offset == offset:
+                self.get_storage().delete(name)
+
+    def open(self):
+        return io.BufferedReader(ChunkReader(self.get_storage(), self.get_chunks(self.upload.guid)))
+
+    def read(self, offset, length):
+        # Start at the last object that starts at or before the offset, instead of reading all objects before it
+        chunks = self.get_chunks(self.upload.guid)
+        index = max([index for index, (chunk_offset, _) in enumerate(chunks) if chunk_offset <= offset], default=0)
+        chunks = chunks[index:]
+        position = chunks[0][0] if chunks else 0
+
+        with io.BufferedReader(ChunkReader(self.get_storage(), chunks, position=position)) as fh:
+            fh.read(offset - position)
+            return fh.read(length)
+
+    def delete(self):
+        self.discard(self.upload.guid, None)
+
+
+class ChunkReader(io.RawIOBase):
+    """
+    Reads a sequence of `(offset, name)` objects from a storage as a single stream. Data of overlapping objects (out of
+      order retries) is skipped.
+    """
+
+    def __init__(self, storage, chunks, position=0):
+        self.storage = storage
+        self.chunks = list(chunks)
+        self.position = position
+        self._current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._current is None:
+                if not self.chunks:
+                    return 0
+
+                offset, name = self.chunks.pop(0)
+                self._current = self.storage.open(name, "rb")
+                if offset > self.position:
+                    raise OSError(f"Missing data between offset {self.position} and {offset}.")
+                if offset < self.position:
+                    self._skip(self.position - offset)
+
+            num_bytes = self._read_current(buffer)
+            if not num_bytes:
+                self._current.close()
+                self._current = None
+                continue
+
+            self.position += num_bytes
+            return num_bytes
+
+    def _read_current(self, buffer):
+        # Read straight into the buffer of the caller, if the file supports it
+        readinto = getattr(self._current, "readinto", None)
+        if readinto is not None:
+            return readinto(buffer)
+
+        data = self._current.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def _skip(self, num_bytes):
+        if self._current.seekable():
+            self._current.seek(num_bytes, io.SEEK_CUR)
+        else:
+            self._current.read(num_bytes)
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
@@ -0,0 +1,268 @@
+import logging
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from . import settings as tus_settings
+from . import states
+from .cache import delete_cached_head_headers_many
+from .filehandles import file_handle_cache
+from .locks import get_upload_lock
+from .models import get_upload_model
+
+logger = logging.getLogger(__name__)
+
+
+def reap_expired_uploads(now=None, batch_size=1000, max_batches=None, num_workers=0):
+    """
+    Deletes the uploads that expired before they were completed (or failed to be saved), along with their temporary
+      files. Expired uploads that are stuck in the saving state (their finalization lease passed more than
+      `TUS_FINALIZATION_LEASE` seconds ago, or they have no lease at all) are deleted as well. Expired uploads are streamed in batches (using keyset pagination on `expires` and the primary
+      key), so memory use and the duration of every query stay bounded, no matter how many uploads there are.
+
+    :param datetime.datetime now: Uploads that expired before this moment are deleted (defaults to now)
+    :param int batch_size: The amount of uploads to delete per batch
+    :param int max_batches: The maximum amount of batches to process in this run (None: no limit)
+    :param int num_workers: The amount of threads used to remove temporary files (0: remove them sequentially)
+    :return dict: The amount of deleted uploads and removed files, and the amount of processed batches
+    """
+    upload_model = get_upload_model()
+    now = now or timezone.now()
+
+    # Uploads that are done are no longer subject to expiration, neither are uploads that are being saved. Unless their
+    #  finalization lease passed a lease ago, without anyone claiming them (e.g. because `tus_finalize` doesn't run).
+    lease = timedelta(seconds=tus_settings.TUS_FINALIZATION_LEASE)
+    queryset = upload_model._default_manager.filter(expires__lt=now).filter(
+        ~Q(state__in=[states.SAVING, states.DONE])
+        | Q(state=states.SAVING, finalization_due__lt=now - lease)
+        | Q(state=states.SAVING, finalization_due__isnull=True),
+    )
+
+    result = {"num_uploads": 0, "num_files": 0, "num_batches": 0}
+    last_key = None
+
+    executor = ThreadPoolExecutor(max_workers=num_workers) if num_workers > 0 else None
+    try:
+        while max_batches is None or result["num_batches"] < max_batches:
+            batch_queryset = queryset.order_by("expires", "pk")
+            if last_key is not None:
+                batch_queryset = batch_queryset.filter(
+                    Q(expires__gt=last_key[0]) | Q(expires=last_key[0], pk__gt=last_key[1]),
+                )
+
+            rows = list(batch_queryset.values_list("expires", "pk", "guid", "temporary_file_path")[:batch_size])
+            if not rows:
+                break
+
+            last_key = rows[-1][:2]
+            pks = [row[1] for row in rows]
+
+            # Delete the rows first, and only remove the files of the rows that were actually deleted (an upload might
+            #  have been modified in the meantime)
+            _, num_deleted_per_model = queryset.filter(pk__in=pks).delete()
+            if num_deleted_per_model.get(upload_model._meta.label, 0) < len(pks):
+                remaining_pks = set(upload_model._default_manager.filter(pk__in=pks).values_list("pk", flat=True))
+                rows = [row for row in rows if row[1] not in remaining_pks]
+
+            delete_cached_head_headers_many([row[2] for row in rows])
+            get_upload_lock().discard_many([row[2] for row in rows])
+
+            # Remove the data from the chunk store (e.g. the temporary files)
+            guids, paths = [row[2] for row in rows], [row[3] for row in rows]
+            discard = upload_model.get_chunk_store_class().discard
+            removed = executor.map(discard, guids, paths) if executor is not None else map(discard, guids, paths)
+
+            result["num_uploads"] += len(rows)
+            result["num_files"] += sum(removed)
+            result["num_batches"] += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    logger.info(f"Reaped {result['num_uploads']} expired uploads in {result['num_batches']} batches")
+
+    return result
+
+
+def collect_orphaned_files(grace_period=60 * 60, batch_size=1000, quarantine_dir=None, dry_run=False):
+    """
+    Removes (or quarantines) temporary files that are not referenced by any upload anymore, e.g. because a worker
+      crashed or because uploads were deleted in bulk. The temporary file directories are scanned lazily, and the
+      found files are checked against the database in batches, so the uploads table is never loaded into memory. With
+      a `StorageChunkStore`, the objects of uploads that don't exist anymore are collected as well (see
+      `collect_orphaned_chunks`).
+
+    :param int grace_period: Files modified less than this amount of seconds ago are left alone (they might belong to
+      an upload that is being created)
+    :param int batch_size: The amount of files to check against the database per query
+    :param str quarantine_dir: Move orphaned files to this directory instead of removing them
+    :param bool dry_run: Only report orphaned files, without removing them
+    :return dict: The amount of orphaned files, and the amount of bytes reclaimed
+    """
+    upload_model = get_upload_model()
+    cutoff = time.time() - grace_period
+
+    result = {"num_files": 0, "num_bytes": 0}
+
+    def collect(batch):
+        referenced_paths = set(
+            upload_model._default_manager.filter(temporary_file_path__in=list(batch)).values_list(
+                "temporary_file_path",
+                flat=True,
+            ),
+        )
+        for path, size in batch.items():
+            if path in referenced_paths:
+                continue
+            logger.info(f"Collecting orphaned file: {path}")
+            if not dry_run and not _discard_file(path, quarantine_dir):
+                continue
+            result["num_files"] += 1
+            result["num_bytes"] += size
+
+    batch = {}
+    for directory, recursive in upload_model.get_temporary_file_directories():
+        for entry in _scan_temporary_files(directory, recursive, exclude=quarantine_dir):
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime >= cutoff:
+                continue
+            batch[entry.path] = stat.st_size
+            if len(batch) >= batch_size:
+                collect(batch)
+                batch = {}
+
+    if batch:
+        collect(batch)
+
+    # The objects of a storage chunk store (the chunk stores use this module)
+    from .chunkstores import StorageChunkStore
+
+    if issubclass(upload_model.get_chunk_store_class(), StorageChunkStore):
+        num_files, num_bytes = collect_orphaned_chunks(
+            upload_model.get_chunk_store_class(),
+            grace_period=grace_period,
+            batch_size=batch_size,
+            quarantine_dir=quarantine_dir,
+            dry_run=dry_run,
+        )
+        result["num_files"] += num_files
+        result["num_bytes"] += num_bytes
+
+    return result
+
+
+def collect_orphaned_chunks(
+    chunk_store_class, grace_period=60 * 60, batch_size=1000, quarantine_dir=None, dry_run=False
+):
+    """
+    Removes (or quarantines) the objects of a `StorageChunkStore` that belong to uploads that don't exist anymore. The
+      objects of an upload are left alone if one of them was modified less than `grace_period` seconds ago.
+
+    :return tuple: The amount of orphaned objects, and the amount of bytes reclaimed
+    """
+    upload_model = get_upload_model()
+    storage = chunk_store_class.get_storage()
+    cutoff = time.time() - grace_period
+
+    num_files = num_bytes = 0
+
+    def collect(guids):
+        nonlocal num_files, num_bytes
+        existing_guids = set(upload_model._default_manager.filter(guid__in=guids).values_list("guid", flat=True))
+        for guid in guids:
+            if guid in existing_guids:
+                continue
+
+            chunks = chunk_store_class.get_chunks(guid)
+            try:
+                if any(storage.get_modified_time(name).timestamp() >= cutoff for _, name in chunks):
+                    continue
+            except NotImplementedError:
+                # Without modification times, it's impossible to tell whether the upload is being created
+                continue
+
+            for _, name in chunks:
+                logger.info(f"Collecting orphaned chunk: {name}")
+                size = storage.size(name)
+                if not dry_run:
+                    if quarantine_dir is not None:
+                        _quarantine_object(storage, name, os.path.join(quarantine_dir, str(guid)))
+                    storage.delete(name)
+                num_files += 1
+                num_bytes += size
+
+    try:
+        directories, _ = storage.listdir(tus_settings.TUS_CHUNK_STORE_PREFIX)
+    except FileNotFoundError:
+        directories = []
+
+    batch = []
+    for directory in directories:
+        try:
+            batch.append(uuid.UUID(directory))
+        except ValueError:
+            continue
+        if len(batch) >= batch_size:
+            collect(batch)
+            batch = []
+
+    if batch:
+        collect(batch)
+
+    return num_files, num_bytes
+
+
+def _quarantine_object(storage, name, quarantine_dir):
+    os.makedirs(quarantine_dir, exist_ok=True)
+    with storage.open(name, "rb") as source, open(os.path.join(quarantine_dir, os.path.basename(name)), "wb") as target:
+        shutil.copyfileobj(source, target)
+
+
+def _scan_temporary_files(directory, recursive, exclude=None):
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive and not (exclude and os.path.abspath(entry.path) == os.path.abspath(exclude)):
+                    yield from _scan_temporary_files(entry.path, recursive, exclude=exclude)
+            elif entry.is_file(follow_symlinks=False) and entry.name.startswith("tus-upload-"):
+                yield entry
+
+
+def _discard_file(path, quarantine_dir):
+    if quarantine_dir is None:
+        return remove_file(path)
+
+    os.makedirs(quarantine_dir, exist_ok=True)
+    file_handle_cache.discard(path)
+    try:
+        shutil.move(path, os.path.join(quarantine_dir, os.path.basename(path)))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def remove_file(path):
+    """
+    Removes a file, if it exists. Only the cached file descriptor of this process is closed, other processes close
+      theirs once they notice the file is gone, or once it has been idle for `TUS_FILE_HANDLE_CACHE_IDLE_TIMEOUT` seconds.
+
+    :param str path:
+    :return bool: Whether or not the file has been removed
+    """
+    file_handle_cache.discard(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
@@ -12,3 +12,20 @@ try:
     from base64 import b64decode as decode_base64
 except (ImportError, AttributeError):
     from base64 import decodestring as decode_base64
+
+try:
+    from django.core.files.storage import storages
+except ImportError:
+    # Django < 4.2
+    storages = None
+
+try:
+    from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+except ImportError:
+    # asgiref < 3.6
+    import asyncio
+    from asyncio import iscoroutinefunction
+
+    def markcoroutinefunction(func):
+        func._is_coroutine = asyncio.coroutines._is_coroutine
+        return func
@@ -0,0 +1,51 @@
+import os
+
+from . import settings as tus_settings
+
+# Never sync, leave it up to the operating system
+NONE = "none"
+# Sync after every chunk (PATCH request)
+CHUNK = "chunk"
+# Only sync once the upload is complete
+COMPLETION = "completion"
+
+
+class DurabilityPolicy:
+    """
+    Decides when written data is synced to disk. Data is always synced before the upload_offset moves past it, except
+      for the "none" policy (no guarantees) and the "completion" policy (only the final offset is guaranteed).
+    """
+
+    def __init__(self, mode=None, full_sync=None):
+        self.mode = mode or tus_settings.TUS_DURABILITY
+        self.full_sync = tus_settings.TUS_DURABILITY_FULL_SYNC if full_sync is None else full_sync
+
+        if self.mode not in (NONE, CHUNK, COMPLETION):
+            raise ValueError(f"Invalid durability policy: {self.mode}")
+
+    def chunk_written(self, fd, complete=False):
+        """
+        Called after the whole chunk has been written to the file, before the offset is advanced
+
+        :param int fd: The file descriptor
+        :param bool complete: Whether or not the upload is complete with this chunk
+        """
+        if self.mode == CHUNK or (self.mode == COMPLETION and complete):
+            self.sync(fd)
+
+    def sync(self, fd):
+        sync_fd(fd, full=self.full_sync)
+
+
+def sync_fd(fd, full=False):
+    """
+    Flushes the data of a file descriptor to disk, using fdatasync (which skips metadata that is not needed to read the
+      data back) unless a full fsync is requested or fdatasync is not available
+
+    :param int fd:
+    :param bool full:
+    """
+    if full or not hasattr(os, "fdatasync"):
+        os.fsync(fd)
+    else:
+        os.fdatasync(fd)
@@ -8,3 +8,15 @@ class Conflict(APIException):
     status_code = status.HTTP_409_CONFLICT
     default_detail = _("Conflict.")
     default_code = "conflict"
+
+
+class Locked(APIException):
+    status_code = status.HTTP_423_LOCKED
+    default_detail = _("Upload is locked.")
+    default_code = "locked"
+
+
+class InsufficientStorage(APIException):
+    status_code = status.HTTP_507_INSUFFICIENT_STORAGE
+    default_detail = _("Insufficient storage.")
+    default_code = "insufficient_storage"
@@ -0,0 +1,211 @@
+import collections
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from . import settings as tus_settings
+
+
+class _Entry:
+    __slots__ = ("fd", "refs", "discarded", "last_used")
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.refs = 0
+        self.discarded = False
+        self.last_used = time.monotonic()
+
+
+class FileHandleCache:
+    """
+    Per-process LRU cache of file descriptors of temporary files, so consecutive chunks of an upload don't have to
+      open (and close) the temporary file again. Descriptors are opened for writing only, data is written to them with
+      `os.pwrite`, so they can be shared by concurrent requests. A descriptor that is in use is never closed, the cache
+      may temporarily hold more than `max_size` descriptors when all of them are in use.
+
+    A temporary file that is removed by another process (e.g. the reaper, or a worker that completed the upload) keeps
+      using disk space for as long as a descriptor is open. Descriptors of removed files are closed on the next cache
+      hit, and a background thread closes descriptors that haven't been used for `idle_timeout` seconds.
+    """
+
+    def __init__(self, max_size=None, idle_timeout=None):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._sweeper = None
+
+    @property
+    def max_size(self):
+        return tus_settings.TUS_FILE_HANDLE_CACHE_SIZE if self._max_size is None else self._max_size
+
+    @property
+    def idle_timeout(self):
+        return tus_settings.TUS_FILE_HANDLE_CACHE_IDLE_TIMEOUT if self._idle_timeout is None else self._idle_timeout
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    @contextmanager
+    def open(self, path):
+        """
+        Context manager that yields a file descriptor (opened for writing) of the file at the given path, creating the
+          file and its directories if they don't exist
+
+        :param str path:
+        """
+        entry = self._acquire(path)
+        try:
+            yield entry.fd
+        finally:
+            self._release(entry)
+
+    def discard(self, path):
+        """
+        Closes the cached file descriptor of the file at the given path, if any (e.g. because the upload is complete,
+          or the file is about to be removed)
+
+        :param str path:
+        """
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None:
+                return
+            entry.discarded = True
+            if entry.refs:
+                # Closed once it is released
+                return
+        os.close(entry.fd)
+
+    def clear(self):
+        """
+        Closes all cached file descriptors that are not in use
+        """
+        with self._lock:
+            paths = list(self._entries)
+        for path in paths:
+            self.discard(path)
+
+    def close_idle(self):
+        """
+        Closes the cached file descriptors that are not in use, and haven't been used for `idle_timeout` seconds
+        """
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = []
+        with self._lock:
+            for path, entry in list(self._entries.items()):
+                if not entry.refs and entry.last_used < cutoff:
+                    del self._entries[path]
+                    entry.discarded = True
+                    idle.append(entry.fd)
+        for fd in idle:
+            os.close(fd)
+
+    def _acquire(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                entry.refs += 1
+                self._entries.move_to_end(path)
+
+        if entry is not None:
+            # The file might have been removed by another process in the meantime
+            if os.fstat(entry.fd).st_nlink > 0:
+                return entry
+            self._release(entry)
+            self.discard(path)
+
+        fd = _open_for_writing(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = self._entries[path] = _Entry(fd)
+                fd = None
+            entry.refs += 1
+            self._entries.move_to_end(path)
+            evicted = self._evict()
+            self._start_sweeper()
+
+        if fd is not None:
+            # Opened by another thread in the meantime
+            os.close(fd)
+        for evicted_fd in evicted:
+            os.close(evicted_fd)
+
+        return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            entry.last_used = time.monotonic()
+            close = entry.discarded and not entry.refs
+        if close:
+            os.close(entry.fd)
+
+    def _evict(self):
+        evicted = []
+        excess = len(self._entries) - self.max_size
+        for path, entry in list(self._entries.items()):
+            if excess <= 0:
+                break
+            if entry.refs:
+                continue
+            del self._entries[path]
+            entry.discarded = True
+            evicted.append(entry.fd)
+            excess -= 1
+        return evicted
+
+    def _start_sweeper(self):
+        # Runs for as long as there are cached descriptors (called with the lock held)
+        if self._sweeper is None and self.idle_timeout:
+            self._sweeper = threading.Thread(target=self._sweep, name="tus-file-handles", daemon=True)
+            self._sweeper.start()
+
+    def _sweep(self):
+        while True:
+            time.sleep(self.idle_timeout / 2)
+            self.close_idle()
+            with self._lock:
+                if not self._entries:
+                    self._sweeper = None
+                    return
+
+    def _reset(self):
+        # Forked processes don't share the cache (the descriptors are closed in the child only)
+        self._lock = threading.Lock()
+        self._sweeper = None
+        entries, self._entries = self._entries, collections.OrderedDict()
+        for entry in entries.values():
+            os.close(entry.fd)
+
+
+def _open_for_writing(path):
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_CLOEXEC", 0)
+    try:
+        return os.open(path, flags, 0o600)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return os.open(path, flags, 0o600)
+
+
+file_handle_cache = FileHandleCache()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=file_handle_cache._reset)
+
+
+def get_file_handle_cache():
+    """
+    Returns the file handle cache of this process
+    """
+    return file_handle_cache
@@ -0,0 +1,312 @@
+import logging
+import multiprocessing
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import settings as tus_settings
+from . import states
+from .models import get_upload_model
+from .storage import get_save_handler
+
+logger = logging.getLogger(__name__)
+
+
+def finalize_upload(upload):
+    """
+    Runs the save handler of an upload that is being saved (the upload has already been moved to the saving state)
+
+    :param upload: The upload (or its guid)
+    :return bool: Whether or not the upload has been finalized (False if it is not being saved, or doesn't exist)
+    """
+    if not isinstance(upload, get_upload_model()):
+        upload = get_upload_model()._default_manager.filter(guid=upload).first()
+
+    if upload is None or upload.state != states.SAVING:
+        return False
+
+    get_save_handler()(upload=upload).handle_save()
+    return True
+
+
+def finalize_upload_with_retries(guid, retries=None, retry_delay=None):
+    """
+    Finalizes an upload, retrying with exponential backoff when the save handler fails
+
+    :param str guid: The guid of the upload
+    :param int retries: The amount of retries (defaults to `TUS_FINALIZATION_RETRIES`)
+    :param float retry_delay: The delay before the first retry, in seconds (defaults to `TUS_FINALIZATION_RETRY_DELAY`)
+    :return bool: Whether or not the upload has been finalized
+    """
+    retries = tus_settings.TUS_FINALIZATION_RETRIES if retries is None else retries
+    retry_delay = tus_settings.TUS_FINALIZATION_RETRY_DELAY if retry_delay is None else retry_delay
+
+    attempt = 0
+    while True:
+        try:
+            return finalize_upload(guid)
+        except Exception:
+            logger.exception(f"Unable to finalize upload {guid} (attempt {attempt + 1} of {retries + 1})")
+            if attempt >= retries:
+                return False
+        finally:
+            # Don't keep (possibly broken) connections around in worker threads
+            close_old_connections()
+
+        time.sleep(retry_delay * 2**attempt)
+        attempt += 1
+
+
+def _initialize_worker_process():
+    import django
+
+    django.setup()
+
+
+class AbstractFinalizationExecutor(metaclass=ABCMeta):
+    """
+    Runs the save handler of uploads that have been received completely. Asynchronous executors move the upload to
+      the saving state within the request, so the last PATCH returns right away.
+
+    Every executor claims the upload for `TUS_FINALIZATION_LEASE` seconds (`finalization_due`). When the upload is
+      still being saved once the lease has passed (e.g. because the process died), it can be finalized by the
+      `tus_finalize` management command, whatever executor is configured. Uploads that keep failing are moved to the
+      failed state, where they expire (or can be queued again with `requeue_failed`).
+    """
+
+    def submit(self, upload):
+        """
+        Called (within the request) when the last chunk of the upload has been received
+
+        :param upload:
+        """
+        upload.start_saving()
+        self.queue(upload)
+        upload.save()
+
+        self.schedule(upload)
+
+    def queue(self, upload):
+        """
+        Sets the finalization fields of an upload that is moved to the saving state (it's saved by the caller)
+        """
+        upload.finalization_due = timezone.now() + timedelta(seconds=tus_settings.TUS_FINALIZATION_LEASE)
+        upload.finalization_attempts = 0
+
+    @abstractmethod
+    def schedule(self, upload):
+        """
+        Schedules the finalization of an upload that has been moved to the saving state
+        """
+        pass
+
+    def get_queue_depth(self):
+        """
+        Returns the amount of uploads that are waiting to be (or being) finalized
+        """
+        return 0
+
+    def get_queryset(self):
+        return get_upload_model()._default_manager.filter(state=states.SAVING, finalization_due__isnull=False)
+
+    def claim(self, lease=None):
+        """
+        Claims the next upload that is due
+
+        :param float lease: The amount of seconds the upload is claimed for (defaults to `TUS_FINALIZATION_LEASE`)
+        :return: The claimed upload, or None if no upload is due
+        """
+        lease = tus_settings.TUS_FINALIZATION_LEASE if lease is None else lease
+        now = timezone.now()
+
+        candidates = self.get_queryset().filter(finalization_due__lte=now).order_by("finalization_due", "pk")
+        for pk, due in candidates.values_list("pk", "finalization_due")[:10]:
+            # Only one worker can move the due date of the upload forward
+            num_rows_updated = (
+                self.get_queryset()
+                .filter(pk=pk, finalization_due=due)
+                .update(
+                    finalization_due=now + timedelta(seconds=lease),
+                    finalization_attempts=F("finalization_attempts") + 1,
+                )
+            )
+            if num_rows_updated:
+                return get_upload_model()._default_manager.get(pk=pk)
+
+        return None
+
+    def drain(self, max_uploads=None, lease=None, retries=None, retry_delay=None):
+        """
+        Finalizes the uploads that are due, one after the other
+
+        :param int max_uploads: The maximum amount of uploads to process (None: until no upload is due)
+        :param float lease: See `claim`
+        :param int retries: The amount of retries (defaults to `TUS_FINALIZATION_RETRIES`)
+        :param float retry_delay: The delay before the first retry, in seconds (see `finalize_upload_with_retries`)
+        :return dict: The amount of finalized, retried and failed uploads
+        """
+        retries = tus_settings.TUS_FINALIZATION_RETRIES if retries is None else retries
+        retry_delay = tus_settings.TUS_FINALIZATION_RETRY_DELAY if retry_delay is None else retry_delay
+
+        result = {"num_finalized": 0, "num_retried": 0, "num_failed": 0}
+
+        while max_uploads is None or sum(result.values()) < max_uploads:
+            upload = self.claim(lease=lease)
+            if upload is None:
+                break
+
+            try:
+                finalize_upload(upload)
+            except Exception:
+                logger.exception(f"Unable to finalize upload {upload.guid} (attempt {upload.finalization_attempts})")
+
+                if upload.finalization_attempts > retries:
+                    self.get_queryset().filter(pk=upload.pk).update(state=states.FAILED, finalization_due=None)
+                    result["num_failed"] += 1
+                else:
+                    due = timezone.now() + timedelta(seconds=retry_delay * 2 ** (upload.finalization_attempts - 1))
+                    self.get_queryset().filter(pk=upload.pk).update(finalization_due=due)
+                    result["num_retried"] += 1
+            else:
+                result["num_finalized"] += 1
+
+        return result
+
+    def requeue_failed(self):
+        """
+        Moves the uploads that failed to be saved back to the saving state, where they're due right away
+
+        :return int: The amount of requeued uploads
+        """
+        return (
+            get_upload_model()
+            ._default_manager.filter(state=states.FAILED)
+            .update(state=states.SAVING, finalization_due=timezone.now(), finalization_attempts=0)
+        )
+
+
+class SynchronousFinalizationExecutor(AbstractFinalizationExecutor):
+    """
+    Runs the save handler within the request that received the last chunk (default)
+    """
+
+    def submit(self, upload):
+        # Saved when the save handler moves the upload to the saving state
+        self.queue(upload)
+        get_save_handler()(upload=upload).run()
+
+    def schedule(self, upload):
+        finalize_upload(upload)
+
+
+class PoolFinalizationExecutor(AbstractFinalizationExecutor):
+    """
+    Runs the save handlers in a pool of `TUS_FINALIZATION_WORKERS` workers of this process. Uploads are only submitted
+      once the transaction of the request has been committed. Uploads that were queued when the process stopped remain
+      in the saving state, and can be finalized with the `tus_finalize` management command once their lease has passed
+      (so the lease should outlast the time an upload spends in the queue).
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or tus_settings.TUS_FINALIZATION_WORKERS
+        self._lock = threading.Lock()
+        self._pool = None
+        self._num_pending = 0
+
+    @abstractmethod
+    def create_pool(self):
+        pass
+
+    def get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self.create_pool()
+            return self._pool
+
+    def schedule(self, upload):
+        guid = str(upload.guid)
+        transaction.on_commit(lambda: self.submit_guid(guid))
+
+    def submit_guid(self, guid):
+        with self._lock:
+            self._num_pending += 1
+        future = self.get_pool().submit(finalize_upload_with_retries, guid)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._num_pending -= 1
+        if future.exception() is not None:
+            logger.error("Finalization worker failed", exc_info=future.exception())
+
+    def get_queue_depth(self):
+        return self._num_pending
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+class ThreadPoolFinalizationExecutor(PoolFinalizationExecutor):
+    def create_pool(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tus-finalization")
+
+
+class ProcessPoolFinalizationExecutor(PoolFinalizationExecutor):
+    """
+    Runs the save handlers in worker processes, so CPU bound save handlers don't compete with the requests. The workers
+      are spawned (not forked), so they don't share the database connections of this process.
+    """
+
+    def create_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize_worker_process,
+        )
+
+
+class DatabaseFinalizationExecutor(AbstractFinalizationExecutor):
+    """
+    Uses the uploads in the saving state as a job queue, which is drained by the `tus_finalize` management command (on
+      any node). Workers claim an upload by moving its `finalization_due` forward by `TUS_FINALIZATION_LEASE` seconds,
+      so an upload whose worker died is picked up again once the lease has passed. Uploads that keep failing are moved
+      to the failed state after `TUS_FINALIZATION_RETRIES` retries.
+    """
+
+    def queue(self, upload):
+        # Due right away
+        upload.finalization_due = timezone.now()
+        upload.finalization_attempts = 0
+
+    def schedule(self, upload):
+        # Picked up by `drain`
+        pass
+
+    def get_queue_depth(self):
+        return self.get_queryset().count()
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_finalization_executor(import_path=None):
+    """
+    Returns the (process-wide) finalization executor
+    """
+    import_path = import_path or tus_settings.TUS_FINALIZATION_EXECUTOR_CLASS
+    with _executors_lock:
+        if import_path not in _executors:
+            _executors[import_path] = import_string(import_path)()
+        return _executors[import_path]
@@ -0,0 +1,395 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABCMeta, abstractmethod
+
+from django.core.cache import caches
+from django.db import DatabaseError, connections, router, transaction
+from django.http import Http404
+from django.utils.module_loading import import_string
+
+from . import settings as tus_settings
+from .exceptions import Locked
+
+logger = logging.getLogger(__name__)
+
+
+class UploadLockMetrics:
+    """
+    Process-wide contention metrics of the upload locks
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.acquired = 0
+            self.contended = 0
+            self.failed = 0
+            self.wait_time = 0.0
+            self.max_wait_time = 0.0
+
+    def record(self, acquired, contended, wait_time):
+        with self._lock:
+            if acquired:
+                self.acquired += 1
+            else:
+                self.failed += 1
+            if contended:
+                self.contended += 1
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "contended": self.contended,
+                "failed": self.failed,
+                "wait_time": self.wait_time,
+                "max_wait_time": self.max_wait_time,
+            }
+
+
+metrics = UploadLockMetrics()
+
+
+class AbstractUploadLock(metaclass=ABCMeta):
+    """
+    Lock that serializes the requests that modify an upload (PATCH, DELETE), also across workers and nodes. When the
+      lock can't be acquired within `timeout` seconds, `Locked` is raised.
+    """
+
+    poll_interval = 0.05
+
+    # The fields that are read again once the lock has been acquired (the fields a PATCH request modifies)
+    refresh_fields = (
+        "state",
+        "upload_offset",
+        "upload_digest",
+        "upload_digest_state",
+        "upload_extents",
+        "upload_reservations",
+        "temporary_file_path",
+    )
+
+    def __init__(self, upload, timeout=None):
+        self.upload = upload
+        self.timeout = tus_settings.TUS_UPLOAD_LOCK_TIMEOUT if timeout is None else timeout
+
+    @abstractmethod
+    def try_acquire(self):
+        """
+        Tries to acquire the lock without waiting
+
+        :return bool: Whether or not the lock was acquired
+        """
+        pass
+
+    @abstractmethod
+    def release(self):
+        pass
+
+    def acquire(self):
+        start = time.monotonic()
+        contended = False
+
+        while True:
+            acquired = self.try_acquire()
+            if acquired or time.monotonic() - start >= self.timeout:
+                break
+            contended = True
+            time.sleep(self.poll_interval)
+
+        wait_time = time.monotonic() - start
+        metrics.record(acquired, contended or not acquired, wait_time)
+
+        if not acquired:
+            logger.info(f"Unable to lock upload {self.upload.guid} after {wait_time:.3f}s")
+            return False
+
+        # The upload might have been changed (or deleted) while we were waiting for the lock
+        try:
+            self.refresh_upload()
+        except self.upload.DoesNotExist:
+            self.release()
+            raise Http404
+        return True
+
+    def refresh_upload(self):
+        self.upload.refresh_from_db(fields=list(self.refresh_fields))
+
+    def discard(self):
+        """
+        Cleans up after the upload has been deleted or completed (while the lock is held)
+        """
+        self.discard_many([self.upload.guid])
+
+    @classmethod
+    def discard_many(cls, guids):
+        """
+        Cleans up after the uploads with the given guids have been deleted (e.g. by the reaper), without holding their
+          locks
+        """
+        pass
+
+    def __enter__(self):
+        if not self.acquire():
+            raise Locked
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class NullUploadLock(AbstractUploadLock):
+    """
+    Doesn't lock at all (default)
+    """
+
+    def try_acquire(self):
+        return True
+
+    def release(self):
+        pass
+
+    def acquire(self):
+        return True
+
+
+class DatabaseUploadLock(AbstractUploadLock):
+    """
+    Locks the upload's row (SELECT ... FOR UPDATE) in a transaction that lasts until the lock is released
+    """
+
+    def __init__(self, upload, timeout=None):
+        super().__init__(upload, timeout=timeout)
+        self.using = router.db_for_write(upload.__class__, instance=upload)
+        self._atomic = None
+
+    def try_acquire(self):
+        nowait = connections[self.using].features.has_select_for_update_nowait
+        queryset = self.upload.__class__._default_manager.using(self.using).filter(pk=self.upload.pk)
+
+        atomic = transaction.atomic(using=self.using)
+        atomic.__enter__()
+        try:
+            row = queryset.select_for_update(nowait=nowait).values(*self.refresh_fields).get()
+        except DatabaseError as e:
+            atomic.__exit__(type(e), e, e.__traceback__)
+            return False
+        except self.upload.DoesNotExist as e:
+            # Deleted in the meantime
+            atomic.__exit__(type(e), e, e.__traceback__)
+            raise Http404
+        except Exception as e:
+            atomic.__exit__(type(e), e, e.__traceback__)
+            raise
+
+        self._atomic = atomic
+        self._row = row
+        return True
+
+    def refresh_upload(self):
+        # The locked row is fresh
+        for field_name, value in self._row.items():
+            setattr(self.upload, field_name, value)
+
+    def release(self, exc_type=None, exc_value=None, traceback=None):
+        atomic, self._atomic = self._atomic, None
+        if atomic is not None:
+            atomic.__exit__(exc_type, exc_value, traceback)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release(exc_type, exc_value, traceback)
+
+
+class FileUploadLock(AbstractUploadLock):
+    """
+    Takes an advisory `flock` on a lock file in `TUS_UPLOAD_DIR`. Works across workers on the same node, and across
+      nodes when `TUS_UPLOAD_DIR` is on a shared file system that supports it. The lock file is removed when the upload
+      is completed, deleted or reaped.
+    """
+
+    def __init__(self, upload, timeout=None):
+        super().__init__(upload, timeout=timeout)
+        self._fd = None
+
+    @staticmethod
+    def get_lock_file_path_for_guid(guid):
+        return os.path.join(tus_settings.TUS_UPLOAD_DIR, "locks", f"{guid}.lock")
+
+    def get_lock_file_path(self):
+        return self.get_lock_file_path_for_guid(self.upload.guid)
+
+    def try_acquire(self):
+        lock_file_path = self.get_lock_file_path()
+        while True:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(lock_file_path), exist_ok=True)
+                self._fd = os.open(lock_file_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            # The lock file might have been removed by the previous holder, in which case the lock is worthless and
+            #  the lock file has to be reopened
+            try:
+                stat = os.stat(lock_file_path)
+            except FileNotFoundError:
+                stat = None
+            fd_stat = os.fstat(self._fd)
+            if stat is not None and (stat.st_dev, stat.st_ino) == (fd_stat.st_dev, fd_stat.st_ino):
+                return True
+
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._close()
+
+    def acquire(self):
+        acquired = super().acquire()
+        if not acquired:
+            self._close()
+        return acquired
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._close()
+
+    @classmethod
+    def discard_many(cls, guids):
+        for guid in guids:
+            try:
+                os.remove(cls.get_lock_file_path_for_guid(guid))
+            except FileNotFoundError:
+                pass
+
+    def _close(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            os.close(fd)
+
+
+class CacheUploadLock(AbstractUploadLock):
+    """
+    Takes a lease in the Django cache. The cache should be shared by all workers (e.g. Redis or Memcached). The lease
+      is short (`TUS_UPLOAD_LOCK_LEASE`), and is renewed by a background thread for as long as the lock is held (e.g.
+      while the chunk is written), so the upload is only blocked briefly when a worker dies.
+
+    On Redis, the lease is renewed and released with an atomic compare-and-expire and compare-and-delete, so a worker
+      that lost its lease can't release the lease of another worker. Other backends don't support this, and fall back to
+      a `get` followed by a `touch` or `delete`.
+    """
+
+    renew_script = """
+        if redis.call("get", KEYS[1]) == ARGV[1] then
+            return redis.call("pexpire", KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+    release_script = """
+        if redis.call("get", KEYS[1]) == ARGV[1] then
+            return redis.call("del", KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, upload, timeout=None):
+        super().__init__(upload, timeout=timeout)
+        self.cache = caches[tus_settings.TUS_UPLOAD_LOCK_CACHE]
+        self.key = f"rest_framework_tus:lock:{upload.guid}"
+        self.token = uuid.uuid4().hex
+        self.lease = tus_settings.TUS_UPLOAD_LOCK_LEASE
+        self._stopped = None
+        self._renewer = None
+
+    def try_acquire(self):
+        return self.cache.add(self.key, self.token, timeout=self.lease)
+
+    def acquire(self):
+        acquired = super().acquire()
+        if acquired:
+            self._stopped = threading.Event()
+            self._renewer = threading.Thread(
+                target=self._renew_periodically,
+                args=(self._stopped,),
+                name=f"tus-lock-{self.upload.guid}",
+                daemon=True,
+            )
+            self._renewer.start()
+        return acquired
+
+    def renew(self):
+        """
+        Extends the lease, if it's still ours
+
+        :return bool: Whether or not the lease was extended
+        """
+        redis = self._get_redis_client()
+        if redis is not None:
+            client, key, token = redis
+            return bool(client.eval(self.renew_script, 1, key, token, int(self.lease * 1000)))
+
+        if self.cache.get(self.key) != self.token:
+            return False
+        return self.cache.touch(self.key, timeout=self.lease)
+
+    def release(self):
+        stopped, self._stopped = self._stopped, None
+        if stopped is not None:
+            stopped.set()
+            self._renewer.join()
+            self._renewer = None
+
+        redis = self._get_redis_client()
+        if redis is not None:
+            client, key, token = redis
+            client.eval(self.release_script, 1, key, token)
+        elif self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
+
+    def _renew_periodically(self, stopped):
+        while not stopped.wait(self.lease / 3):
+            try:
+                renewed = self.renew()
+            except Exception:
+                logger.exception(f"Unable to renew the lock of upload {self.upload.guid}")
+                continue
+            if not renewed:
+                logger.warning(f"Lost the lock of upload {self.upload.guid}")
+                return
+
+    def _get_redis_client(self):
+        """
+        Returns the Redis client, the key and the serialized token, or None when the cache isn't backed by Redis
+        """
+        # Django's own Redis backend (Django >= 4.0)
+        cache_client = getattr(self.cache, "_cache", None)
+        if hasattr(cache_client, "get_client") and hasattr(cache_client, "_serializer"):
+            key = self.cache.make_and_validate_key(self.key)
+            return cache_client.get_client(key, write=True), key, cache_client._serializer.dumps(self.token)
+
+        # django-redis
+        cache_client = getattr(self.cache, "client", None)
+        if hasattr(cache_client, "get_client") and hasattr(cache_client, "encode"):
+            key = cache_client.make_key(self.key)
+            return cache_client.get_client(write=True), key, cache_client.encode(self.token)
+
+        return None
+
+
+def get_upload_lock(import_path=None):
+    return import_string(import_path or tus_settings.TUS_UPLOAD_LOCK_CLASS)
+
+
+def get_upload_lock_metrics():
+    """
+    Returns the contention metrics of the upload locks in this process
+    """
+    return metrics.as_dict()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from rest_framework_tus.cleanup import collect_orphaned_files
+
+
+class Command(BaseCommand):
+    help = "Removes temporary files (and chunk store objects) that are not referenced by any upload"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-period",
+            type=int,
+            default=60 * 60,
+            help="Leave files alone that were modified less than this amount of seconds ago",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Amount of files to check per query")
+        parser.add_argument("--quarantine-dir", default=None, help="Move orphaned files here instead of removing them")
+        parser.add_argument("--dry-run", action="store_true", help="Only report orphaned files")
+
+    def handle(self, *args, **options):
+        result = collect_orphaned_files(
+            grace_period=options["grace_period"],
+            batch_size=options["batch_size"],
+            quarantine_dir=options["quarantine_dir"],
+            dry_run=options["dry_run"],
+        )
+
+        self.stdout.write(f"Collected {result['num_files']} orphaned files ({result['num_bytes']} bytes).")
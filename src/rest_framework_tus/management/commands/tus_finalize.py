@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rest_framework_tus.finalization import get_finalization_executor
+
+
+class Command(BaseCommand):
+    help = (
+        "Finalizes the uploads that are queued by the DatabaseFinalizationExecutor, and the uploads of other executors "
+        "that are still being saved once their lease has passed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-uploads", type=int, default=None, help="Maximum amount of uploads to process")
+        parser.add_argument("--lease", type=float, default=None, help="Amount of seconds an upload is claimed for")
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Queue the uploads that failed to be saved again, before finalizing the uploads that are due",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=None,
+            help="Keep running, and look for uploads that are due every this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        executor = get_finalization_executor()
+
+        if options["retry_failed"]:
+            num_requeued = executor.requeue_failed()
+            self.stdout.write(f"Requeued {num_requeued} failed uploads.")
+
+        while True:
+            result = executor.drain(max_uploads=options["max_uploads"], lease=options["lease"])
+
+            self.stdout.write(
+                f"Finalized {result['num_finalized']} uploads, {result['num_retried']} will be retried and "
+                f"{result['num_failed']} failed. {executor.get_queryset().count()} uploads are queued.",
+            )
+
+            if options["poll_interval"] is None:
+                break
+            time.sleep(options["poll_interval"])
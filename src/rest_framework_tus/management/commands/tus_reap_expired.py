@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from rest_framework_tus.cleanup import reap_expired_uploads
+
+
+class Command(BaseCommand):
+    help = "Deletes expired uploads and their temporary files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Amount of uploads to delete per batch")
+        parser.add_argument("--max-batches", type=int, default=None, help="Maximum amount of batches to process")
+        parser.add_argument("--workers", type=int, default=0, help="Amount of threads used to remove files")
+
+    def handle(self, *args, **options):
+        result = reap_expired_uploads(
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+            num_workers=options["workers"],
+        )
+
+        self.stdout.write(
+            f"Deleted {result['num_uploads']} expired uploads and {result['num_files']} temporary files "
+            f"in {result['num_batches']} batches.",
+        )
@@ -1,43 +1,133 @@
 from django.http.response import HttpResponse
+from django.utils.module_loading import import_string
 
 from rest_framework import status
 
-from . import constants, tus_api_version
-from .compat import decode_base64
+from . import constants
+from . import settings as tus_settings
+from . import tus_api_version
+from .compat import decode_base64, iscoroutinefunction, markcoroutinefunction
+
+
+def get_header_meta_keys(key):
+    """
+    Returns the request.META keys that are checked for the given header, e.g. "Upload-Offset" is looked up as
+      "HTTP_UPLOAD_OFFSET" and "HTTP_X_UPLOAD_OFFSET" (https://tools.ietf.org/html/rfc6648)
+
+    :param str key: The header name
+    :return tuple:
+    """
+    try:
+        return HEADER_META_KEYS[key]
+    except KeyError:
+        normalized_key = key.replace("-", "_").upper()
+        meta_keys = HEADER_META_KEYS[key] = (f"HTTP_{normalized_key}", f"HTTP_X_{normalized_key}")
+        return meta_keys
+
+
+# Lookup table of request.META keys per header
+HEADER_META_KEYS = {}
+for _header in [
+    "Tus-Resumable",
+    "Upload-Length",
+    "Upload-Offset",
+    "Upload-Defer-Length",
+    "Upload-Metadata",
+    "Upload-Checksum",
+    "Upload-Concat",
+]:
+    get_header_meta_keys(_header)
 
 
 class TusMiddleware:
+    """
+    Parses the tus headers of requests, and adds the "Tus-Resumable" header to responses. Works in both sync and async
+      middleware chains (e.g. for `AsyncUploadView` under ASGI), parsing the headers doesn't do any I/O.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    # The header parsers per request method, headers that have no meaning for a method are not parsed
+    header_parsers = {
+        "POST": ["parse_upload_length", "parse_upload_defer_length", "parse_upload_metadata", "parse_upload_concat"],
+        "PATCH": ["parse_upload_length", "parse_upload_offset", "parse_upload_checksum"],
+        "HEAD": [],
+        "DELETE": [],
+        "OPTIONS": [],
+        "GET": [],
+    }
+
+    # Parsers for methods that are not listed above
+    default_header_parsers = [
+        "parse_upload_length",
+        "parse_upload_offset",
+        "parse_upload_defer_length",
+        "parse_upload_metadata",
+        "parse_upload_checksum",
+        "parse_upload_concat",
+    ]
+
     def __init__(self, get_response=None):
         self.get_response = get_response
+        self.path_prefixes = tuple(tus_settings.TUS_MIDDLEWARE_PATH_PREFIXES or ())
+        self.view_classes = tuple(import_string(path) for path in tus_settings.TUS_MIDDLEWARE_VIEW_CLASSES or ())
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # Leave requests outside of the configured paths alone
+        if self.path_prefixes and not request.path_info.startswith(self.path_prefixes):
+            return self.get_response(request)
+
         response = None
-        if hasattr(self, "process_request"):
+        if not self.view_classes:
             response = self.process_request(request)
         if not response:
             response = self.get_response(request)
-        if hasattr(self, "process_response"):
+        if getattr(request, constants.TUS_REQUEST_FIELD_NAME, False):
             response = self.process_response(request, response)
         return response
 
-    def process_request(self, request):
-        # Parse tus client version
-        self.parse_tus_version(request)
+    async def __acall__(self, request):
+        # Leave requests outside of the configured paths alone
+        if self.path_prefixes and not request.path_info.startswith(self.path_prefixes):
+            return await self.get_response(request)
 
-        # Parse upload length
-        self.parse_upload_length(request)
+        response = None
+        if not self.view_classes:
+            response = self.process_request(request)
+        if not response:
+            response = await self.get_response(request)
+        if getattr(request, constants.TUS_REQUEST_FIELD_NAME, False):
+            response = self.process_response(request, response)
+        return response
 
-        # Parse upload upload_offset
-        self.parse_upload_offset(request)
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # When scoped to view classes, headers are parsed once the view is known
+        if not self.view_classes:
+            return None
 
-        # Parse defer upload length
-        self.parse_upload_defer_length(request)
+        view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+        if view_class is None or not issubclass(view_class, self.view_classes):
+            return None
 
-        # Parse upload metadata
-        self.parse_upload_metadata(request)
+        return self.process_request(request)
 
-        # Parse upload checksum
-        self.parse_upload_checksum(request)
+    def process_request(self, request):
+        setattr(request, constants.TUS_REQUEST_FIELD_NAME, True)
+
+        # Parse tus client version
+        self.parse_tus_version(request)
+
+        # Parse the headers that are relevant for the request method
+        for parser_name in self.header_parsers.get(request.method, self.default_header_parsers):
+            response = getattr(self, parser_name)(request)
+            if response:
+                return response
 
     def process_response(self, request, response):
         if "Tus-Resumable" not in response:
@@ -110,6 +200,26 @@ class TusMiddleware:
         # Set upload checksum
         setattr(request, constants.UPLOAD_CHECKSUM_FIELD_NAME, upload_checksum)
 
+    @classmethod
+    def parse_upload_concat(cls, request):
+        upload_concat_header = cls.get_header(request, "Upload-Concat", None)
+
+        if upload_concat_header is None:
+            return
+
+        # Either "partial", or "final;" followed by the URLs of the partial uploads
+        concat_type, _, urls = upload_concat_header.partition(";")
+        urls = urls.split()
+
+        if not (concat_type == "partial" and not urls) and not (concat_type == "final" and urls):
+            return HttpResponse(
+                f'Invalid value for "Upload-Concat" header: {upload_concat_header}.',
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Set upload concat
+        setattr(request, constants.UPLOAD_CONCAT_FIELD_NAME, (concat_type, urls))
+
     @classmethod
     def parse_upload_metadata(cls, request):
         upload_meta_header = cls.get_header(request, "Upload-Metadata", None)
@@ -132,21 +242,21 @@ class TusMiddleware:
         # Set upload_metadata
         setattr(request, constants.UPLOAD_METADATA_FIELD_NAME, upload_metadata)
 
+        # Keep the encoded header as well, so it doesn't need to be encoded again
+        setattr(request, constants.UPLOAD_METADATA_HEADER_FIELD_NAME, upload_meta_header)
+
     @classmethod
     def get_header(cls, request, key, default_value=None):
         # First, we try to retrieve the key in the "headers" dictionary
-        result = request.META.get("headers", {}).get(key, None)
-
-        # If we didn't find the key, or the value was "None", try to use the "HTTP_{uppercased-key}" key
-        if result is None:
-            custom_value = "HTTP_{}".format(key.replace("-", "_").upper())
-            result = request.META.get(custom_value, default_value)
+        headers = request.META.get("headers")
+        result = headers.get(key, None) if headers else None
 
-        # If we didn't find the key, or the value was "None", try to use the "HTTP_X_{uppercased-key}" key
+        # If we didn't find the key, try to use the "HTTP_{uppercased-key}" and "HTTP_X_{uppercased-key}" keys
         if result is None:
-            # https://tools.ietf.org/html/rfc6648
-            custom_value = "HTTP_X_{}".format(key.replace("-", "_").upper())
-            result = request.META.get(custom_value, default_value)
+            for meta_key in get_header_meta_keys(key):
+                result = request.META.get(meta_key)
+                if result is not None:
+                    break
 
         # If we still didn't find the key, or the value was "None", return the default value
         if result is None:
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_tus", "0005_alter_upload_uploaded_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="upload",
+            name="upload_digest",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="upload",
+            name="upload_digest_state",
+            field=jsonfield.fields.JSONField(blank=True, null=True),
+        ),
+    ]
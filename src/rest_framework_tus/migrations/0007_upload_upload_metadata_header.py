@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_tus", "0006_upload_digest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="upload",
+            name="upload_metadata_header",
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_tus", "0007_upload_upload_metadata_header"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="upload",
+            name="expires",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
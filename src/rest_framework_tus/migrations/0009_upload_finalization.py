@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_tus", "0008_upload_expires_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="upload",
+            name="finalization_attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="upload",
+            name="finalization_due",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
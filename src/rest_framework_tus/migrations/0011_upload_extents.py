@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:30
+
+from django.db import migrations
+
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_tus", "0010_upload_concat"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="upload",
+            name="upload_extents",
+            field=jsonfield.fields.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:10
+
+from django.db import migrations
+
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest_framework_tus", "0011_upload_extents"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="upload",
+            name="upload_reservations",
+            field=jsonfield.fields.JSONField(blank=True, null=True),
+        ),
+    ]
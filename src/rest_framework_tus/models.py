@@ -1,17 +1,38 @@
 import collections
+import hashlib
+import json
 import os
 import tempfile
+import time
 import uuid
 
 from django.core.exceptions import ImproperlyConfigured, ValidationError
-from django.db import models
+from django.db import models, router, transaction
+from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 
 from django_fsm import FSMField, transition
 from jsonfield import JSONField
 
 from rest_framework_tus import settings, signals, states
-from rest_framework_tus.utils import write_bytes_to_file
+from rest_framework_tus.cache import delete_cached_head_headers
+from rest_framework_tus.utils import (
+    LeafHasher,
+    encode_upload_metadata,
+    extents_overlap,
+    get_missing_extents,
+    merge_extents,
+    merkle_append,
+    merkle_root,
+    preallocate_file,
+)
+
+
+def get_upload_dirs():
+    """
+    Returns the directories (e.g. mount points) over which temporary files are spread
+    """
+    return settings.TUS_UPLOAD_DIRS or [settings.TUS_UPLOAD_DIR]
 
 
 def custom_upload_path(instance, filename):
@@ -32,12 +53,24 @@ class AbstractUpload(models.Model):
     upload_length = models.BigIntegerField(default=-1)
 
     upload_metadata = JSONField(load_kwargs={"object_pairs_hook": collections.OrderedDict})
+    upload_metadata_header = models.TextField(blank=True)
 
     filename = models.CharField(max_length=255, blank=True)
 
     temporary_file_path = models.CharField(max_length=4096, null=True)
 
-    expires = models.DateTimeField(null=True, blank=True)
+    expires = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    upload_digest = models.CharField(max_length=255, blank=True)
+    upload_digest_state = JSONField(null=True, blank=True)
+
+    upload_concat = models.TextField(blank=True)
+
+    upload_extents = JSONField(null=True, blank=True)
+    upload_reservations = JSONField(null=True, blank=True)
+
+    finalization_due = models.DateTimeField(null=True, blank=True, db_index=True)
+    finalization_attempts = models.PositiveIntegerField(default=0)
 
     class Meta:
         abstract = True
@@ -48,15 +81,318 @@ class AbstractUpload(models.Model):
             raise ValidationError(_("upload_offset should be >= 0."))
 
     def write_data(self, bytes, chunk_size):
-        num_bytes_written = write_bytes_to_file(self.temporary_file_path, self.upload_offset, bytes, makedirs=True)
+        num_bytes_written = self.write_buffers([bytes])
+
+        self.advance_offset(num_bytes_written)
+
+    def write_buffers(self, buffers, offset=None):
+        """
+        Writes an iterable of buffers to the chunk store, starting at the given offset (defaults to the current
+          upload_offset). The upload_offset itself is left untouched, use `advance_offset` (or `add_extent`) once the
+          written data has been accepted.
+
+        :param iterable buffers:
+        :param int offset:
+        :return int: The amount of bytes written
+        """
+        return self.get_chunk_store().write(self.upload_offset if offset is None else offset, buffers)
+
+    def advance_offset(self, num_bytes, chunk_digest_hasher=None):
+        """
+        Accepts `num_bytes` bytes of written data by moving the upload_offset forward. Instead of saving the whole row,
+          this issues a single conditional UPDATE, which only succeeds if the upload_offset in the database still
+          matches the upload_offset the data was written at. The first chunk moves the upload to the receiving state
+          in the same UPDATE, the `receiving` signal is only sent once it has succeeded.
+
+        :param int num_bytes:
+        :param ~rest_framework_tus.utils.LeafHasher chunk_digest_hasher: The hasher that was updated with the written
+          data (see `create_chunk_digest_hasher`)
+        :return bool: False if the upload_offset was changed by someone else in the meantime
+        """
+        if num_bytes <= 0:
+            return True
+
+        start_receiving = self.state == states.INITIAL
+        values = {
+            "upload_offset": models.F("upload_offset") + num_bytes,
+            "state": states.RECEIVING if start_receiving else self.state,
+        }
+
+        # The digest state only changes when a leaf has been completed
+        if chunk_digest_hasher is not None and self.add_chunk_digest(num_bytes, chunk_digest_hasher):
+            values.update(upload_digest=self.upload_digest, upload_digest_state=self.upload_digest_state)
+
+        queryset = self.__class__._default_manager.filter(guid=self.guid, upload_offset=self.upload_offset)
+        num_rows_updated = queryset.update(**values)
+
+        if not num_rows_updated:
+            return False
+
+        self.upload_offset += num_bytes
+
+        if start_receiving:
+            self.state = states.RECEIVING
+            signals.receiving.send(sender=self.__class__, instance=self)
+
+        # No more data will be written to the temporary file
+        if self.is_complete():
+            self.close_temporary_file()
+
+        return True
+
+    def reserve_extent(self, offset, num_bytes):
+        """
+        Reserves the range [offset, offset + num_bytes) for a chunk that is received out of order, so its data can be
+          written to the chunk store in place, without holding the row lock. A range can't be reserved when it overlaps
+          a received range, or the range of another chunk that is being written. Reservations of requests that died
+          expire after `TUS_PARALLEL_WRITES_RESERVATION_TIMEOUT` seconds.
+
+        :param int offset:
+        :param int num_bytes:
+        :return list: The `[start, end, token, expires]` reservation, or None if the range can't be reserved
+        """
+        now = time.time()
+        queryset = self.__class__._default_manager.filter(pk=self.pk)
+
+        with transaction.atomic(using=router.db_for_write(self.__class__, instance=self)):
+            row = queryset.select_for_update().values("upload_offset", "upload_extents", "upload_reservations").first()
+            if row is None or row["upload_offset"] == self.upload_length:
+                return None
+
+            reservations = [reservation for reservation in row["upload_reservations"] or [] if reservation[3] > now]
+            reserved_extents = [reservation[:2] for reservation in reservations]
+            if extents_overlap(self._get_extents(row) + reserved_extents, offset, offset + num_bytes):
+                return None
+
+            reservation = [
+                offset,
+                offset + num_bytes,
+                uuid.uuid4().hex,
+                now + settings.TUS_PARALLEL_WRITES_RESERVATION_TIMEOUT,
+            ]
+            reservations.append(reservation)
+            queryset.update(upload_reservations=reservations)
+
+        self.upload_reservations = reservations
+        return reservation
+
+    def release_extent(self, reservation):
+        """
+        Drops a reservation (see `reserve_extent`) of a chunk that hasn't been accepted, along with the data that has
+          been written for it. Reservations that have been accepted (or that expired) are left alone.
+
+        :param list reservation:
+        """
+        if reservation not in (self.upload_reservations or []):
+            return
+
+        queryset = self.__class__._default_manager.filter(pk=self.pk)
+
+        with transaction.atomic(using=router.db_for_write(self.__class__, instance=self)):
+            row = queryset.select_for_update().values("upload_reservations").first()
+            if row is None:
+                return
+
+            reservations = row["upload_reservations"] or []
+            released = reservation in reservations
+            if released:
+                reservations = [other for other in reservations if other != reservation]
+                queryset.update(upload_reservations=reservations or None)
+
+        self.upload_reservations = reservations or None
+
+        if released:
+            self.get_chunk_store().discard_chunk(reservation[0])
+
+    def add_extent(self, offset, num_bytes, reservation=None):
+        """
+        Accepts `num_bytes` bytes of data at the given offset, for uploads that receive chunks out of order. The
+          received ranges are tracked in `upload_extents`, the upload_offset is the length of the contiguous range at the
+          start of the file. The row is only locked while the extents are merged, so concurrent chunks don't get lost.
+
+        The data of a chunk that is received out of order is written in place, within the range it reserved (see
+          `reserve_extent`). It is only accepted if it still holds that reservation, so a chunk never overwrites data
+          that has been accepted.
+
+        :param int offset:
+        :param int num_bytes:
+        :param list reservation: The reservation the data was written in (None: the range must not overlap a reservation)
+        :return bool: False if the upload was already complete, or the range overlaps a received (or reserved) range
+        """
+        queryset = self.__class__._default_manager.filter(pk=self.pk)
+
+        with transaction.atomic(using=router.db_for_write(self.__class__, instance=self)):
+            row = (
+                queryset.select_for_update()
+                .values("state", "upload_offset", "upload_extents", "upload_reservations")
+                .get()
+            )
+            if row["upload_offset"] == self.upload_length:
+                return False
+
+            # Only the first chunk that is accepted moves the upload to the receiving state
+            start_receiving = row["state"] == states.INITIAL
+
+            reservations = row["upload_reservations"] or []
+            if reservation is not None:
+                if (
+                    reservation not in reservations
+                    or not reservation[0] <= offset <= offset + num_bytes <= reservation[1]
+                ):
+                    return False
+                reservations = [other for other in reservations if other != reservation]
+
+            extents = self._get_extents(row)
+            reserved_extents = [other[:2] for other in reservations if other[3] > time.time()]
+            if extents_overlap(extents + reserved_extents, offset, offset + num_bytes):
+                return False
+
+            extents = merge_extents(extents, offset, offset + num_bytes)
+            upload_offset = extents[0][1] if extents[0][0] == 0 else 0
+
+            state = states.RECEIVING if start_receiving else row["state"]
+            queryset.update(
+                upload_offset=upload_offset,
+                upload_extents=extents,
+                upload_reservations=reservations or None,
+                state=state,
+            )
+
+        self.state = state
+        self.upload_offset = upload_offset
+        self.upload_extents = extents
+        self.upload_reservations = reservations or None
+
+        if start_receiving:
+            signals.receiving.send(sender=self.__class__, instance=self)
+
+        if self.is_complete():
+            # The last chunk isn't necessarily the one at the end of the file
+            if settings.TUS_DURABILITY == "completion":
+                self.get_chunk_store().sync()
+            self.close_temporary_file()
+
+        return True
+
+    @staticmethod
+    def _get_extents(row):
+        # Uploads that received their first chunks in order only have an upload_offset
+        if row["upload_extents"] is None:
+            return [[0, row["upload_offset"]]] if row["upload_offset"] else []
+        return row["upload_extents"]
+
+    def get_missing_extents(self):
+        """
+        Returns the `[start, end)` ranges that have not been received yet, for uploads that receive chunks out of order
+
+        :return list: The missing ranges, or None if the upload doesn't track extents
+        """
+        if self.upload_extents is None or self.upload_length < 0:
+            return None
+        return get_missing_extents(self.upload_extents, self.upload_length)
+
+    def create_chunk_digest_hasher(self, offset=None):
+        """
+        Returns a hash object to compute the digests of the leaves of the digest tree in the next chunk, or None if
+          upload digests are disabled. The leaves are `TUS_UPLOAD_DIGEST_LEAF_SIZE` bytes, so the tree is only kept while
+          the chunks start at a leaf boundary (the data of a partial leaf is never read back from the chunk store). Use
+          chunk sizes that are a multiple of the leaf size.
+
+        :param int offset: The offset at which the chunk will be written (defaults to the current upload_offset)
+        :return ~rest_framework_tus.utils.LeafHasher: The hasher, or None if the chunk isn't covered by the tree
+        """
+        if not settings.TUS_UPLOAD_DIGEST_ALGORITHM:
+            return None
+
+        offset = self.upload_offset if offset is None else offset
+        leaf_size = settings.TUS_UPLOAD_DIGEST_LEAF_SIZE
 
-        if num_bytes_written > 0:
-            self.upload_offset += num_bytes_written
-            self.save()
+        # The tree has been dropped, or the chunk starts within a leaf
+        if offset and (not self.upload_digest_state or offset % leaf_size):
+            return None
+
+        return LeafHasher(settings.TUS_UPLOAD_DIGEST_ALGORITHM, leaf_size)
+
+    def add_chunk_digest(self, num_bytes, chunk_digest_hasher):
+        """
+        Adds the digests of the leaves that were completed by a chunk, written at the current upload_offset, to the
+          digest tree of the upload. The tree is a Merkle mountain range, of which only the peaks are kept in
+          `upload_digest_state` (see `get_digest_peaks`), so the state stays O(log n) for n leaves. Once the upload is
+          complete, the root of the tree is stored in `upload_digest`, so the digest of the whole file is known without
+          reading the temporary file again. Anyone can verify it, by hashing the file in leaves of `leaf_size` bytes.
+
+        A chunk that ends within a leaf (and isn't the last one) drops the tree, as the next chunk would have to read
+          that leaf back.
+
+        :param int num_bytes:
+        :param ~rest_framework_tus.utils.LeafHasher chunk_digest_hasher: The hasher that was updated with the chunk
+        :return bool: Whether or not the digest state has changed
+        """
+        digest_algorithm = chunk_digest_hasher.digest_algorithm
+        leaf_size = chunk_digest_hasher.leaf_size
+        state = self.upload_digest_state
+
+        # Start a new tree for the first chunk
+        if self.upload_offset == 0:
+            state = {"algorithm": digest_algorithm, "leaf_size": leaf_size, "num_leaves": 0, "peaks": []}
+
+        upload_offset = self.upload_offset + num_bytes
+        leaf_digests = list(chunk_digest_hasher.leaf_digests)
+        if upload_offset == self.upload_length and chunk_digest_hasher.partial_leaf_digest() is not None:
+            # The last leaf of the file is shorter
+            leaf_digests.append(chunk_digest_hasher.partial_leaf_digest())
+
+        # The tree only covers the upload when it tracked every leaf so far, and when the chunk ends on a leaf boundary
+        if (
+            not state
+            or state.get("algorithm") != digest_algorithm
+            or state.get("leaf_size") != leaf_size
+            or state.get("num_leaves") != self.upload_offset // leaf_size
+            or len(chunk_digest_hasher.leaf_digests) != upload_offset // leaf_size - self.upload_offset // leaf_size
+            or (upload_offset % leaf_size and upload_offset != self.upload_length)
+        ):
+            changed = self.upload_digest_state is not None
+            self.upload_digest_state = None
+            return changed
+
+        if not leaf_digests and state is self.upload_digest_state:
+            return False
+
+        peaks = state["peaks"]
+        for leaf_digest in leaf_digests:
+            peaks = merkle_append(peaks, leaf_digest, digest_algorithm)
+        self.upload_digest_state = dict(state, num_leaves=state["num_leaves"] + len(leaf_digests), peaks=peaks)
+
+        if upload_offset == self.upload_length:
+            root = merkle_root(peaks, digest_algorithm)
+            self.upload_digest = f"{digest_algorithm} {root}"
+
+        return True
+
+    def get_digest_peaks(self):
+        """
+        Returns the `[height, hex-digest]` peaks of the digest tree (see `add_chunk_digest`), or None if the upload
+          doesn't have a digest tree
+        """
+        if not self.upload_digest_state or "peaks" not in self.upload_digest_state:
+            return None
+        return [list(peak) for peak in self.upload_digest_state["peaks"]]
+
+    def truncate_temporary_file(self, offset):
+        """
+        Rolls back data that was written to the chunk store beyond the given offset
+        """
+        self.get_chunk_store().truncate(offset)
+
+    def close_temporary_file(self):
+        """
+        Releases the resources the chunk store holds for writing (e.g. a cached file descriptor)
+        """
+        self.get_chunk_store().close()
 
     def delete(self, *args, **kwargs):
-        if self.temporary_file_path and os.path.exists(self.temporary_file_path):
-            os.remove(self.temporary_file_path)
+        self.get_chunk_store().delete()
+        delete_cached_head_headers(self.guid)
         super().delete(*args, **kwargs)
 
     def generate_filename(self):
@@ -72,25 +408,118 @@ class AbstractUpload(models.Model):
             update_fields=update_fields,
         )
 
+    def get_upload_metadata_header(self):
+        """
+        Returns the encoded Upload-Metadata header. Uploads created before the header was stored get it encoded from
+          the upload_metadata (once per instance).
+
+        :return str:
+        """
+        if not self.upload_metadata_header and self.upload_metadata:
+            self.upload_metadata_header = encode_upload_metadata(json.loads(self.upload_metadata))
+        return self.upload_metadata_header
+
     def is_complete(self):
         return self.upload_offset == self.upload_length
 
+    def is_partial(self):
+        """
+        Whether or not this is a partial upload, which is concatenated into a final upload (and never saved by itself)
+        """
+        return self.upload_concat == "partial"
+
+    def is_final(self):
+        """
+        Whether or not this is a final upload, the concatenation of partial uploads
+        """
+        return self.upload_concat.startswith("final;")
+
+    def concatenate(self, partial_uploads):
+        """
+        Writes the data of the given (complete) partial uploads to the chunk store, one after the other. The
+          upload_offset itself is left untouched.
+
+        :param list partial_uploads:
+        :return int: The amount of bytes written
+        """
+        return self.get_chunk_store().concatenate(partial_uploads)
+
+    @classmethod
+    def get_chunk_store_class(cls):
+        return import_string(settings.TUS_CHUNK_STORE_CLASS)
+
+    def get_chunk_store(self):
+        """
+        Returns the chunk store that holds the data of this upload while it is being received
+        """
+        chunk_store = getattr(self, "_chunk_store", None)
+        if chunk_store is None:
+            chunk_store = self._chunk_store = self.get_chunk_store_class()(self)
+        return chunk_store
+
     def temporary_file_exists(self):
         return self.temporary_file_path and os.path.isfile(self.temporary_file_path)
 
-    def _temporary_file_exists(self):
-        return self.temporary_file_exists()
+    def _chunk_store_exists(self):
+        return self.get_chunk_store().exists()
+
+    @classmethod
+    def get_temporary_file_path(cls, guid):
+        """
+        Returns the path of the temporary file for the upload with the given guid. Temporary files are spread over the
+          configured upload directories, in a tree of `TUS_UPLOAD_DIR_SHARD_DEPTH` levels of hashed subdirectories, so
+          no directory ends up holding a huge amount of files.
+
+        :param uuid.UUID guid:
+        :return str:
+        """
+        digest = hashlib.sha256(guid.bytes).hexdigest()
+        upload_dirs = get_upload_dirs()
+        upload_dir = upload_dirs[int(digest[-8:], 16) % len(upload_dirs)]
+        shards = [digest[index * 2 : index * 2 + 2] for index in range(settings.TUS_UPLOAD_DIR_SHARD_DEPTH)]
+        return os.path.join(upload_dir, *shards, f"tus-upload-{guid}")
+
+    @classmethod
+    def create_temporary_file(cls, guid=None, upload_length=-1):
+        """
+        Creates an empty temporary file for an upload. When `TUS_PREALLOCATE` is enabled and the upload length is known,
+          the disk space for the whole upload is allocated right away (raises an OSError when it's not available).
+
+        :param uuid.UUID guid: The guid of the upload
+        :param int upload_length: The length of the upload
+        :return str: The path of the temporary file
+        """
+        path = cls.get_temporary_file_path(guid or uuid.uuid4())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+
+        if settings.TUS_PREALLOCATE and upload_length > 0:
+            try:
+                preallocate_file(path, upload_length)
+            except OSError:
+                os.remove(path)
+                raise
+
+        return path
+
+    @classmethod
+    def get_temporary_file_directories(cls):
+        """
+        Returns the directories in which temporary files are created, as `(path, recursive)` tuples
+
+        :return list:
+        """
+        # The system's temporary directory holds the temporary files of uploads created by older versions
+        return [(upload_dir, True) for upload_dir in get_upload_dirs()] + [(tempfile.gettempdir(), False)]
 
     def get_or_create_temporary_file(self):
         if not self.temporary_file_path:
-            fd, path = tempfile.mkstemp(prefix="tus-upload-")
-            os.close(fd)
-            self.temporary_file_path = path
-            self.save()
+            self.temporary_file_path = self.create_temporary_file(self.guid, self.upload_length)
+            self.save(update_fields=["temporary_file_path"])
         assert os.path.isfile(self.temporary_file_path)
         return self.temporary_file_path
 
-    @transition(field=state, source=states.INITIAL, target=states.RECEIVING, conditions=[_temporary_file_exists])
+    @transition(field=state, source=states.INITIAL, target=states.RECEIVING, conditions=[_chunk_store_exists])
     def start_receiving(self):
         """
         State transition to indicate the first file chunk has been received successfully
@@ -11,9 +11,52 @@ REST_FRAMEWORK_TUS = getattr(django_settings, "REST_FRAMEWORK_TUS", {})
 # Retrieve settings
 TUS_UPLOAD_MODEL = REST_FRAMEWORK_TUS.get("UPLOAD_MODEL", "rest_framework_tus.Upload")
 TUS_UPLOAD_EXPIRES = REST_FRAMEWORK_TUS.get("UPLOAD_EXPIRES", relativedelta.relativedelta(days=1))
+# Partial uploads expire even when UPLOAD_EXPIRES is None, as they are never saved by themselves
+TUS_PARTIAL_UPLOAD_EXPIRES = REST_FRAMEWORK_TUS.get("PARTIAL_UPLOAD_EXPIRES", relativedelta.relativedelta(days=1))
 TUS_UPLOAD_DIR = REST_FRAMEWORK_TUS.get("UPLOAD_DIR", os.path.join(django_settings.BASE_DIR, "tmp", "uploads"))
+TUS_UPLOAD_DIRS = REST_FRAMEWORK_TUS.get("UPLOAD_DIRS", None)  # Spread temporary files over multiple directories
+TUS_UPLOAD_DIR_SHARD_DEPTH = REST_FRAMEWORK_TUS.get("UPLOAD_DIR_SHARD_DEPTH", 2)
 TUS_UPLOAD_DESTINATION = REST_FRAMEWORK_TUS.get("TUS_UPLOAD_DESTINATION", "uploaded")
 TUS_RESPONSE_BODY_ENABLED = REST_FRAMEWORK_TUS.get("RESPONSE_BODY_ENABLED", False)
 TUS_SAVE_HANDLER_CLASS = REST_FRAMEWORK_TUS.get("SAVE_HANDLER_CLASS", "rest_framework_tus.storage.DefaultSaveHandler")
 TUS_MAX_FILE_SIZE = REST_FRAMEWORK_TUS.get("MAX_FILE_SIZE", 4 * 1024 * 1024 * 1024)  # 4 GB
 TUS_FILENAME_METADATA_FIELD = REST_FRAMEWORK_TUS.get("FILENAME_METADATA_FIELD", "filename")
+TUS_STREAMING_ENABLED = REST_FRAMEWORK_TUS.get("STREAMING_ENABLED", False)
+TUS_STREAMING_BUFFER_SIZE = REST_FRAMEWORK_TUS.get("STREAMING_BUFFER_SIZE", 64 * 1024)  # 64 KB
+TUS_PIPELINING_ENABLED = REST_FRAMEWORK_TUS.get("PIPELINING_ENABLED", False)  # Read the next buffer while writing
+TUS_PIPELINE_NUM_BUFFERS = REST_FRAMEWORK_TUS.get("PIPELINE_NUM_BUFFERS", 2)
+TUS_UPLOAD_DIGEST_ALGORITHM = REST_FRAMEWORK_TUS.get("UPLOAD_DIGEST_ALGORITHM", None)
+TUS_UPLOAD_DIGEST_LEAF_SIZE = REST_FRAMEWORK_TUS.get("UPLOAD_DIGEST_LEAF_SIZE", 4 * 1024 * 1024)  # 4 MB
+TUS_UPLOAD_LOCK_CLASS = REST_FRAMEWORK_TUS.get("UPLOAD_LOCK_CLASS", "rest_framework_tus.locks.NullUploadLock")
+TUS_UPLOAD_LOCK_TIMEOUT = REST_FRAMEWORK_TUS.get("UPLOAD_LOCK_TIMEOUT", 0)  # seconds
+TUS_UPLOAD_LOCK_CACHE = REST_FRAMEWORK_TUS.get("UPLOAD_LOCK_CACHE", "default")
+TUS_UPLOAD_LOCK_LEASE = REST_FRAMEWORK_TUS.get("UPLOAD_LOCK_LEASE", 30)  # seconds, renewed while the lock is held
+# Cache alias, None disables the HEAD cache. Cached headers bypass the queryset and object permissions of the view, so
+#  views that restrict access per upload don't use it (see `TusHeadMixin.is_head_cache_enabled`).
+TUS_HEAD_CACHE = REST_FRAMEWORK_TUS.get("HEAD_CACHE", None)
+TUS_HEAD_CACHE_TIMEOUT = REST_FRAMEWORK_TUS.get("HEAD_CACHE_TIMEOUT", 60 * 60)  # seconds
+TUS_MIDDLEWARE_PATH_PREFIXES = REST_FRAMEWORK_TUS.get("MIDDLEWARE_PATH_PREFIXES", None)  # None: all paths
+TUS_MIDDLEWARE_VIEW_CLASSES = REST_FRAMEWORK_TUS.get("MIDDLEWARE_VIEW_CLASSES", None)  # None: all views
+TUS_PREALLOCATE = REST_FRAMEWORK_TUS.get("PREALLOCATE", False)
+TUS_DURABILITY = REST_FRAMEWORK_TUS.get("DURABILITY", "none")  # "none", "chunk" or "completion"
+TUS_DURABILITY_FULL_SYNC = REST_FRAMEWORK_TUS.get("DURABILITY_FULL_SYNC", False)  # fsync instead of fdatasync
+TUS_FILE_HANDLE_CACHE_SIZE = REST_FRAMEWORK_TUS.get("FILE_HANDLE_CACHE_SIZE", 0)  # Per process, 0 to disable
+TUS_FILE_HANDLE_CACHE_IDLE_TIMEOUT = REST_FRAMEWORK_TUS.get("FILE_HANDLE_CACHE_IDLE_TIMEOUT", 60)  # seconds
+TUS_PAGE_CACHE_HINTS = REST_FRAMEWORK_TUS.get("PAGE_CACHE_HINTS", False)  # posix_fadvise, keeps uploads out of cache
+TUS_DIRECT_IO = REST_FRAMEWORK_TUS.get("DIRECT_IO", False)  # Write aligned buffers with O_DIRECT
+TUS_FINALIZATION_EXECUTOR_CLASS = REST_FRAMEWORK_TUS.get(
+    "FINALIZATION_EXECUTOR_CLASS", "rest_framework_tus.finalization.SynchronousFinalizationExecutor"
+)
+TUS_FINALIZATION_WORKERS = REST_FRAMEWORK_TUS.get("FINALIZATION_WORKERS", 4)
+TUS_FINALIZATION_RETRIES = REST_FRAMEWORK_TUS.get("FINALIZATION_RETRIES", 3)
+TUS_FINALIZATION_RETRY_DELAY = REST_FRAMEWORK_TUS.get("FINALIZATION_RETRY_DELAY", 5)  # seconds, doubled every retry
+TUS_FINALIZATION_LEASE = REST_FRAMEWORK_TUS.get("FINALIZATION_LEASE", 60 * 60)  # seconds
+TUS_PARALLEL_WRITES = REST_FRAMEWORK_TUS.get("PARALLEL_WRITES", False)  # Accept chunks at any offset, out of order
+TUS_PARALLEL_WRITES_RESERVATION_TIMEOUT = REST_FRAMEWORK_TUS.get("PARALLEL_WRITES_RESERVATION_TIMEOUT", 60 * 60)  # secs
+TUS_CHUNK_STORE_CLASS = REST_FRAMEWORK_TUS.get(
+    "CHUNK_STORE_CLASS", "rest_framework_tus.chunkstores.LocalFileChunkStore"
+)
+TUS_CHUNK_STORE_STORAGE = REST_FRAMEWORK_TUS.get("CHUNK_STORE_STORAGE", None)  # Storage alias, None: default storage
+TUS_CHUNK_STORE_PREFIX = REST_FRAMEWORK_TUS.get("CHUNK_STORE_PREFIX", "tus-chunks")
+TUS_CHUNK_STORE_SPOOL_SIZE = REST_FRAMEWORK_TUS.get("CHUNK_STORE_SPOOL_SIZE", 1024 * 1024)  # 1 MB, kept in memory
+TUS_ASYNC_WORKERS = REST_FRAMEWORK_TUS.get("ASYNC_WORKERS", 16)  # Chunks written at the same time by the async views
@@ -2,3 +2,4 @@ INITIAL = "initial"
 RECEIVING = "receiving"
 SAVING = "saving"
 DONE = "done"
+FAILED = "failed"
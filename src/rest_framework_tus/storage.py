@@ -1,11 +1,14 @@
+import os
 from abc import ABCMeta, abstractmethod
 
 from django.core.files import File
+from django.core.files.storage import FileSystemStorage
 from django.utils.module_loading import import_string
 
 from six import with_metaclass
 
-from rest_framework_tus import signals
+from rest_framework_tus import settings, signals
+from rest_framework_tus.utils import fadvise, get_umask, move_file
 
 from .settings import TUS_SAVE_HANDLER_CLASS
 
@@ -41,11 +44,100 @@ class DefaultSaveHandler(AbstractUploadSaveHandler):
     def handle_save(self):
         # Save temporary field to file field
         file_field = getattr(self.upload, self.destination_file_field)
-        file_field.save(self.upload.filename, File(open(self.upload.temporary_file_path, "rb")))
+        with self.upload.get_chunk_store().open() as fh:
+            # The temporary file (if any) is read once, from start to end
+            page_cache_hints = settings.TUS_PAGE_CACHE_HINTS and self.upload.temporary_file_path
+            if page_cache_hints:
+                fadvise(fh.fileno(), 0, 0, "POSIX_FADV_SEQUENTIAL")
+                fadvise(fh.fileno(), 0, 0, "POSIX_FADV_NOREUSE")
+
+            file_field.save(self.upload.filename, File(fh))
+
+            if page_cache_hints:
+                fadvise(fh.fileno(), 0, 0, "POSIX_FADV_DONTNEED")
 
         # Finish upload
         self.finish()
 
 
+class FileSystemSaveHandler(DefaultSaveHandler):
+    """
+    Save handler that moves the temporary file into a `FileSystemStorage`, instead of copying it through Python. On
+      the same file system the file is hard linked (or renamed), otherwise it is copied in the kernel. Other storages
+      are handled like the `DefaultSaveHandler` does.
+    """
+
+    def handle_save(self):
+        file_field = getattr(self.upload, self.destination_file_field)
+        if not self.can_move_to_storage(file_field.storage) or not self.upload.temporary_file_path:
+            return super().handle_save()
+
+        # No more data will be written to the temporary file
+        self.upload.close_temporary_file()
+
+        file_field.name = self.move_to_storage(file_field)
+        file_field._committed = True
+
+        # Finish upload
+        self.finish()
+
+    def can_move_to_storage(self, storage):
+        """
+        Whether or not the temporary file can be moved into the given storage. Subclasses of `FileSystemStorage` that
+          override `_save` (e.g. to post-process the file) get the file through `_save`, like any other storage.
+        """
+        # The storage might be lazy (e.g. `default_storage`), so look at the method instead of its type
+        return (
+            isinstance(storage, FileSystemStorage)
+            and getattr(storage._save, "__func__", None) is FileSystemStorage._save
+        )
+
+    def create_directory(self, storage, directory):
+        """
+        Creates the given directory (and any missing parents) with the permissions `FileSystemStorage` would use
+        """
+        if storage.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+
+        # `os.makedirs` doesn't apply its mode to intermediate directories, so clear the umask instead
+        old_umask = os.umask(0o777 & ~storage.directory_permissions_mode)
+        try:
+            os.makedirs(directory, storage.directory_permissions_mode, exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    def move_to_storage(self, file_field):
+        """
+        Moves the temporary file into the storage of the given file field
+
+        :param ~django.db.models.fields.files.FieldFile file_field:
+        :return str: The name of the file in the storage
+        """
+        storage = file_field.storage
+        name = file_field.field.generate_filename(self.upload, self.upload.filename)
+        name = storage.get_available_name(name, max_length=file_field.field.max_length)
+
+        while True:
+            full_path = storage.path(name)
+            self.create_directory(storage, os.path.dirname(full_path))
+            try:
+                move_file(self.upload.temporary_file_path, full_path)
+            except FileExistsError:
+                # Taken by someone else in the meantime
+                name = storage.get_available_name(name, max_length=file_field.field.max_length)
+            else:
+                break
+
+        # The temporary file is only accessible by its owner, apply the permissions a saved file would get
+        if storage.file_permissions_mode is not None:
+            os.chmod(full_path, storage.file_permissions_mode)
+        else:
+            os.chmod(full_path, 0o666 & ~get_umask())
+
+        # Store filenames relative to the storage root, with forward slashes
+        return os.path.relpath(full_path, storage.location).replace("\\", "/")
+
+
 def get_save_handler(import_path=None):
     return import_string(import_path or TUS_SAVE_HANDLER_CLASS)
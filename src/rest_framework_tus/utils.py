@@ -1,12 +1,24 @@
+import errno
 import hashlib
+import mmap
 import os
+import queue
 import sys
 import tempfile
+import threading
 
 import six
 
+from .checksums import get_checksum_hasher_factory
 from .compat import encode_base64
 
+# Domain separation between leaves and inner nodes of digest trees (RFC 6962)
+MERKLE_LEAF_PREFIX = b"\x00"
+MERKLE_NODE_PREFIX = b"\x01"
+
+# Offsets, lengths and memory of O_DIRECT writes must be aligned to the logical block size (at most 4 KB)
+DIRECT_IO_ALIGNMENT = 4096
+
 
 def encode_base64_to_string(data):
     """
@@ -77,6 +89,408 @@ def write_bytes_to_file(file_path, offset, bytes, makedirs=False):
     return num_bytes_written
 
 
+def write_buffers_to_file(
+    file_path, offset, buffers, makedirs=False, durability=None, complete=None, direct_fd=None, drop_cache=False
+):
+    """
+    Util to write an iterable of buffers to a local file, starting at a specific offset. The file is opened once and
+      the buffers are written one after the other, so only a single buffer needs to be in memory at any time.
+
+    :param str file_path:
+    :param int offset:
+    :param iterable buffers: An iterable of six.binary_type buffers
+    :param bool makedirs: Whether or not to create the file_path's directories if they don't exist
+    :param ~rest_framework_tus.durability.DurabilityPolicy durability: Decides when the written data is synced to disk
+    :param callable complete: Returns whether or not the upload is complete, given the amount of bytes written
+    :param int direct_fd: A descriptor of the same file, opened with O_DIRECT (see `pwrite_buffers`)
+    :param bool drop_cache: Whether or not to drop the written data from the page cache (see `pwrite_buffers`)
+    :return int: The amount of bytes written
+    """
+    if makedirs:
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        return pwrite_buffers(
+            fd, offset, buffers, durability=durability, complete=complete, direct_fd=direct_fd, drop_cache=drop_cache
+        )
+    finally:
+        os.close(fd)
+
+
+def pwrite_buffers(fd, offset, buffers, durability=None, complete=None, direct_fd=None, drop_cache=False):
+    """
+    Util to write an iterable of buffers to an open file descriptor with `os.pwrite`, starting at a specific offset.
+      The file position of the descriptor is not used, so the descriptor can be shared.
+
+    :param int fd:
+    :param int offset:
+    :param iterable buffers: An iterable of six.binary_type buffers
+    :param ~rest_framework_tus.durability.DurabilityPolicy durability: Decides when the written data is synced to disk
+    :param callable complete: Returns whether or not the upload is complete, given the amount of bytes written
+    :param int direct_fd: A descriptor of the same file, opened with O_DIRECT (see `open_direct`). Buffers that start
+      and end at `DIRECT_IO_ALIGNMENT` boundaries are written through it, bypassing the page cache.
+    :param bool drop_cache: Whether or not to advise the kernel to drop the written data from the page cache once the
+      chunk has been written (only data that has been written back is dropped)
+    :return int: The amount of bytes written
+    """
+    num_bytes_written = 0
+    bounce_buffer = None
+
+    for buffer in buffers:
+        view = memoryview(buffer)
+        position = offset + num_bytes_written
+
+        if direct_fd is not None and view and is_direct_io_aligned(position, len(view)):
+            # O_DIRECT needs an aligned memory buffer as well, mmap'ed memory is page aligned
+            if bounce_buffer is None or len(bounce_buffer) < len(view):
+                bounce_buffer = mmap.mmap(-1, len(view))
+            bounce_view = memoryview(bounce_buffer)[: len(view)]
+            bounce_view[:] = view
+            try:
+                num_bytes = os.pwrite(direct_fd, bounce_view, position)
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+                # The file system requires a larger alignment, write the buffer through the page cache
+                num_bytes = 0
+            finally:
+                bounce_view.release()
+            num_bytes_written += num_bytes
+            view = view[num_bytes:]
+
+        while view:
+            num_bytes = os.pwrite(fd, view, offset + num_bytes_written)
+            num_bytes_written += num_bytes
+            view = view[num_bytes:]
+
+    if durability is not None:
+        durability.chunk_written(fd, complete=complete is not None and complete(num_bytes_written))
+
+    if drop_cache:
+        fadvise(fd, 0, offset + num_bytes_written, "POSIX_FADV_DONTNEED")
+
+    if bounce_buffer is not None:
+        bounce_buffer.close()
+
+    return num_bytes_written
+
+
+def is_direct_io_aligned(offset, length, alignment=DIRECT_IO_ALIGNMENT):
+    """
+    Checks if a write of `length` bytes at `offset` can be done with O_DIRECT
+    """
+    return offset % alignment == 0 and length % alignment == 0
+
+
+def open_direct(file_path):
+    """
+    Util to open a local file for writing with O_DIRECT
+
+    :param str file_path:
+    :return int: The file descriptor, or None if the platform or file system doesn't support O_DIRECT
+    """
+    if not hasattr(os, "O_DIRECT"):
+        return None
+
+    try:
+        return os.open(file_path, os.O_WRONLY | os.O_DIRECT)
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+        return None
+
+
+def fadvise(fd, offset, length, advice):
+    """
+    Util to give the kernel a hint about the way a file will be accessed. Hints that aren't supported by the platform
+      are ignored.
+
+    :param int fd:
+    :param int offset:
+    :param int length: The length of the range, 0 for the whole file
+    :param str advice: The name of the advice (e.g. "POSIX_FADV_DONTNEED")
+    :return bool: Whether or not the hint has been given
+    """
+    if not hasattr(os, "posix_fadvise") or not hasattr(os, advice):
+        return False
+
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+    except OSError:
+        return False
+    return True
+
+
+def preallocate_file(file_path, length):
+    """
+    Util to preallocate the disk space for a local file, so it doesn't get fragmented while it is being written. Raises
+      an OSError (ENOSPC) when there is not enough space available.
+
+    :param str file_path:
+    :param int length: The amount of bytes to preallocate
+    :return bool: Whether or not the space has been preallocated (not every platform supports it)
+    """
+    if not hasattr(os, "posix_fallocate"):
+        return False
+
+    fd = os.open(file_path, os.O_WRONLY)
+    try:
+        os.posix_fallocate(fd, 0, length)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+        # Not supported by the file system
+        return False
+    finally:
+        os.close(fd)
+
+    return True
+
+
+def get_umask():
+    """
+    Returns the umask of the process (which can only be read by setting it)
+    """
+    umask = os.umask(0o077)
+    os.umask(umask)
+    return umask
+
+
+def move_file(source_path, destination_path):
+    """
+    Util to move a local file to a path that doesn't exist yet, without copying the data when possible. On the same
+      file system the file is hard linked (or renamed, when hard links are not supported), otherwise it is copied in
+      the kernel (see `copy_file`). Raises a FileExistsError if the destination exists.
+
+    :param str source_path:
+    :param str destination_path:
+    :return bool: Whether or not the data has been copied
+    """
+    try:
+        # Unlike a rename, a hard link never replaces an existing file
+        os.link(source_path, destination_path)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP):
+            raise
+        if e.errno != errno.EXDEV and not os.path.exists(destination_path):
+            os.rename(source_path, destination_path)
+            return False
+    else:
+        os.remove(source_path)
+        return False
+
+    with open(source_path, "rb") as source:
+        fd = os.open(destination_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            copy_file(source.fileno(), fd, os.fstat(source.fileno()).st_size)
+        except BaseException:
+            os.close(fd)
+            os.remove(destination_path)
+            raise
+        os.close(fd)
+
+    os.remove(source_path)
+    return True
+
+
+def copy_file(source_fd, destination_fd, length, buffer_size=1024 * 1024):
+    """
+    Util to copy `length` bytes from one file descriptor to another, from their current positions. Uses
+      `os.copy_file_range` (which may share the data blocks on file systems that support it) or `os.sendfile`, so the
+      data doesn't pass through user space. Falls back to a streaming copy.
+
+    :param int source_fd:
+    :param int destination_fd:
+    :param int length:
+    :param int buffer_size: The size of the buffer of the streaming copy
+    :return int: The amount of bytes copied
+    """
+    copied = 0
+
+    for copy_function in (getattr(os, "copy_file_range", None), _sendfile):
+        if copy_function is None:
+            continue
+        try:
+            while copied < length:
+                num_bytes = copy_function(source_fd, destination_fd, length - copied)
+                if not num_bytes:
+                    return copied
+                copied += num_bytes
+            return copied
+        except OSError as e:
+            # Not supported for these files, continue where we left off
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EBADF):
+                raise
+
+    # Read into a single reusable buffer
+    buffer = bytearray(min(buffer_size, length))
+    with memoryview(buffer) as buffer_view:
+        while copied < length:
+            num_bytes = os.readv(source_fd, [buffer_view[: min(buffer_size, length - copied)]])
+            if not num_bytes:
+                break
+            view = buffer_view[:num_bytes]
+            while view:
+                view = view[os.write(destination_fd, view) :]
+            copied += num_bytes
+
+    return copied
+
+
+def _sendfile(source_fd, destination_fd, count):
+    if not hasattr(os, "sendfile"):
+        raise OSError(errno.ENOSYS, "sendfile is not available")
+    return os.sendfile(destination_fd, source_fd, None, count)
+
+
+def read_stream_in_buffers(stream, length, buffer_size):
+    """
+    Generator that reads at most `length` bytes from a file-like stream, in buffers of at most `buffer_size` bytes
+
+    :param stream: The file-like object to read from (e.g. a request)
+    :param int length: The maximum amount of bytes to read (e.g. the request's Content-Length)
+    :param int buffer_size: The maximum size of a single buffer
+    :return generator: A generator yielding six.binary_type buffers
+    """
+    remaining = length
+    while remaining > 0:
+        buffer = stream.read(min(buffer_size, remaining))
+        if not buffer:
+            # The client stopped sending data
+            return
+        remaining -= len(buffer)
+        yield buffer
+
+
+def read_stream_pipelined(stream, length, buffer_size, num_buffers=2):
+    """
+    Generator like `read_stream_in_buffers`, that reads the stream in a helper thread. While the caller processes (e.g.
+      hashes and writes) a buffer, the next one is read from the stream. The data is read into a ring of `num_buffers`
+      reusable bytearrays, which are yielded as memoryviews.
+
+    A yielded buffer is only valid until the next one is requested, it is overwritten afterwards. Errors raised while
+      reading the stream are raised by the generator.
+
+    The data is read straight into the buffers when the stream has a `readinto` method. Django's requests (and the
+      `LimitedStream` wrapping the WSGI input) don't have one, so for those every buffer is read as bytes and copied.
+
+    When the generator is closed early, the reader stops before its next read, and the generator waits until it has
+      exited. So the stream is never read once the generator is closed (e.g. while the server reads the next request
+      from the connection). The wait is at most a single pending read of `buffer_size` bytes, which a synchronous
+      reader would have been blocked on as well.
+
+    :param stream: The file-like object to read from (e.g. a request)
+    :param int length: The maximum amount of bytes to read (e.g. the request's Content-Length)
+    :param int buffer_size: The maximum size of a single buffer
+    :param int num_buffers: The amount of buffers in the ring (at least 2)
+    :return generator: A generator yielding memoryviews
+    """
+    readinto = getattr(stream, "readinto", None)
+    if readinto is None:
+
+        def readinto(view):
+            data = stream.read(len(view))
+            view[: len(data)] = data
+            return len(data)
+
+    free = queue.Queue()
+    filled = queue.Queue()
+    stopped = threading.Event()
+    for _ in range(max(num_buffers, 2)):
+        free.put(bytearray(min(buffer_size, length)))
+
+    def read():
+        remaining = length
+        try:
+            while remaining > 0:
+                buffer = free.get()
+                if stopped.is_set():
+                    return
+                with memoryview(buffer) as view:
+                    num_bytes = readinto(view[: min(len(buffer), remaining)])
+                if not num_bytes:
+                    # The client stopped sending data
+                    break
+                remaining -= num_bytes
+                filled.put((buffer, num_bytes, None))
+        except Exception as e:
+            filled.put((None, 0, e))
+            return
+        filled.put((None, 0, None))
+
+    reader = threading.Thread(target=read, name="tus-read", daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            buffer, num_bytes, error = filled.get()
+            if error is not None:
+                raise error
+            if buffer is None:
+                return
+            with memoryview(buffer) as view:
+                yield view[:num_bytes]
+            free.put(buffer)
+    finally:
+        # Wake up the reader if it's waiting for a buffer, and wait until it has stopped using the stream
+        stopped.set()
+        free.put(None)
+        reader.join()
+
+
+def merge_extents(extents, start, end):
+    """
+    Adds the range [start, end) to a sorted list of disjoint `[start, end)` extents, merging it with the extents it
+      overlaps or touches
+
+    :param list extents:
+    :param int start:
+    :param int end:
+    :return list: The new extents
+    """
+    result = []
+    for extent_start, extent_end in extents:
+        if extent_end < start or extent_start > end:
+            result.append([extent_start, extent_end])
+        else:
+            start, end = min(start, extent_start), max(end, extent_end)
+    result.append([start, end])
+    return sorted(result)
+
+
+def extents_overlap(extents, start, end):
+    """
+    Whether or not the range [start, end) overlaps one of the given `[start, end)` extents
+
+    :param list extents:
+    :param int start:
+    :param int end:
+    :return bool:
+    """
+    return any(extent_start < end and start < extent_end for extent_start, extent_end in extents)
+
+
+def get_missing_extents(extents, length):
+    """
+    Returns the `[start, end)` ranges of [0, length) that are not covered by a sorted list of disjoint extents
+
+    :param list extents:
+    :param int length:
+    :return list:
+    """
+    missing = []
+    position = 0
+    for extent_start, extent_end in extents:
+        if extent_start > position:
+            missing.append([position, extent_start])
+        position = max(position, extent_end)
+    if position < length:
+        missing.append([position, length])
+    return missing
+
+
 def read_bytes_from_field_file(field_file):
     """
     Returns the bytes read from a FieldFile
@@ -128,11 +542,140 @@ def create_checksum(bytes, checksum_algorithm):
     :param str checksum_algorithm: The algorithm to use (e.g. "md5")
     :return str: The checksum (hex)
     """
-    m = hashlib.new(checksum_algorithm)
+    m = create_hasher(checksum_algorithm)
     m.update(bytes)
     return m.hexdigest()
 
 
+def create_hasher(checksum_algorithm):
+    """
+    Creates a hash object for the given algorithm, which can be updated incrementally. Algorithms that have been
+      registered with `register_checksum_algorithm` (e.g. "crc32") take precedence over the ones of hashlib.
+
+    :param str checksum_algorithm: The algorithm to use (e.g. "md5")
+    :return: The hash object
+    """
+    factory = get_checksum_hasher_factory(checksum_algorithm)
+    if factory is not None:
+        return factory()
+    return hashlib.new(checksum_algorithm)
+
+
+def hash_buffers(buffers, hasher):
+    """
+    Generator that updates the given hash object with every buffer before yielding it
+
+    :param iterable buffers:
+    :param hasher: The hash object to update (see `create_hasher`)
+    :return generator:
+    """
+    for buffer in buffers:
+        hasher.update(buffer)
+        yield buffer
+
+
+def create_chunk_digest_hasher(digest_algorithm):
+    """
+    Creates a hash object for the leaf digest of a chunk in an upload's digest tree
+
+    :param str digest_algorithm: The algorithm to use (e.g. "sha256")
+    :return: The hash object
+    """
+    hasher = create_hasher(digest_algorithm)
+    hasher.update(MERKLE_LEAF_PREFIX)
+    return hasher
+
+
+class LeafHasher:
+    """
+    Hash object that splits the data it's updated with into leaves of `leaf_size` bytes, and computes the digest of
+      every leaf (see `create_chunk_digest_hasher`). The data should start at a leaf boundary.
+    """
+
+    def __init__(self, digest_algorithm, leaf_size):
+        self.digest_algorithm = digest_algorithm
+        self.leaf_size = leaf_size
+        self.leaf_digests = []
+        self._hasher = create_chunk_digest_hasher(digest_algorithm)
+        self._leaf_length = 0
+
+    def update(self, data):
+        view = memoryview(data).cast("B")
+        while view:
+            num_bytes = min(len(view), self.leaf_size - self._leaf_length)
+            self._hasher.update(view[:num_bytes])
+            self._leaf_length += num_bytes
+            view = view[num_bytes:]
+            if self._leaf_length == self.leaf_size:
+                self.leaf_digests.append(self._hasher.hexdigest())
+                self._hasher = create_chunk_digest_hasher(self.digest_algorithm)
+                self._leaf_length = 0
+
+    def partial_leaf_digest(self):
+        """
+        Returns the digest of the incomplete leaf at the end of the data (the last leaf of a file), or None
+        """
+        if not self._leaf_length:
+            return None
+        return self._hasher.hexdigest()
+
+
+def merkle_tree_root(leaf_digests, digest_algorithm):
+    """
+    Returns the root digest of the Merkle mountain range of the given leaf digests
+
+    :param list leaf_digests: The hex-digests of the leaves (from left to right)
+    :param str digest_algorithm: The algorithm to use (e.g. "sha256")
+    :return str: The root hex-digest, or None if there are no leaves
+    """
+    peaks = []
+    for leaf_digest in leaf_digests:
+        peaks = merkle_append(peaks, leaf_digest, digest_algorithm)
+    return merkle_root(peaks, digest_algorithm)
+
+
+def merkle_append(peaks, leaf_digest, digest_algorithm):
+    """
+    Appends a leaf digest to a Merkle mountain range, represented by its list of `[height, hex-digest]` peaks. Peaks
+      of equal height are merged, so only O(log n) peaks need to be stored for n leaves.
+
+    :param list peaks: The current peaks (from left to right)
+    :param str leaf_digest: The hex-digest of the leaf (see `create_chunk_digest_hasher`)
+    :param str digest_algorithm: The algorithm to use (e.g. "sha256")
+    :return list: The new peaks
+    """
+    peaks = [list(peak) for peak in peaks]
+    height, digest = 0, leaf_digest
+    while peaks and peaks[-1][0] == height:
+        _, left_digest = peaks.pop()
+        digest = _merkle_node(left_digest, digest, digest_algorithm)
+        height += 1
+    peaks.append([height, digest])
+    return peaks
+
+
+def merkle_root(peaks, digest_algorithm):
+    """
+    Returns the root digest of a Merkle mountain range, by folding its peaks from right to left
+
+    :param list peaks: The peaks (from left to right)
+    :param str digest_algorithm: The algorithm to use (e.g. "sha256")
+    :return str: The root hex-digest, or None if there are no peaks
+    """
+    root = None
+    for _, digest in reversed(peaks):
+        root = digest if root is None else _merkle_node(digest, root, digest_algorithm)
+    return root
+
+
+def _merkle_node(left_digest, right_digest, digest_algorithm):
+    hasher = create_hasher(digest_algorithm)
+    hasher.update(MERKLE_NODE_PREFIX)
+    hasher.update(bytes.fromhex(left_digest))
+    hasher.update(bytes.fromhex(right_digest))
+    return hasher.hexdigest()
+
+
 def create_checksum_header(bytes, checksum_algorithm):
     """
     Creates a hex-checksum header for the given bytes using the given algorithm
@@ -1,13 +1,18 @@
+import errno
 import json
 import logging
+import uuid
+from contextlib import ExitStack
+from urllib.parse import urlparse
 
-from django.http import Http404
+from django.http import Http404, UnreadablePostError
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from rest_framework import mixins, status
-from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.exceptions import APIException, MethodNotAllowed, ValidationError
 from rest_framework.metadata import BaseMetadata
+from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
@@ -23,11 +28,25 @@ from . import (
     tus_api_version,
     tus_api_version_supported,
 )
+from .cache import (
+    add_cached_head_headers,
+    delete_cached_head_headers,
+    get_cached_head_headers,
+    get_head_cache,
+    set_cached_head_headers,
+)
 from .compat import reverse
-from .exceptions import Conflict
+from .exceptions import Conflict, InsufficientStorage
+from .locks import get_upload_lock
 from .models import get_upload_model
 from .serializers import UploadSerializer
-from .utils import checksum_matches, encode_upload_metadata
+from .utils import (
+    create_hasher,
+    extents_overlap,
+    hash_buffers,
+    read_stream_in_buffers,
+    read_stream_pipelined,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -36,11 +55,44 @@ def has_required_tus_header(request):
     return hasattr(request, constants.TUS_RESUMABLE_FIELD_NAME)
 
 
+def get_upload_lock_class(view):
+    return getattr(view, "upload_lock_class", None) or get_upload_lock()
+
+
 def add_expiry_header(upload, headers):
     if upload.expires:
         headers["Upload-Expires"] = upload.expires.strftime("%a, %d %b %Y %H:%M:%S %Z")
 
 
+def get_head_headers(upload):
+    headers = {
+        "Upload-Offset": upload.upload_offset,
+    }
+
+    if upload.upload_length >= 0:
+        headers["Upload-Length"] = upload.upload_length
+
+    upload_metadata_header = upload.get_upload_metadata_header()
+    if upload_metadata_header:
+        headers["Upload-Metadata"] = upload_metadata_header
+
+    if upload.upload_digest:
+        headers["Upload-Digest"] = upload.upload_digest
+
+    if upload.upload_concat:
+        headers["Upload-Concat"] = upload.upload_concat
+
+    # The ranges an upload that receives chunks out of order is still waiting for (end inclusive, like HTTP ranges)
+    missing_extents = upload.get_missing_extents()
+    if missing_extents:
+        headers["Upload-Missing-Ranges"] = ",".join(f"{start}-{end - 1}" for start, end in missing_extents)
+
+    # Add upload expiry to headers
+    add_expiry_header(upload, headers)
+
+    return headers
+
+
 class UploadMetadata(BaseMetadata):
     def determine_metadata(self, request, view):
         return {
@@ -51,7 +103,8 @@ class UploadMetadata(BaseMetadata):
             "Tus-Checksum-Algorithm": ",".join(tus_api_checksum_algorithms),
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "PATCH,HEAD,GET,POST,OPTIONS",
-            "Access-Control-Expose-Headers": "Tus-Resumable,Upload-Length,Upload-Metadata,Location,Upload-Offset",
+            "Access-Control-Expose-Headers": "Tus-Resumable,Upload-Length,Upload-Metadata,Location,Upload-Offset,"
+            "Upload-Digest,Upload-Missing-Ranges",
             "Access-Control-Allow-Headers": "Tus-Resumable,Upload-Length,Upload-Metadata,Location,Upload-Offset,"
             "Content-Type",
             "Cache-Control": "no-store",
@@ -60,31 +113,49 @@ class UploadMetadata(BaseMetadata):
 
 class TusHeadMixin:
     def info(self, request, *args, **kwargs):
+        """
+        Answers HEAD requests. When the HEAD cache is enabled (see `is_head_cache_enabled`), cached headers are served
+          without looking up the upload, so `get_queryset` and `check_object_permissions` don't run for them.
+        """
         # Validate tus header
         if not has_required_tus_header(request):
             return Response('Missing "{}" header.'.format("Tus-Resumable"), status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            upload = self.get_object()
-        except Http404:
-            # Instead of simply trowing a 404, we need to add a cache-control header to the response
-            return Response("Not found.", headers={"Cache-Control": "no-store"}, status=status.HTTP_404_NOT_FOUND)
+        # Try to answer from the cache, without touching the database
+        headers = None
+        if self.is_head_cache_enabled():
+            headers = get_cached_head_headers(kwargs[self.lookup_url_kwarg or self.lookup_field])
 
-        headers = {
-            "Upload-Offset": upload.upload_offset,
-            "Cache-Control": "no-store",
-        }
+        if headers is None:
+            try:
+                upload = self.get_object()
+            except Http404:
+                # Instead of simply trowing a 404, we need to add a cache-control header to the response
+                return Response("Not found.", headers={"Cache-Control": "no-store"}, status=status.HTTP_404_NOT_FOUND)
 
-        if upload.upload_length >= 0:
-            headers["Upload-Length"] = upload.upload_length
+            headers = get_head_headers(upload)
+            add_cached_head_headers(upload, headers)
 
-        if upload.upload_metadata:
-            headers["Upload-Metadata"] = encode_upload_metadata(json.loads(upload.upload_metadata))
+        return Response(headers=dict(headers, **{"Cache-Control": "no-store"}), status=status.HTTP_200_OK)
 
-        # Add upload expiry to headers
-        add_expiry_header(upload, headers)
+    def is_head_cache_enabled(self):
+        """
+        Whether or not HEAD requests may be answered from the HEAD cache (`TUS_HEAD_CACHE`). As cached headers bypass the
+          queryset and the object permissions, the cache is only used by views that don't restrict access per upload:
+          views that don't override `get_queryset`, don't have filter backends and whose permissions don't implement
+          `has_object_permission`. Set `head_cache_enabled` on the view to decide otherwise.
+        """
+        head_cache_enabled = getattr(self, "head_cache_enabled", None)
+        if head_cache_enabled is not None:
+            return head_cache_enabled
 
-        return Response(headers=headers, status=status.HTTP_200_OK)
+        if type(self).get_queryset is not UploadViewSet.get_queryset or self.filter_backends:
+            return False
+
+        return all(
+            type(permission).has_object_permission is BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
 
 
 class TusCreateMixin(mixins.CreateModelMixin):
@@ -96,6 +167,17 @@ class TusCreateMixin(mixins.CreateModelMixin):
         # Get file size from request
         upload_length = getattr(request, constants.UPLOAD_LENGTH_FIELD_NAME, -1)
 
+        # Get concatenation type from request (http://tus.io/protocols/resumable-upload.html#concatenation)
+        concat_type, partial_upload_urls = getattr(request, constants.UPLOAD_CONCAT_FIELD_NAME, ("", []))
+        upload_concat = concat_type
+
+        # The length of a final upload is the sum of the lengths of its partial uploads
+        partial_uploads = []
+        if concat_type == "final":
+            partial_uploads = self.get_partial_uploads(partial_upload_urls)
+            upload_length = sum(partial_upload.upload_length for partial_upload in partial_uploads)
+            upload_concat = "final;{}".format(" ".join(partial_upload_urls))
+
         # Validate upload_length
         max_file_size = getattr(self, "max_file_size", tus_settings.TUS_MAX_FILE_SIZE)
         if upload_length > max_file_size:
@@ -124,6 +206,7 @@ class TusCreateMixin(mixins.CreateModelMixin):
                 "upload_length": upload_length,
                 "upload_metadata": json.dumps(upload_metadata),
                 "filename": filename,
+                "upload_concat": upload_concat,
             },
         )
 
@@ -136,19 +219,18 @@ class TusCreateMixin(mixins.CreateModelMixin):
         # Get upload from serializer
         upload = serializer.instance
 
-        # Set the user if the upload has a user field
-        if request.user.is_authenticated and hasattr(upload, "user"):
-            upload.user = request.user
-            upload.save()
+        # Final uploads are complete right away
+        if upload.is_final():
+            self.perform_concatenate(upload, partial_uploads)
+            try:
+                signals.received.send(sender=upload.__class__, instance=upload)
+            except Exception as e:
+                upload.delete()
+                return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
 
         # Prepare response headers
         headers = self.get_success_headers(serializer.data)
 
-        # Maybe we're auto-expiring the upload...
-        if tus_settings.TUS_UPLOAD_EXPIRES is not None:
-            upload.expires = timezone.now() + tus_settings.TUS_UPLOAD_EXPIRES
-            upload.save()
-
         # Add upload expiry to headers
         add_expiry_header(upload, headers)
 
@@ -161,6 +243,118 @@ class TusCreateMixin(mixins.CreateModelMixin):
 
         return Response(serializer.data, headers=headers, status=status.HTTP_201_CREATED)
 
+    def perform_create(self, serializer):
+        upload_model = serializer.Meta.model
+
+        # Resolve all fields up front, so the upload is created with a single INSERT
+        guid = uuid.uuid4()
+        try:
+            chunk_store_fields = upload_model.get_chunk_store_class().create(
+                upload_model, guid, serializer.validated_data["upload_length"]
+            )
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise InsufficientStorage
+            raise
+
+        extra_fields = {
+            "guid": guid,
+            "upload_metadata_header": getattr(self.request, constants.UPLOAD_METADATA_HEADER_FIELD_NAME, ""),
+            **chunk_store_fields,
+        }
+
+        # Set the user if the upload has a user field
+        if self.request.user.is_authenticated and hasattr(upload_model, "user"):
+            extra_fields["user"] = self.request.user
+
+        # Maybe we're auto-expiring the upload... Partial uploads always expire, as they're never saved by themselves
+        upload_expires = tus_settings.TUS_UPLOAD_EXPIRES
+        if upload_expires is None and serializer.validated_data.get("upload_concat") == "partial":
+            upload_expires = tus_settings.TUS_PARTIAL_UPLOAD_EXPIRES
+        if upload_expires is not None:
+            extra_fields["expires"] = timezone.now() + upload_expires
+
+        try:
+            upload = serializer.save(**extra_fields)
+        except Exception:
+            # Don't leak the data the chunk store prepared for the upload
+            upload_model.get_chunk_store_class().discard(guid, chunk_store_fields.get("temporary_file_path"))
+            raise
+
+    def perform_concatenate(self, upload, partial_uploads):
+        """
+        Writes the data of the partial uploads to the temporary file of the final upload, which is complete afterwards.
+          The partial uploads are locked (and checked again) while their data is read, so they can't be modified or
+          deleted in the meantime. The final upload is deleted if the concatenation fails.
+        """
+        try:
+            with ExitStack() as stack:
+                self.lock_partial_uploads(stack, partial_uploads)
+                num_bytes_written = upload.concatenate(partial_uploads)
+        except Exception as e:
+            upload.delete()
+            if isinstance(e, Http404):
+                raise ValidationError("Partial upload doesn't exist anymore.")
+            if isinstance(e, OSError) and e.errno == errno.ENOSPC:
+                raise InsufficientStorage
+            if isinstance(e, (ValueError, FileNotFoundError)):
+                raise Conflict(str(e))
+            raise
+
+        upload.advance_offset(num_bytes_written)
+
+    def lock_partial_uploads(self, stack, partial_uploads):
+        """
+        Locks the given partial uploads (in a fixed order, so concatenations can't deadlock), and makes sure they're
+          still complete
+
+        :param contextlib.ExitStack stack: Releases the locks
+        :param list partial_uploads:
+        """
+        lock_class = get_upload_lock_class(self)
+        unique_partial_uploads = {partial_upload.pk: partial_upload for partial_upload in partial_uploads}
+        for pk in sorted(unique_partial_uploads):
+            stack.enter_context(lock_class(unique_partial_uploads[pk]))
+
+        upload_offsets = dict(
+            self.get_queryset().filter(pk__in=unique_partial_uploads).values_list("pk", "upload_offset")
+        )
+        for pk, partial_upload in unique_partial_uploads.items():
+            if pk not in upload_offsets:
+                raise Http404
+            if upload_offsets[pk] != partial_upload.upload_length:
+                raise Conflict(f"Partial upload {partial_upload.guid} is not complete.")
+
+    def get_partial_uploads(self, urls):
+        """
+        Returns the partial uploads for the given URLs, in the same order. Should throw a ValidationError if one of
+          them doesn't exist, or isn't complete yet.
+
+        :param list urls: The URLs of the partial uploads (from the "Upload-Concat" header)
+        :return list:
+        """
+        guids = []
+        for url in urls:
+            try:
+                guids.append(uuid.UUID(urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]))
+            except ValueError:
+                raise ValidationError(f"Invalid partial upload URL: {url}.")
+
+        partial_uploads = {
+            partial_upload.guid: partial_upload for partial_upload in self.get_queryset().filter(guid__in=guids)
+        }
+
+        result = []
+        for url, guid in zip(urls, guids):
+            partial_upload = partial_uploads.get(guid)
+            if partial_upload is None or not partial_upload.is_partial():
+                raise ValidationError(f"Not a partial upload: {url}.")
+            if not partial_upload.is_complete():
+                raise ValidationError(f"Partial upload is not complete: {url}.")
+            result.append(partial_upload)
+
+        return result
+
     def get_success_headers(self, data):
         try:
             return {"Location": reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": data["guid"]})}
@@ -188,20 +382,97 @@ class TusCreateMixin(mixins.CreateModelMixin):
 
 
 class TusPatchMixin(mixins.UpdateModelMixin):
+    # Pass memoryviews instead of bytes to `validate_chunk`, which saves a copy of every buffer
+    validate_chunk_memoryview = False
+
     def get_chunk(self, request):
         if TusUploadStreamParser in self.parser_classes:
             if "chunk" in request.data:
                 return request.data["chunk"]
         return request.body
 
+    def get_chunk_stream(self, request, chunk_size):
+        """
+        Generator that reads the chunk from the request body in buffers of at most `streaming_buffer_size` bytes. This
+          way, only a single buffer needs to be kept in memory, no matter how big the chunk is. The buffers are
+          memoryviews, which might be reused once the next buffer is requested (when pipelining is enabled).
+
+        :param request:
+        :param int chunk_size: The amount of bytes to read (Content-Length)
+        :return generator:
+        """
+        if request.stream is None:
+            return
+
+        buffer_size = getattr(self, "streaming_buffer_size", tus_settings.TUS_STREAMING_BUFFER_SIZE)
+
+        # Read the next buffer while the current one is being hashed and written
+        if self.is_pipelining_enabled():
+            num_buffers = getattr(self, "pipeline_num_buffers", tus_settings.TUS_PIPELINE_NUM_BUFFERS)
+            buffers = read_stream_pipelined(request.stream, chunk_size, buffer_size, num_buffers=num_buffers)
+        else:
+            buffers = read_stream_in_buffers(request.stream, chunk_size, buffer_size)
+
+        num_bytes_read = 0
+        try:
+            for buffer in buffers:
+                num_bytes_read += len(buffer)
+                yield memoryview(buffer)
+        except UnreadablePostError as e:
+            # The connection was interrupted, keep what has been received so far (the client can resume from there)
+            logger.warning(f"Chunk stream interrupted after {num_bytes_read} bytes: {e}")
+
+    def validate_chunk_buffers(self, offset, buffers):
+        """
+        Generator that runs the chunk validator on every buffer and yields the validated buffers
+
+        :param int offset: The offset at which the first buffer will be written
+        :param iterable buffers:
+        :return generator:
+        """
+        # Without a custom validator, the buffers are passed on as they are
+        if type(self).validate_chunk is TusPatchMixin.validate_chunk:
+            yield from buffers
+            return
+
+        for buffer in buffers:
+            if not self.validate_chunk_memoryview:
+                buffer = bytes(buffer)
+            buffer = self.validate_chunk(offset, buffer)
+            num_bytes = memoryview(buffer).nbytes if buffer is not None else 0
+            if not num_bytes:
+                continue
+            offset += num_bytes
+            yield buffer
+
+    def is_streaming_enabled(self):
+        return getattr(self, "streaming_enabled", tus_settings.TUS_STREAMING_ENABLED)
+
+    def is_pipelining_enabled(self):
+        return getattr(self, "pipelining_enabled", tus_settings.TUS_PIPELINING_ENABLED)
+
+    def is_parallel_writes_enabled(self, upload):
+        """
+        Whether or not the upload accepts chunks at any offset, out of order (only when its length is known)
+        """
+        return getattr(self, "parallel_writes_enabled", tus_settings.TUS_PARALLEL_WRITES) and upload.upload_length >= 0
+
     def validate_chunk(self, offset, chunk_bytes):
         """
         Handler to validate chunks before they are actually written to the buffer file. Should throw a ValidationError
           if something's off.
 
+        When streaming is enabled, this handler is called for every buffer that is read from the request body, with the
+          offset at which that buffer will be written.
+
+        The chunk_bytes are bytes, unless `validate_chunk_memoryview` is set. Then they are a memoryview, so slicing
+          them doesn't copy the data (use `bytes(chunk_bytes)` when a copy is needed). The view (and slices of it) may be
+          reused for the next buffer once the returned data has been written, so don't keep references to it. Any
+          bytes-like object can be returned, e.g. a slice of the chunk_bytes.
+
         :param int offset:
-        :param six.binary_type chunk_bytes:
-        :return six.binary_type: The chunk_bytes
+        :param bytes chunk_bytes:
+        :return: The chunk_bytes (a bytes-like object)
         """
         return chunk_bytes
 
@@ -226,65 +497,228 @@ class TusPatchMixin(mixins.UpdateModelMixin):
         # Retrieve object
         upload = self.get_object()
 
+        # Final uploads are assembled from partial uploads, and can't be modified
+        if upload.is_final():
+            return Response("Unable to modify a final upload.", status=status.HTTP_403_FORBIDDEN)
+
+        # Chunks at different offsets are written concurrently, the extents are merged under a row lock
+        if self.is_parallel_writes_enabled(upload):
+            return self.receive_chunk(request, upload)
+
+        # Make sure no other request modifies the upload in the meantime
+        with get_upload_lock_class(self)(upload) as lock:
+            response = self.receive_chunk(request, upload)
+
+            # A completed upload can't be modified anymore
+            if upload.is_complete():
+                lock.discard()
+
+            return response
+
+    def receive_chunk(self, request, upload):
+        # Validate the request before reading the chunk
+        response = self.begin_chunk(request, upload)
+        if response is not None:
+            return response
+
+        # Chunks that are received out of order are written in place, within the range they reserved
+        reservation = self.reserve_chunk(request, upload)
+
+        try:
+            # Write file
+            try:
+                num_bytes_written, checksum_matched, chunk_digest_hasher = self.write_chunk(request, upload)
+            except Exception as e:
+                return self.handle_write_error(request, upload, e)
+
+            return self.accept_chunk(
+                request, upload, num_bytes_written, checksum_matched, chunk_digest_hasher, reservation=reservation
+            )
+        finally:
+            if reservation is not None:
+                upload.release_extent(reservation)
+
+    def begin_chunk(self, request, upload):
+        """
+        Validates the PATCH request before the chunk is read, and makes sure the chunk store can receive it
+
+        :return Response: A response if the chunk is rejected, None otherwise
+        """
         # Get upload_offset
         upload_offset = getattr(request, constants.UPLOAD_OFFSET_NAME)
 
         # Validate upload_offset
-        if upload_offset != upload.upload_offset:
-            raise Conflict
+        if self.is_parallel_writes_enabled(upload):
+            if upload.is_complete() or not 0 <= upload_offset < upload.upload_length:
+                raise self.get_conflict(upload)
+        elif upload_offset != upload.upload_offset:
+            raise self.get_conflict(upload)
+
+        # Make sure the chunk store can receive data (e.g. there is a tempfile for the upload)
+        try:
+            upload.get_chunk_store().prepare()
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise InsufficientStorage
+            raise
 
-        # Make sure there is a tempfile for the upload
-        assert upload.get_or_create_temporary_file()
+        # Get chunk size from request
+        chunk_size = int(request.META.get("CONTENT_LENGTH") or 0)
 
-        # Change state
-        if upload.state == states.INITIAL:
-            upload.start_receiving()
-            upload.save()
+        # Make sure the chunk doesn't exceed the upload length
+        if upload.upload_length >= 0 and upload_offset + chunk_size > upload.upload_length:
+            return Response(
+                f'Invalid "Content-Length". Maximum value: {upload.upload_length - upload_offset}.',
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
 
-        # Get chunk from request
-        chunk_bytes = self.get_chunk(request)
+        # Chunks that are received out of order can't overlap the ranges that have been received (checked again when
+        #  the chunk is accepted)
+        if self.is_parallel_writes_enabled(upload):
+            extents = upload.upload_extents if upload.upload_extents is not None else [[0, upload.upload_offset]]
+            if extents_overlap(extents, upload_offset, upload_offset + chunk_size):
+                raise self.get_conflict(upload)
+
+        # Check checksum algorithm  (http://tus.io/protocols/resumable-upload.html#checksum)
+        upload_checksum = getattr(request, constants.UPLOAD_CHECKSUM_FIELD_NAME, None)
+        if upload_checksum is not None and upload_checksum[0] not in tus_api_checksum_algorithms:
+            return Response(
+                "Unsupported Checksum Algorithm: {}.".format(
+                    upload_checksum[0],
+                ),
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         # Check for data
-        if not chunk_bytes:
+        if not chunk_size:
             return Response("No data.", status=status.HTTP_400_BAD_REQUEST)
 
-        # Check checksum  (http://tus.io/protocols/resumable-upload.html#checksum)
+        return None
+
+    def reserve_chunk(self, request, upload):
+        """
+        Reserves the range of a chunk that is received out of order (see `Upload.reserve_extent`), so it can be written
+          to the chunk store in place
+
+        :return list: The reservation, or None if the upload doesn't receive chunks out of order
+        """
+        if not self.is_parallel_writes_enabled(upload):
+            return None
+
+        upload_offset = getattr(request, constants.UPLOAD_OFFSET_NAME)
+        chunk_size = int(request.META.get("CONTENT_LENGTH") or 0)
+
+        # The range overlaps a received range, or a chunk that is being written
+        reservation = upload.reserve_extent(upload_offset, chunk_size)
+        if reservation is None:
+            raise self.get_conflict(upload)
+
+        return reservation
+
+    def write_chunk(self, request, upload):
+        """
+        Reads the chunk from the request and writes it to the chunk store, hashing and validating it on the way. Doesn't
+          query the database, so it can run outside of the request thread.
+
+        :return tuple: The amount of bytes written, whether or not the checksum matched and the digest hasher (or None)
+        """
+        upload_offset = getattr(request, constants.UPLOAD_OFFSET_NAME)
         upload_checksum = getattr(request, constants.UPLOAD_CHECKSUM_FIELD_NAME, None)
+        parallel = self.is_parallel_writes_enabled(upload)
+
+        # Get chunk from request, either streamed in buffers or as a single buffer
+        if self.is_streaming_enabled():
+            buffers = self.get_chunk_stream(request, int(request.META.get("CONTENT_LENGTH") or 0))
+        else:
+            buffers = [memoryview(self.get_chunk(request))]
+
+        # Update the checksum while the chunk is being written
+        checksum_hasher = None
         if upload_checksum is not None:
-            if upload_checksum[0] not in tus_api_checksum_algorithms:
-                return Response(
-                    "Unsupported Checksum Algorithm: {}.".format(
-                        upload_checksum[0],
-                    ),
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            elif not checksum_matches(
-                upload_checksum[0],
-                upload_checksum[1],
-                chunk_bytes,
-            ):
-                return Response("Checksum Mismatch.", status=460)
+            checksum_hasher = create_hasher(upload_checksum[0])
+            buffers = hash_buffers(buffers, checksum_hasher)
 
         # Run chunk validator
-        chunk_bytes = self.validate_chunk(upload_offset, chunk_bytes)
+        buffers = self.validate_chunk_buffers(upload_offset, buffers)
+
+        # Update the digest of the upload while the chunk is being written (the digest tree needs the chunks in order)
+        chunk_digest_hasher = upload.create_chunk_digest_hasher(upload_offset) if not parallel else None
+        if chunk_digest_hasher is not None:
+            buffers = hash_buffers(buffers, chunk_digest_hasher)
+
+        num_bytes_written = upload.write_buffers(buffers, offset=upload_offset)
+
+        return (
+            num_bytes_written,
+            checksum_hasher is None or checksum_hasher.hexdigest() == upload_checksum[1],
+            chunk_digest_hasher,
+        )
+
+    def handle_write_error(self, request, upload, exc):
+        if isinstance(exc, APIException):
+            # Raised by the chunk validator
+            raise exc
+
+        if not isinstance(exc, OSError) or exc.errno != errno.ENOSPC:
+            upload.delete()
+            return Response(str(exc), status=status.HTTP_400_BAD_REQUEST)
+
+        # Keep the upload, the client can retry once space is available (the data of chunks that are received out of
+        #  order is dropped along with their reservation)
+        if not self.is_parallel_writes_enabled(upload):
+            upload.truncate_temporary_file(getattr(request, constants.UPLOAD_OFFSET_NAME))
+        raise InsufficientStorage
+
+    def accept_chunk(self, request, upload, num_bytes_written, checksum_matched, chunk_digest_hasher, reservation=None):
+        """
+        Adds the written chunk to the upload, and returns the PATCH response
+        """
+        upload_offset = getattr(request, constants.UPLOAD_OFFSET_NAME)
+        parallel = self.is_parallel_writes_enabled(upload)
+
+        # Roll back the written data if the checksum doesn't match (out of order, it's dropped along with the reservation)
+        if not checksum_matched:
+            if not parallel:
+                upload.truncate_temporary_file(upload_offset)
+            return Response("Checksum Mismatch.", status=460)
 
         # Check for data
-        if not chunk_bytes:
+        if not num_bytes_written:
             return Response('No data. Make sure "validate_chunk" returns data.', status=status.HTTP_400_BAD_REQUEST)
 
-        # Write file
-        chunk_size = int(request.META.get("CONTENT_LENGTH", 102400))
-        try:
-            upload.write_data(chunk_bytes, chunk_size)
-        except Exception as e:
-            upload.delete()
-            return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+        # Add the received range, the upload is complete once all ranges have been received
+        if parallel:
+            if not upload.add_extent(upload_offset, num_bytes_written, reservation=reservation):
+                raise self.get_conflict(upload)
+
+        # Update upload offset
+        elif not upload.advance_offset(num_bytes_written, chunk_digest_hasher=chunk_digest_hasher):
+            raise self.get_conflict(upload)
 
+        # Keep the HEAD cache up-to-date (concurrent chunks might finish in any order, so leave it to the next HEAD)
+        if get_head_cache() is not None:
+            if parallel:
+                delete_cached_head_headers(upload.guid)
+            else:
+                set_cached_head_headers(upload, get_head_headers(upload))
+
+        return self.get_patch_response(upload)
+
+    def get_conflict(self, upload):
+        """
+        Returns the exception for a chunk that doesn't fit the upload. The client will most likely send a HEAD request
+          to find out where to resume, so make sure that isn't answered with stale headers from the cache.
+        """
+        delete_cached_head_headers(upload.guid)
+        return Conflict()
+
+    def get_patch_response(self, upload):
         headers = {
             "Upload-Offset": upload.upload_offset,
         }
 
-        if upload.upload_length == upload.upload_offset:
+        # Partial uploads are only saved as part of a final upload
+        if upload.upload_length == upload.upload_offset and not upload.is_partial():
             # Trigger signal
             try:
                 signals.received.send(sender=upload.__class__, instance=upload)
@@ -313,15 +747,18 @@ class TusTerminateMixin(mixins.DestroyModelMixin):
         # Retrieve object
         upload = self.get_object()
 
-        # When the upload is still saving, we're not able to destroy the entity
-        if upload.state == states.SAVING:
-            return Response(
-                _(f'Unable to terminate upload while in state "{upload.state}".'),
-                status=status.HTTP_409_CONFLICT,
-            )
+        # Make sure no other request modifies the upload in the meantime
+        with get_upload_lock_class(self)(upload) as lock:
+            # When the upload is still saving, we're not able to destroy the entity
+            if upload.state == states.SAVING:
+                return Response(
+                    _(f'Unable to terminate upload while in state "{upload.state}".'),
+                    status=status.HTTP_409_CONFLICT,
+                )
 
-        # Destroy object
-        self.perform_destroy(upload)
+            # Destroy object
+            self.perform_destroy(upload)
+            lock.discard()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 import django
 
@@ -20,6 +21,10 @@ DATABASES = {
 
 ROOT_URLCONF = "tests.urls"
 
+REST_FRAMEWORK_TUS = {
+    "UPLOAD_DIR": os.path.join(tempfile.gettempdir(), "drf-tus-tests", "uploads"),
+}
+
 INSTALLED_APPS = [
     "django.contrib.auth",
     "django.contrib.contenttypes",
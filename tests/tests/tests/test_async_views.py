@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from django.test import TestCase
+
+from rest_framework import status
+
+from asgiref.sync import sync_to_async
+
+from rest_framework_tus import states, tus_api_version
+from rest_framework_tus.async_views import AsyncUploadView
+from rest_framework_tus.compat import reverse
+from rest_framework_tus.models import get_upload_model
+from rest_framework_tus.utils import create_checksum_header, encode_upload_metadata, read_bytes_from_field_file
+from tests.tests.factories import UploadFactory
+
+
+class AsyncViewTests(TestCase):
+    async def test_upload(self):
+        blob = b"0123456789abcdef"
+
+        # Create upload
+        result = await self.async_client.post(
+            reverse("async:api:upload-list"),
+            headers={
+                "Tus-Resumable": tus_api_version,
+                "Upload-Length": str(len(blob)),
+                "Upload-Metadata": encode_upload_metadata({"filename": "test_data.txt"}),
+            },
+        )
+        assert result.status_code == status.HTTP_201_CREATED
+        guid = result["Location"].rstrip("/").rsplit("/", 1)[-1]
+        url = reverse("async:api:upload-detail", kwargs={"guid": guid})
+
+        # Write the chunks
+        for offset in range(0, len(blob), 4):
+            chunk = blob[offset : offset + 4]
+            result = await self.async_client.patch(
+                url,
+                data=chunk,
+                headers={
+                    "Tus-Resumable": tus_api_version,
+                    "Upload-Offset": str(offset),
+                    "Upload-Checksum": create_checksum_header(chunk, "sha1"),
+                },
+                content_type="application/offset+octet-stream",
+            )
+            assert result.status_code == status.HTTP_204_NO_CONTENT
+            assert int(result["Upload-Offset"]) == offset + len(chunk)
+
+        # Check the upload
+        result = await self.async_client.head(url, headers={"Tus-Resumable": tus_api_version})
+        assert result.status_code == status.HTTP_200_OK
+        assert int(result["Upload-Offset"]) == len(blob)
+
+        upload = await get_upload_model().objects.aget(guid=guid)
+        assert upload.state == states.DONE
+        assert read_bytes_from_field_file(upload.uploaded_file.file) == blob
+
+        # Terminate the upload
+        result = await self.async_client.delete(url, headers={"Tus-Resumable": tus_api_version})
+        assert result.status_code == status.HTTP_204_NO_CONTENT
+        assert not await get_upload_model().objects.filter(guid=guid).aexists()
+
+    async def test_head_not_found(self):
+        result = await self.async_client.head(
+            reverse("async:api:upload-detail", kwargs={"guid": "00000000-0000-0000-0000-000000000000"}),
+            headers={"Tus-Resumable": tus_api_version},
+        )
+        assert result.status_code == status.HTTP_404_NOT_FOUND
+        assert result["Cache-Control"] == "no-store"
+
+    async def test_patch_rejected(self):
+        upload = await sync_to_async(UploadFactory)(
+            filename="test_data.txt", upload_metadata=json.dumps({"filename": "test_data.txt"}), upload_length=8
+        )
+        url = reverse("async:api:upload-detail", kwargs={"guid": upload.guid})
+
+        async def patch(offset, checksum=None):
+            headers = {"Tus-Resumable": tus_api_version, "Upload-Offset": str(offset)}
+            if checksum is not None:
+                headers["Upload-Checksum"] = checksum
+            return await self.async_client.patch(
+                url, data=b"1234", headers=headers, content_type="application/offset+octet-stream"
+            )
+
+        # Wrong offset
+        result = await patch(4)
+        assert result.status_code == status.HTTP_409_CONFLICT
+
+        # Checksum mismatch, the data is rolled back
+        result = await patch(0, checksum=create_checksum_header(b"4321", "sha1"))
+        assert result.status_code == 460
+        await upload.arefresh_from_db()
+        assert upload.upload_offset == 0
+
+    async def test_cancelled_write(self):
+        release = threading.Event()
+
+        def write_chunk(request, upload):
+            release.wait()
+            return 4, True, None
+
+        reservation = [0, 4, "token", 0]
+        viewset = mock.Mock()
+        viewset.begin_chunk.return_value = None
+        viewset.reserve_chunk.return_value = reservation
+        viewset.write_chunk.side_effect = write_chunk
+        upload = mock.Mock()
+
+        # The request is cancelled while the chunk is being written
+        task = asyncio.ensure_future(AsyncUploadView().receive_chunk(viewset, upload))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+        # The view waits for the executor (so the upload lock and the reservation aren't released in the meantime)
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        upload.release_extent.assert_not_called()
+
+        release.set()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        viewset.accept_chunk.assert_not_called()
+        upload.release_extent.assert_called_once_with(reservation)
@@ -0,0 +1,115 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+from rest_framework_tus import settings as tus_settings
+from rest_framework_tus.chunkstores import SharedDirectoryChunkStore, StorageChunkStore
+from rest_framework_tus.cleanup import collect_orphaned_files
+from rest_framework_tus.filehandles import file_handle_cache
+from rest_framework_tus.models import get_upload_model
+from tests.tests.factories import UploadFactory
+
+
+class ChunkStoreTests(TestCase):
+    def setUp(self):
+        # Local stand-in for a remote storage
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        patcher = mock.patch.object(StorageChunkStore, "get_storage", return_value=FileSystemStorage(location=location))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_storage_chunk_store(self):
+        upload = UploadFactory(upload_length=10)
+        chunk_store = StorageChunkStore(upload)
+
+        # Write chunks, and roll back the last one
+        assert chunk_store.write(0, [b"12", b"34"]) == 4
+        assert chunk_store.write(4, [b"xxxx"]) == 4
+        chunk_store.truncate(4)
+        assert [offset for offset, _ in chunk_store.get_chunks(upload.guid)] == [0]
+
+        # Drop a chunk that was written out of order, but wasn't accepted
+        chunk_store.write(5, [b"xx"])
+        chunk_store.discard_chunk(5)
+        assert [offset for offset, _ in chunk_store.get_chunks(upload.guid)] == [0]
+
+        # Overlapping chunks (out of order retries) are only read once
+        chunk_store.write(6, [b"7890"])
+        chunk_store.write(4, [b"5678"])
+        with chunk_store.open() as fh:
+            assert fh.read() == b"1234567890"
+
+        # Read a range, starting at the object that holds it
+        assert chunk_store.read(5, 3) == b"678"
+        assert chunk_store.read(2, 8) == b"34567890"
+
+        # Other objects in the directory of the upload are skipped
+        chunk_store.get_storage().save(f"{chunk_store.get_directory(upload.guid)}/README", ContentFile(b"!"))
+        assert [offset for offset, _ in chunk_store.get_chunks(upload.guid)] == [0, 4, 6]
+
+        # Delete
+        chunk_store.delete()
+        assert chunk_store.get_chunks(upload.guid) == []
+
+    def test_storage_chunk_store_missing_data(self):
+        upload = UploadFactory(upload_length=8)
+        chunk_store = StorageChunkStore(upload)
+        chunk_store.write(4, [b"5678"])
+
+        with self.assertRaises(OSError):
+            with chunk_store.open() as fh:
+                fh.read()
+
+        # Cleanup
+        chunk_store.delete()
+
+    def test_shared_directory_chunk_store(self):
+        upload = UploadFactory(upload_length=8)
+        chunk_store = SharedDirectoryChunkStore(upload)
+        chunk_store.prepare()
+
+        # Every chunk is synced (whatever the durability policy), and the file is not kept open
+        with mock.patch.object(tus_settings, "TUS_FILE_HANDLE_CACHE_SIZE", 4):
+            with mock.patch.object(tus_settings, "TUS_DURABILITY", "completion"):
+                with mock.patch("os.fdatasync") as fdatasync:
+                    chunk_store.write(0, [b"1234"])
+        assert fdatasync.call_count == 1
+        assert upload.temporary_file_path not in file_handle_cache
+
+        with chunk_store.open() as fh:
+            assert fh.read() == b"1234"
+
+        # Cleanup
+        upload.delete()
+
+    def test_collect_orphaned_chunks(self):
+        upload = UploadFactory(upload_length=8)
+        StorageChunkStore(upload).write(0, [b"1234"])
+
+        # The upload is gone, but its objects are not
+        orphaned_upload = UploadFactory(upload_length=8)
+        StorageChunkStore(orphaned_upload).write(0, [b"1234"])
+        StorageChunkStore(orphaned_upload).write(4, [b"56"])
+        get_upload_model().objects.filter(pk=orphaned_upload.pk).delete()
+
+        with mock.patch.object(
+            tus_settings, "TUS_CHUNK_STORE_CLASS", "rest_framework_tus.chunkstores.StorageChunkStore"
+        ):
+            with mock.patch.object(get_upload_model(), "get_temporary_file_directories", return_value=[]):
+                # Recently modified objects are left alone
+                assert collect_orphaned_files() == {"num_files": 0, "num_bytes": 0}
+
+                result = collect_orphaned_files(grace_period=-60)
+
+        # Check result
+        assert result == {"num_files": 2, "num_bytes": 6}
+        assert StorageChunkStore.get_chunks(orphaned_upload.guid) == []
+        assert len(StorageChunkStore.get_chunks(upload.guid)) == 1
+
+        # Cleanup
+        StorageChunkStore(upload).delete()
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework_tus import settings as tus_settings
+from rest_framework_tus import states
+from rest_framework_tus.cleanup import collect_orphaned_files, reap_expired_uploads
+from rest_framework_tus.locks import FileUploadLock
+from rest_framework_tus.models import get_upload_model
+from tests.tests.factories import UploadFactory
+
+
+class CleanupTests(TestCase):
+    def test_reap_expired_uploads(self):
+        expired = timezone.now() - timedelta(hours=1)
+
+        # Create uploads
+        expired_uploads = [self._create_upload(expires=expired) for _ in range(5)]
+        active_upload = self._create_upload(expires=timezone.now() + timedelta(hours=1))
+        done_upload = self._create_upload(expires=expired, state=states.DONE)
+        saving_upload = self._create_upload(expires=expired, state=states.SAVING, finalization_due=timezone.now())
+        stuck_upload = self._create_upload(
+            expires=expired,
+            state=states.SAVING,
+            finalization_due=timezone.now() - timedelta(seconds=2 * tus_settings.TUS_FINALIZATION_LEASE),
+        )
+        unleased_upload = self._create_upload(expires=expired, state=states.SAVING, finalization_due=None)
+        failed_upload = self._create_upload(expires=expired, state=states.FAILED)
+
+        # Some uploads have a lock file
+        for upload in expired_uploads:
+            with FileUploadLock(upload):
+                pass
+
+        # Reap in batches
+        with mock.patch.object(tus_settings, "TUS_UPLOAD_LOCK_CLASS", "rest_framework_tus.locks.FileUploadLock"):
+            result = reap_expired_uploads(batch_size=2, num_workers=2)
+
+        # Check result, uploads that are stuck in the saving state are reaped as well
+        assert result == {"num_uploads": 8, "num_files": 8, "num_batches": 4}
+        assert set(get_upload_model().objects.values_list("pk", flat=True)) == {
+            active_upload.pk,
+            done_upload.pk,
+            saving_upload.pk,
+        }
+        for upload in expired_uploads + [stuck_upload, unleased_upload, failed_upload]:
+            assert not os.path.exists(upload.temporary_file_path)
+            assert not os.path.exists(FileUploadLock(upload).get_lock_file_path())
+
+        # Cleanup files
+        active_upload.delete()
+        done_upload.delete()
+        saving_upload.delete()
+
+    def test_reap_expired_uploads_max_batches(self):
+        # Create uploads
+        for _ in range(3):
+            self._create_upload(expires=timezone.now() - timedelta(hours=1))
+
+        # Perform command
+        out = StringIO()
+        call_command("tus_reap_expired", "--batch-size=1", "--max-batches=2", stdout=out)
+
+        # Check result
+        assert get_upload_model().objects.count() == 1
+        assert "Deleted 2 expired uploads" in out.getvalue()
+
+        # Cleanup file
+        get_upload_model().objects.get().delete()
+
+    def test_collect_orphaned_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        quarantine_dir = os.path.join(directory, "quarantine")
+
+        # Create files
+        referenced_file = self._create_file(os.path.join(directory, "tus-upload-referenced"), age=7200)
+        orphaned_file = self._create_file(os.path.join(directory, "sub", "tus-upload-orphaned"), age=7200)
+        recent_file = self._create_file(os.path.join(directory, "tus-upload-recent"), age=0)
+        other_file = self._create_file(os.path.join(directory, "other"), age=7200)
+        upload = UploadFactory(upload_length=8, temporary_file_path=referenced_file)
+
+        # Collect orphans
+        with mock.patch.object(
+            get_upload_model(),
+            "get_temporary_file_directories",
+            return_value=[(directory, True)],
+        ):
+            result = collect_orphaned_files(batch_size=1, quarantine_dir=quarantine_dir)
+
+        # Check result
+        assert result == {"num_files": 1, "num_bytes": 4}
+        assert not os.path.exists(orphaned_file)
+        assert os.path.exists(os.path.join(quarantine_dir, "tus-upload-orphaned"))
+        assert os.path.exists(referenced_file)
+        assert os.path.exists(recent_file)
+        assert os.path.exists(other_file)
+
+        # Cleanup file
+        upload.delete()
+
+    def _create_file(self, path, age):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(b"1234")
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def _create_upload(self, **kwargs):
+        return UploadFactory(
+            upload_length=8,
+            temporary_file_path=get_upload_model().create_temporary_file(),
+            **kwargs,
+        )
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest.case import TestCase
+
+from rest_framework_tus.filehandles import FileHandleCache
+from rest_framework_tus.utils import pwrite_buffers
+
+
+class FileHandleCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = FileHandleCache(max_size=2)
+        self.addCleanup(self.cache.clear)
+
+    def test_reuse(self):
+        path = os.path.join(self.directory, "a", "tus-upload-a")
+
+        with self.cache.open(path) as fd:
+            pwrite_buffers(fd, 0, [b"12", b"34"])
+        with self.cache.open(path) as fd2:
+            pwrite_buffers(fd2, 4, [b"56"])
+
+        # The same descriptor has been used twice
+        assert fd == fd2
+        with open(path, "rb") as fh:
+            assert fh.read() == b"123456"
+
+        # Discard
+        self.cache.discard(path)
+        assert path not in self.cache
+
+    def test_evict_least_recently_used(self):
+        paths = [os.path.join(self.directory, f"tus-upload-{index}") for index in range(3)]
+
+        for path in paths[:2]:
+            with self.cache.open(path):
+                pass
+        with self.cache.open(paths[0]):
+            pass
+        with self.cache.open(paths[2]):
+            pass
+
+        assert len(self.cache) == 2
+        assert paths[1] not in self.cache
+
+    def test_keep_descriptors_in_use(self):
+        paths = [os.path.join(self.directory, f"tus-upload-{index}") for index in range(3)]
+
+        with self.cache.open(paths[0]) as fd, self.cache.open(paths[1]), self.cache.open(paths[2]):
+            assert len(self.cache) == 3
+
+            # Discarding a descriptor in use closes it once it's released
+            self.cache.discard(paths[0])
+            os.fstat(fd)
+
+        assert len(self.cache) == 2
+        with self.assertRaises(OSError):
+            os.fstat(fd)
+
+    def test_reopen_removed_file(self):
+        path = os.path.join(self.directory, "tus-upload-a")
+
+        with self.cache.open(path) as fd:
+            pwrite_buffers(fd, 0, [b"1234"])
+        os.remove(path)
+
+        with self.cache.open(path) as fd:
+            pwrite_buffers(fd, 0, [b"5678"])
+
+        with open(path, "rb") as fh:
+            assert fh.read() == b"5678"
+
+    def test_close_idle(self):
+        cache = FileHandleCache(max_size=2, idle_timeout=0.2)
+        self.addCleanup(cache.clear)
+        path = os.path.join(self.directory, "tus-upload-a")
+
+        with cache.open(path) as fd:
+            pwrite_buffers(fd, 0, [b"1234"])
+
+        # The file is removed by another process, the idle descriptor is closed in the background
+        os.remove(path)
+        time.sleep(0.5)
+
+        assert path not in cache
+        with self.assertRaises(OSError):
+            os.fstat(fd)
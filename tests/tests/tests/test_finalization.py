@@ -0,0 +1,160 @@
+import json
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from rest_framework_tus import settings as tus_settings
+from rest_framework_tus import states, tus_api_version
+from rest_framework_tus.compat import reverse
+from rest_framework_tus.finalization import (
+    DatabaseFinalizationExecutor,
+    ThreadPoolFinalizationExecutor,
+    get_finalization_executor,
+)
+from rest_framework_tus.models import get_upload_model
+from rest_framework_tus.utils import read_bytes_from_field_file
+from tests.tests.factories import UploadFactory
+
+
+class FinalizationTests(APITestCase):
+    def test_database_executor(self):
+        # Create upload
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=4,
+        )
+
+        # Upload the last chunk
+        with mock.patch.object(
+            tus_settings,
+            "TUS_FINALIZATION_EXECUTOR_CLASS",
+            "rest_framework_tus.finalization.DatabaseFinalizationExecutor",
+        ):
+            result = self.client.patch(
+                reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+                data=b"1234",
+                headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+                content_type="application/offset+octet-stream",
+            )
+
+            # The upload is queued
+            assert result.status_code == status.HTTP_204_NO_CONTENT
+            upload.refresh_from_db()
+            assert upload.state == states.SAVING
+            assert get_finalization_executor().get_queue_depth() == 1
+
+            # Drain the queue
+            out = StringIO()
+            call_command("tus_finalize", stdout=out)
+
+        # Check result
+        assert "Finalized 1 uploads" in out.getvalue()
+        upload = get_upload_model().objects.get(pk=upload.pk)
+        assert upload.state == states.DONE
+        assert read_bytes_from_field_file(upload.uploaded_file.file) == b"1234"
+
+        # Cleanup file
+        upload.delete()
+
+    def test_database_executor_retries(self):
+        # Create queued upload
+        upload = UploadFactory(upload_length=4, upload_offset=4, state=states.RECEIVING)
+        executor = DatabaseFinalizationExecutor()
+        executor.submit(upload)
+
+        # The save handler keeps failing
+        with mock.patch("rest_framework_tus.storage.DefaultSaveHandler.handle_save", side_effect=OSError):
+            result = executor.drain(retries=1, retry_delay=0)
+
+        # Check result, the upload has failed
+        assert result == {"num_finalized": 0, "num_retried": 1, "num_failed": 1}
+        upload.refresh_from_db()
+        assert upload.state == states.FAILED
+        assert upload.finalization_attempts == 2
+        assert upload.finalization_due is None
+        assert executor.get_queue_depth() == 0
+
+        # Failed uploads can be queued again
+        with mock.patch.object(
+            tus_settings,
+            "TUS_FINALIZATION_EXECUTOR_CLASS",
+            "rest_framework_tus.finalization.DatabaseFinalizationExecutor",
+        ):
+            with mock.patch("rest_framework_tus.storage.DefaultSaveHandler.handle_save") as handle_save:
+                out = StringIO()
+                call_command("tus_finalize", "--retry-failed", stdout=out)
+
+        assert "Requeued 1 failed uploads" in out.getvalue()
+        assert "Finalized 1 uploads" in out.getvalue()
+        handle_save.assert_called_once_with()
+
+    def test_thread_pool_executor(self):
+        # Create upload
+        upload = UploadFactory(upload_length=4, upload_offset=4, state=states.RECEIVING)
+        executor = ThreadPoolFinalizationExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        release = threading.Event()
+        with mock.patch(
+            "rest_framework_tus.finalization.finalize_upload_with_retries", side_effect=lambda guid: release.wait()
+        ) as finalize_upload_with_retries:
+            # The upload is submitted once the transaction has been committed
+            with self.captureOnCommitCallbacks(execute=True):
+                executor.submit(upload)
+                assert executor.get_queue_depth() == 0
+
+            assert executor.get_queue_depth() == 1
+            release.set()
+            executor.shutdown()
+
+        # Check result
+        finalize_upload_with_retries.assert_called_once_with(str(upload.guid))
+        assert executor.get_queue_depth() == 0
+        upload.refresh_from_db()
+        assert upload.state == states.SAVING
+        assert upload.finalization_due > timezone.now()
+
+    def test_finalize_after_lease(self):
+        # Create upload, which is queued by a pool executor of a process that died
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=4,
+            upload_offset=4,
+            state=states.RECEIVING,
+        )
+        upload.get_chunk_store().prepare()
+        upload.write_buffers([b"1234"], offset=0)
+        with mock.patch("rest_framework_tus.finalization.ThreadPoolFinalizationExecutor.schedule"):
+            ThreadPoolFinalizationExecutor().submit(upload)
+
+        with mock.patch.object(
+            tus_settings,
+            "TUS_FINALIZATION_EXECUTOR_CLASS",
+            "rest_framework_tus.finalization.ThreadPoolFinalizationExecutor",
+        ):
+            # The upload is still leased
+            out = StringIO()
+            call_command("tus_finalize", stdout=out)
+            assert "Finalized 0 uploads" in out.getvalue()
+
+            # The lease has passed
+            get_upload_model().objects.filter(pk=upload.pk).update(finalization_due=timezone.now())
+            out = StringIO()
+            call_command("tus_finalize", stdout=out)
+
+        # Check result
+        assert "Finalized 1 uploads" in out.getvalue()
+        upload = get_upload_model().objects.get(pk=upload.pk)
+        assert upload.state == states.DONE
+        assert read_bytes_from_field_file(upload.uploaded_file.file) == b"1234"
+
+        # Cleanup file
+        upload.delete()
@@ -0,0 +1,128 @@
+import os
+import time
+from unittest import mock
+
+from django.test import TestCase
+
+from rest_framework_tus import settings as tus_settings
+from rest_framework_tus.exceptions import Locked
+from rest_framework_tus.locks import (
+    CacheUploadLock,
+    DatabaseUploadLock,
+    FileUploadLock,
+    get_upload_lock_metrics,
+    metrics,
+)
+from tests.tests.factories import UploadFactory
+
+
+class LockTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_file_lock(self):
+        self._test_lock(FileUploadLock)
+
+    def test_cache_lock(self):
+        self._test_lock(CacheUploadLock)
+
+    def test_database_lock(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8, upload_offset=4, upload_extents=[[0, 4]])
+        upload.upload_offset = 0
+        upload.upload_extents = None
+
+        with DatabaseUploadLock(upload):
+            # The upload has been refreshed
+            assert upload.upload_offset == 4
+            assert upload.upload_extents == [[0, 4]]
+
+        # Check metrics
+        assert get_upload_lock_metrics()["acquired"] == 1
+
+    def test_file_lock_removed(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+
+        with FileUploadLock(upload) as lock:
+            lock_file_path = lock.get_lock_file_path()
+
+            # A waiting request opened the lock file before it was removed
+            waiting_lock = FileUploadLock(upload, timeout=0)
+            assert not waiting_lock.try_acquire()
+
+            lock.discard()
+            assert not os.path.exists(lock_file_path)
+
+        # The waiting request reopens the lock file, instead of locking the removed one
+        assert waiting_lock.try_acquire()
+        with self.assertRaises(Locked):
+            with FileUploadLock(upload, timeout=0):
+                pass
+        waiting_lock.release()
+
+        # Cleanup
+        FileUploadLock.discard_many([upload.guid])
+
+    def test_cache_lock_renewed(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+
+        with mock.patch.object(tus_settings, "TUS_UPLOAD_LOCK_LEASE", 0.3):
+            with CacheUploadLock(upload):
+                # The lease is renewed while the lock is held
+                time.sleep(0.6)
+                with self.assertRaises(Locked):
+                    with CacheUploadLock(upload, timeout=0):
+                        pass
+
+            # The lock has been released
+            with CacheUploadLock(upload, timeout=0):
+                pass
+
+    def test_cache_lock_lost(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+
+        with CacheUploadLock(upload) as lock:
+            # The lease expired, and was taken by another request
+            lock.cache.set(lock.key, "other", timeout=60)
+            assert not lock.renew()
+
+        # The lease of the other request hasn't been released
+        assert lock.cache.get(lock.key) == "other"
+        lock.cache.delete(lock.key)
+
+    def test_lock_refreshes_upload(self):
+        # Create upload, a concurrent request advanced its digest while we were waiting for the lock
+        upload = UploadFactory(upload_length=8)
+        digest_state = {"algorithm": "sha256", "leaf_size": 4, "num_leaves": 1, "peaks": [[0, "00"]]}
+        type(upload).objects.filter(pk=upload.pk).update(upload_offset=4, upload_digest_state=digest_state)
+
+        with FileUploadLock(upload) as lock:
+            # The fields the PATCH request modifies are fresh
+            assert upload.upload_offset == 4
+            assert upload.upload_digest_state == digest_state
+            lock.discard()
+
+    def _test_lock(self, lock_class):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+
+        with lock_class(upload) as lock:
+            # A second lock can't be acquired
+            with self.assertRaises(Locked):
+                with lock_class(upload, timeout=0):
+                    pass
+
+            lock.discard()
+
+        # The lock has been released
+        with lock_class(upload):
+            pass
+
+        # Check metrics
+        result = get_upload_lock_metrics()
+        assert result["acquired"] == 2
+        assert result["contended"] == 1
+        assert result["failed"] == 1
@@ -0,0 +1,118 @@
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from rest_framework_tus import constants
+from rest_framework_tus import settings as tus_settings
+from rest_framework_tus import tus_api_version
+from rest_framework_tus.compat import iscoroutinefunction
+from rest_framework_tus.middleware import TusMiddleware
+from rest_framework_tus.views import UploadViewSet
+
+
+class MiddlewareTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_get_header(self):
+        request = self.factory.patch("/files/", headers={"X-Upload-Offset": "10"})
+
+        # Check result
+        assert TusMiddleware.get_header(request, "Upload-Offset") == "10"
+        assert TusMiddleware.get_header(request, "Upload-Length", -1) == -1
+
+    def test_parse_headers_for_method(self):
+        request = self.factory.patch(
+            "/files/",
+            headers={"Tus-Resumable": tus_api_version, "Upload-Offset": "10", "Upload-Metadata": "filename YQ=="},
+        )
+
+        # Process request
+        TusMiddleware(lambda request: HttpResponse()).process_request(request)
+
+        # Check result
+        assert getattr(request, constants.TUS_RESUMABLE_FIELD_NAME) == tus_api_version
+        assert getattr(request, constants.UPLOAD_OFFSET_NAME) == 10
+        assert not hasattr(request, constants.UPLOAD_METADATA_FIELD_NAME)
+
+    def test_invalid_header(self):
+        request = self.factory.post("/files/", headers={"Tus-Resumable": tus_api_version, "Upload-Defer-Length": "2"})
+
+        # Perform request
+        response = TusMiddleware(lambda request: HttpResponse())(request)
+
+        # Check result
+        assert response.status_code == 400
+
+    def test_parse_upload_concat(self):
+        request = self.factory.post(
+            "/files/",
+            headers={"Tus-Resumable": tus_api_version, "Upload-Concat": "final;/files/a http://example.com/files/b"},
+        )
+
+        # Process request
+        TusMiddleware(lambda request: HttpResponse()).process_request(request)
+
+        # Check result
+        assert getattr(request, constants.UPLOAD_CONCAT_FIELD_NAME) == (
+            "final",
+            ["/files/a", "http://example.com/files/b"],
+        )
+
+        # A final upload needs partial uploads
+        for upload_concat in ["final;", "partial;/files/a", "whole"]:
+            request = self.factory.post(
+                "/files/", headers={"Tus-Resumable": tus_api_version, "Upload-Concat": upload_concat}
+            )
+            assert TusMiddleware(lambda request: HttpResponse())(request).status_code == 400
+
+    def test_path_prefixes(self):
+        middleware = self._get_middleware(MIDDLEWARE_PATH_PREFIXES=["/files/"])
+
+        # Request outside of the configured paths
+        request = self.factory.patch("/other/", headers={"Tus-Resumable": tus_api_version, "Upload-Offset": "10"})
+        response = middleware(request)
+        assert not hasattr(request, constants.UPLOAD_OFFSET_NAME)
+        assert "Tus-Resumable" not in response
+
+        # Request inside of the configured paths
+        request = self.factory.patch("/files/", headers={"Tus-Resumable": tus_api_version, "Upload-Offset": "10"})
+        response = middleware(request)
+        assert getattr(request, constants.UPLOAD_OFFSET_NAME) == 10
+        assert response["Tus-Resumable"] == tus_api_version
+
+    async def test_async(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = TusMiddleware(get_response)
+        assert iscoroutinefunction(middleware)
+
+        # Process request
+        request = self.factory.patch("/files/", headers={"Tus-Resumable": tus_api_version, "Upload-Offset": "10"})
+        response = await middleware(request)
+
+        # Check result
+        assert getattr(request, constants.UPLOAD_OFFSET_NAME) == 10
+        assert response["Tus-Resumable"] == tus_api_version
+
+    def test_view_classes(self):
+        middleware = self._get_middleware(MIDDLEWARE_VIEW_CLASSES=["rest_framework_tus.views.UploadViewSet"])
+
+        # Other view
+        request = self.factory.patch("/files/", headers={"Tus-Resumable": tus_api_version, "Upload-Offset": "10"})
+        middleware.process_view(request, lambda request: HttpResponse(), (), {})
+        assert not hasattr(request, constants.UPLOAD_OFFSET_NAME)
+
+        # Upload view
+        view = UploadViewSet.as_view({"patch": "partial_update"})
+        middleware.process_view(request, view, (), {})
+        assert getattr(request, constants.UPLOAD_OFFSET_NAME) == 10
+
+    def _get_middleware(self, **settings):
+        patchers = [mock.patch.object(tus_settings, f"TUS_{key}", value) for key, value in settings.items()]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return TusMiddleware(lambda request: HttpResponse())
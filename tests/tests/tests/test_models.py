@@ -0,0 +1,137 @@
+import os
+import uuid
+from unittest import mock
+
+from django.test import TestCase
+
+from rest_framework_tus import settings as tus_settings
+from rest_framework_tus import signals, states
+from rest_framework_tus.chunkstores import LocalFileChunkStore
+from rest_framework_tus.models import get_upload_model
+from tests.tests.factories import UploadFactory
+
+
+class ModelTests(TestCase):
+    def test_advance_offset(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+
+        # Advance offset with a single query
+        with self.assertNumQueries(1):
+            assert upload.advance_offset(4) is True
+
+        # Check result
+        assert upload.upload_offset == 4
+        assert get_upload_model().objects.get(guid=upload.guid).upload_offset == 4
+
+    def test_advance_offset_conflict(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+
+        # Someone else moves the offset forward
+        get_upload_model().objects.get(guid=upload.guid).advance_offset(4)
+
+        # Check result
+        assert upload.advance_offset(4) is False
+        assert upload.upload_offset == 0
+        assert get_upload_model().objects.get(guid=upload.guid).upload_offset == 4
+
+    def test_add_extent_overlap(self):
+        # Create upload, which received a chunk out of order
+        upload = UploadFactory(upload_length=8)
+        upload.get_chunk_store().prepare()
+        upload.write_buffers([b"5678"], offset=4)
+        assert upload.add_extent(4, 4)
+
+        # A chunk that overlaps the received range can't reserve its range
+        assert upload.reserve_extent(2, 4) is None
+
+        # Neither can a chunk that overlaps a chunk that is being written
+        reservation = upload.reserve_extent(0, 4)
+        assert reservation is not None
+        assert upload.reserve_extent(2, 2) is None
+        assert upload.add_extent(2, 2) is False
+
+        # The reserved range is written in place, and accepted
+        upload.write_buffers([b"1234"], offset=0)
+        assert upload.add_extent(0, 4, reservation=reservation) is True
+        assert upload.upload_reservations is None
+
+        # Check result
+        assert upload.upload_offset == 8
+        with upload.get_chunk_store().open() as fh:
+            assert fh.read() == b"12345678"
+
+        # Cleanup file
+        upload.delete()
+
+    def test_release_extent(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+        stale_upload = get_upload_model().objects.get(guid=upload.guid)
+
+        # A chunk that isn't accepted releases its range
+        reservation = upload.reserve_extent(0, 4)
+        with mock.patch.object(LocalFileChunkStore, "discard_chunk") as discard_chunk:
+            upload.release_extent(reservation)
+        discard_chunk.assert_called_once_with(0)
+        assert upload.add_extent(0, 4, reservation=reservation) is False
+        assert upload.reserve_extent(0, 4) is not None
+
+        # Expired reservations don't block other chunks
+        with mock.patch.object(tus_settings, "TUS_PARALLEL_WRITES_RESERVATION_TIMEOUT", -1):
+            assert stale_upload.reserve_extent(4, 4) is not None
+            assert stale_upload.reserve_extent(4, 4) is not None
+
+    def test_advance_offset_receiving_signal(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+        stale_upload = get_upload_model().objects.get(guid=upload.guid)
+
+        # Only the request that actually advances the offset moves the upload to the receiving state
+        with mock.patch.object(signals.receiving, "send") as send:
+            assert upload.advance_offset(4) is True
+            assert stale_upload.advance_offset(4) is False
+
+        # Check result
+        assert send.call_count == 1
+        assert upload.state == states.RECEIVING
+        assert get_upload_model().objects.get(guid=upload.guid).state == states.RECEIVING
+
+    def test_temporary_file_path(self):
+        guid = uuid.uuid4()
+
+        # Get path
+        path = get_upload_model().get_temporary_file_path(guid)
+
+        # Check result
+        relative_path = os.path.relpath(path, tus_settings.TUS_UPLOAD_DIR)
+        shards = relative_path.split(os.sep)
+        assert len(shards) == tus_settings.TUS_UPLOAD_DIR_SHARD_DEPTH + 1
+        assert all(len(shard) == 2 for shard in shards[:-1])
+        assert shards[-1] == f"tus-upload-{guid}"
+
+    def test_temporary_file_path_multiple_dirs(self):
+        upload_dirs = ["/mnt/a", "/mnt/b"]
+
+        # Get paths
+        with mock.patch.object(tus_settings, "TUS_UPLOAD_DIRS", upload_dirs):
+            paths = [get_upload_model().get_temporary_file_path(uuid.uuid4()) for _ in range(50)]
+
+        # Check result
+        for upload_dir in upload_dirs:
+            assert any(path.startswith(upload_dir) for path in paths)
+
+    def test_get_or_create_temporary_file(self):
+        # Create upload
+        upload = UploadFactory(upload_length=8)
+
+        # Create file
+        path = upload.get_or_create_temporary_file()
+
+        # Check result
+        assert path == get_upload_model().get_temporary_file_path(upload.guid)
+        assert os.path.isfile(path)
+
+        # Cleanup file
+        upload.delete()
@@ -1,7 +1,37 @@
-from unittest.case import TestCase
+import errno
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from unittest import mock
+from unittest.case import TestCase, skipUnless
 
+from rest_framework_tus.checksums import crc32c, xxhash
 from rest_framework_tus.compat import decode_base64
-from rest_framework_tus.utils import encode_base64_to_string, encode_upload_metadata
+from rest_framework_tus.durability import DurabilityPolicy
+from rest_framework_tus.utils import (
+    LeafHasher,
+    copy_file,
+    create_checksum,
+    create_chunk_digest_hasher,
+    create_hasher,
+    encode_base64_to_string,
+    encode_upload_metadata,
+    get_missing_extents,
+    merge_extents,
+    merkle_append,
+    merkle_root,
+    merkle_tree_root,
+    move_file,
+    open_direct,
+    pwrite_buffers,
+    read_stream_in_buffers,
+    read_stream_pipelined,
+    write_buffers_to_file,
+)
 
 
 class UtilsTest(TestCase):
@@ -30,3 +60,235 @@ class UtilsTest(TestCase):
             encode_base64_to_string("bla.jpg"),
             encode_base64_to_string("hello.png"),
         )
+
+    def test_create_crc32_checksum(self):
+        data = b"0123456789"
+
+        # Hash incrementally
+        hasher = create_hasher("crc32")
+        hasher.update(data[:4])
+        hasher.update(memoryview(data)[4:])
+
+        # Check result
+        assert hasher.hexdigest() == "{:08x}".format(zlib.crc32(data))
+        assert create_checksum(data, "crc32") == hasher.hexdigest()
+
+    @skipUnless(crc32c, "crc32c is not installed")
+    def test_create_crc32c_checksum(self):
+        data = b"0123456789"
+
+        # Hash incrementally
+        hasher = create_hasher("crc32c")
+        hasher.update(data[:4])
+        hasher.update(memoryview(data)[4:])
+
+        # Check result
+        assert hasher.hexdigest() == "{:08x}".format(crc32c.crc32c(data))
+        assert create_checksum(data, "crc32c") == hasher.hexdigest()
+
+    @skipUnless(xxhash, "xxhash is not installed")
+    def test_create_xxh3_checksum(self):
+        data = b"0123456789"
+
+        # Hash incrementally
+        hasher = create_hasher("xxh3")
+        hasher.update(data[:4])
+        hasher.update(memoryview(data)[4:])
+
+        # Check result
+        assert hasher.hexdigest() == xxhash.xxh3_64_hexdigest(data)
+        assert create_checksum(data, "xxh3") == hasher.hexdigest()
+
+    def test_read_stream_in_buffers(self):
+        stream = io.BytesIO(b"0123456789")
+
+        # Read no more than the given length
+        result = list(read_stream_in_buffers(stream, 8, 3))
+
+        # Check result
+        assert result == [b"012", b"345", b"67"]
+
+    def test_read_stream_pipelined(self):
+        class ReadOnlyStream:
+            def __init__(self, data):
+                self.stream = io.BytesIO(data)
+
+            def read(self, size):
+                return self.stream.read(size)
+
+        for stream in [io.BytesIO(b"0123456789"), ReadOnlyStream(b"0123456789")]:
+            # The buffers are reused, so copy them
+            result = [bytes(buffer) for buffer in read_stream_pipelined(stream, 8, 3)]
+            assert result == [b"012", b"345", b"67"]
+
+        # Stop reading early
+        buffers = read_stream_pipelined(io.BytesIO(b"0123456789"), 10, 2)
+        assert bytes(next(buffers)) == b"01"
+        buffers.close()
+
+    def test_read_stream_pipelined_blocked(self):
+        release = threading.Event()
+
+        class BlockingStream:
+            def __init__(self):
+                self.reads = 0
+
+            def read(self, size):
+                self.reads += 1
+                if self.reads > 1:
+                    # The client stalls
+                    release.wait()
+                return b"0" * size
+
+        # Closing the generator waits for the pending read, and the stream isn't read afterwards
+        stream = BlockingStream()
+        buffers = read_stream_pipelined(stream, 10, 2)
+        assert bytes(next(buffers)) == b"00"
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        buffers.close()
+
+        # Check result
+        assert release.is_set()
+        assert stream.reads == 2
+        assert not any(thread.name == "tus-read" for thread in threading.enumerate())
+
+    def test_read_stream_pipelined_error(self):
+        stream = mock.Mock()
+        stream.readinto.side_effect = OSError("Connection reset")
+
+        with self.assertRaises(OSError):
+            list(read_stream_pipelined(stream, 8, 3))
+
+    def test_merkle_root(self):
+        def leaf(data):
+            hasher = create_chunk_digest_hasher("sha256")
+            hasher.update(data)
+            return hasher.hexdigest()
+
+        def node(left, right):
+            return hashlib.sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+        # Append three leaves
+        peaks = []
+        for data in [b"a", b"b", b"c"]:
+            peaks = merkle_append(peaks, leaf(data), "sha256")
+
+        # Only the peaks are kept
+        assert peaks == [[1, node(leaf(b"a"), leaf(b"b"))], [0, leaf(b"c")]]
+
+        # Check result
+        assert merkle_root(peaks, "sha256") == node(node(leaf(b"a"), leaf(b"b")), leaf(b"c"))
+
+    def test_leaf_hasher(self):
+        def leaf(data):
+            hasher = create_chunk_digest_hasher("sha256")
+            hasher.update(data)
+            return hasher.hexdigest()
+
+        # The leaves don't depend on the buffer boundaries
+        hasher = LeafHasher("sha256", 4)
+        for buffer in [b"01", b"2345", b"6789"]:
+            hasher.update(buffer)
+
+        # Check result
+        assert hasher.leaf_digests == [leaf(b"0123"), leaf(b"4567")]
+        assert hasher.partial_leaf_digest() == leaf(b"89")
+        assert merkle_tree_root(hasher.leaf_digests, "sha256") == merkle_root(
+            merkle_append([[0, leaf(b"0123")]], leaf(b"4567"), "sha256"), "sha256"
+        )
+
+    def test_write_buffers_to_file_durability(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        def write(mode, complete=False):
+            policy = DurabilityPolicy(mode=mode)
+            with mock.patch("os.fdatasync") as fdatasync:
+                write_buffers_to_file(path, 0, [b"ab", b"cd", b"ef"], durability=policy, complete=lambda n: complete)
+            return fdatasync.call_count
+
+        self.assertEqual(write("none"), 0)
+        self.assertEqual(write("chunk"), 1)
+        self.assertEqual(write("completion"), 0)
+        self.assertEqual(write("completion", complete=True), 1)
+
+        with open(path, "rb") as fh:
+            self.assertEqual(fh.read(), b"abcdef")
+
+        with self.assertRaises(ValueError):
+            DurabilityPolicy(mode="group")
+
+    def test_pwrite_buffers_direct_io(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        self.addCleanup(os.close, fd)
+
+        direct_fd = open_direct(path)
+        if direct_fd is None:
+            self.skipTest("O_DIRECT is not supported")
+        self.addCleanup(os.close, direct_fd)
+
+        # Aligned buffers are written with O_DIRECT, unaligned ones through the page cache
+        buffers = [b"a" * 4096, b"b" * 100, b"c" * 4096]
+        with mock.patch("os.posix_fadvise") as posix_fadvise:
+            num_bytes_written = pwrite_buffers(fd, 0, buffers, direct_fd=direct_fd, drop_cache=True)
+
+        assert num_bytes_written == 8292
+        posix_fadvise.assert_called_once_with(fd, 0, 8292, os.POSIX_FADV_DONTNEED)
+        with open(path, "rb") as fh:
+            assert fh.read() == b"".join(buffers)
+
+    def test_move_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source_path, destination_path = os.path.join(directory, "source"), os.path.join(directory, "destination")
+
+        # On the same file system, the file is linked
+        with open(source_path, "wb") as fh:
+            fh.write(b"1234")
+        assert not move_file(source_path, destination_path)
+        assert not os.path.exists(source_path)
+
+        # Never replace an existing file
+        with open(source_path, "wb") as fh:
+            fh.write(b"5678")
+        with self.assertRaises(FileExistsError):
+            move_file(source_path, destination_path)
+
+        # Across file systems, the file is copied
+        os.remove(destination_path)
+        with mock.patch("os.link", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+            assert move_file(source_path, destination_path)
+        assert not os.path.exists(source_path)
+        with open(destination_path, "rb") as fh:
+            assert fh.read() == b"5678"
+
+    def test_copy_file_fallback(self):
+        source_fd, source_path = tempfile.mkstemp()
+        destination_fd, destination_path = tempfile.mkstemp()
+        for path, fd in ((source_path, source_fd), (destination_path, destination_fd)):
+            self.addCleanup(os.remove, path)
+            self.addCleanup(os.close, fd)
+        os.write(source_fd, b"123456")
+        os.lseek(source_fd, 0, os.SEEK_SET)
+
+        # Neither copy_file_range nor sendfile are supported
+        unsupported = OSError(errno.ENOSYS, "Function not implemented")
+        with mock.patch("os.copy_file_range", side_effect=unsupported, create=True):
+            with mock.patch("os.sendfile", side_effect=unsupported, create=True):
+                assert copy_file(source_fd, destination_fd, 6, buffer_size=4) == 6
+
+        with open(destination_path, "rb") as fh:
+            assert fh.read() == b"123456"
+
+    def test_merge_extents(self):
+        extents = []
+        for start, end in [(8, 12), (0, 2), (4, 6), (2, 4), (10, 14)]:
+            extents = merge_extents(extents, start, end)
+
+        # Check result
+        assert extents == [[0, 6], [8, 14]]
+        assert get_missing_extents(extents, 16) == [[6, 8], [14, 16]]
+        assert get_missing_extents([[0, 16]], 16) == []
@@ -1,22 +1,55 @@
 import copy
+import errno
 import json
+import os
+import shutil
+import tempfile
+import zlib
 from datetime import timedelta
+from unittest import mock, skipUnless
 
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError
 from django.utils import timezone
 
 from rest_framework import status
+from rest_framework.permissions import AllowAny
 from rest_framework.test import APITestCase
 
 from rest_framework_tus import settings as tus_settings
-from rest_framework_tus import states, tus_api_extensions, tus_api_version, tus_api_version_supported
+from rest_framework_tus import (
+    states,
+    tus_api_checksum_algorithms,
+    tus_api_extensions,
+    tus_api_version,
+    tus_api_version_supported,
+)
+from rest_framework_tus.cache import add_cached_head_headers, set_cached_head_headers
+from rest_framework_tus.checksums import (
+    CRCHasher,
+    checksum_hasher_factories,
+    crc32c,
+    register_checksum_algorithm,
+    xxhash,
+)
+from rest_framework_tus.chunkstores import LocalFileChunkStore, StorageChunkStore
 from rest_framework_tus.compat import reverse
+from rest_framework_tus.filehandles import file_handle_cache
+from rest_framework_tus.locks import FileUploadLock
 from rest_framework_tus.models import get_upload_model
+from rest_framework_tus.serializers import UploadSerializer
 from rest_framework_tus.utils import (
     create_checksum_header,
+    create_chunk_digest_hasher,
     encode_base64_to_string,
     encode_upload_metadata,
+    get_umask,
+    merkle_append,
+    merkle_tree_root,
+    read_bytes,
     read_bytes_from_field_file,
 )
+from rest_framework_tus.views import UploadViewSet, get_head_headers
 from tests.tests.factories import UploadFactory
 
 
@@ -39,7 +72,8 @@ class ViewTests(APITestCase):
             "Tus-Max-Size": tus_settings.TUS_MAX_FILE_SIZE,
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "PATCH,HEAD,GET,POST,OPTIONS",
-            "Access-Control-Expose-Headers": "Tus-Resumable,Upload-Length,Upload-Metadata,Location,Upload-Offset",
+            "Access-Control-Expose-Headers": "Tus-Resumable,Upload-Length,Upload-Metadata,Location,Upload-Offset,"
+            "Upload-Digest,Upload-Missing-Ranges",
             "Access-Control-Allow-Headers": "Tus-Resumable,Upload-Length,Upload-Metadata,Location,Upload-Offset,"
             "Content-Type",
             "Cache-Control": "no-store",
@@ -48,6 +82,9 @@ class ViewTests(APITestCase):
         for key in expected:
             assert result.data[key] == expected[key]
 
+        # Checksum algorithms that aren't provided by hashlib are advertised as well
+        assert "crc32" in result.data["Tus-Checksum-Algorithm"].split(",")
+
     def test_head_incorrect_header(self):
         # Create upload
         upload = UploadFactory()
@@ -81,6 +118,120 @@ class ViewTests(APITestCase):
         assert result["Upload-Metadata"] == "filename {}".format(encode_base64_to_string("test_file.jpg"))
         assert result["Upload-Expires"] is not None
 
+    def test_head_cached(self):
+        # Create upload
+        upload = UploadFactory(
+            upload_metadata=json.dumps({"filename": "test_file.jpg"}),
+            upload_length=4,
+            expires=timezone.now() + timedelta(hours=1),
+        )
+        url = reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid})
+        headers = {"Tus-Resumable": tus_api_version}
+
+        with mock.patch.object(tus_settings, "TUS_HEAD_CACHE", "default"):
+            # The first request populates the cache
+            with self.assertNumQueries(1):
+                result = self.client.head(url, headers=headers)
+            assert result["Upload-Offset"] == "0"
+
+            # Upload a chunk, which updates the cache
+            self.client.patch(
+                url,
+                data=b"12",
+                headers=dict(headers, **{"Upload-Offset": 0}),
+                content_type="application/offset+octet-stream",
+            )
+
+            # The next request is answered from the cache
+            with self.assertNumQueries(0):
+                result = self.client.head(url, headers=headers)
+            assert result.status_code == status.HTTP_200_OK
+            assert result["Upload-Offset"] == "2"
+            assert result["Upload-Metadata"] == "filename {}".format(encode_base64_to_string("test_file.jpg"))
+            assert result["Cache-Control"] == "no-store"
+
+            # Terminate the upload, which invalidates the cache
+            self.client.delete(url, headers=headers)
+            result = self.client.head(url, headers=headers)
+            assert result.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_head_cache_object_permissions(self):
+        # Create upload
+        upload = UploadFactory(
+            upload_metadata=json.dumps({"filename": "test_file.jpg"}),
+            upload_length=4,
+            expires=timezone.now() + timedelta(hours=1),
+        )
+        url = reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid})
+        headers = {"Tus-Resumable": tus_api_version}
+
+        class DenyObjectPermission(AllowAny):
+            def has_object_permission(self, request, view, obj):
+                return False
+
+        with mock.patch.object(tus_settings, "TUS_HEAD_CACHE", "default"):
+            # The headers are cached
+            set_cached_head_headers(upload, get_head_headers(upload))
+
+            # A view with object permissions doesn't use the cache
+            with mock.patch.object(UploadViewSet, "permission_classes", [DenyObjectPermission]):
+                result = self.client.head(url, headers=headers)
+            assert result.status_code == status.HTTP_403_FORBIDDEN
+
+            # Unless it's enabled explicitly
+            with mock.patch.object(UploadViewSet, "permission_classes", [DenyObjectPermission]):
+                with mock.patch.object(UploadViewSet, "head_cache_enabled", True, create=True):
+                    result = self.client.head(url, headers=headers)
+            assert result.status_code == status.HTTP_200_OK
+
+        # Neither does a view that filters the uploads
+        class FilteredUploadViewSet(UploadViewSet):
+            def get_queryset(self):
+                return super().get_queryset().none()
+
+        assert UploadViewSet().is_head_cache_enabled()
+        assert not FilteredUploadViewSet().is_head_cache_enabled()
+
+    def test_head_cache_not_overwritten(self):
+        # Create upload
+        upload = UploadFactory(
+            upload_metadata=json.dumps({"filename": "test_file.jpg"}),
+            upload_length=4,
+            expires=timezone.now() + timedelta(hours=1),
+        )
+        url = reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid})
+        headers = {"Tus-Resumable": tus_api_version}
+
+        with mock.patch.object(tus_settings, "TUS_HEAD_CACHE", "default"):
+            # A HEAD request read the upload before a PATCH request cached newer headers
+            stale_headers = get_head_headers(upload)
+            self.client.patch(
+                url,
+                data=b"12",
+                headers=dict(headers, **{"Upload-Offset": 0}),
+                content_type="application/offset+octet-stream",
+            )
+            add_cached_head_headers(upload, stale_headers)
+
+            # The newer headers are kept
+            result = self.client.head(url, headers=headers)
+            assert result["Upload-Offset"] == "2"
+
+            # A conflicting PATCH request invalidates the cache
+            set_cached_head_headers(upload, stale_headers)
+            result = self.client.patch(
+                url,
+                data=b"34",
+                headers=dict(headers, **{"Upload-Offset": 0}),
+                content_type="application/offset+octet-stream",
+            )
+            assert result.status_code == status.HTTP_409_CONFLICT
+            result = self.client.head(url, headers=headers)
+            assert result["Upload-Offset"] == "2"
+
+        # Cleanup file
+        upload.delete()
+
     def test_create_without_length(self):
         # Prepare creation headers
         headers = {
@@ -130,6 +281,9 @@ class ViewTests(APITestCase):
             reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
         )
 
+        # Cleanup file
+        upload.delete()
+
     def test_create_too_big(self):
         # Prepare creation headers
         headers = {
@@ -179,6 +333,129 @@ class ViewTests(APITestCase):
             reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
         )
 
+        # Cleanup file
+        upload.delete()
+
+    def test_create_stores_metadata_header(self):
+        # Prepare creation headers
+        upload_metadata = "filename {},type {}".format(
+            encode_base64_to_string("test_file.jpg"),
+            encode_base64_to_string("image/jpeg"),
+        )
+        headers = {
+            "Tus-Resumable": tus_api_version,
+            "Upload-Length": 100,
+            "Upload-Metadata": upload_metadata,
+        }
+
+        # Perform request
+        result = self.client.post(reverse("rest_framework_tus:api:upload-list"), headers=headers)
+
+        # Check status
+        assert result.status_code == status.HTTP_201_CREATED
+
+        # Retrieve upload
+        upload = get_upload_model().objects.all().first()
+
+        # Validate upload
+        assert upload.upload_metadata_header == upload_metadata
+
+        # The HEAD response returns the stored header
+        result = self.client.head(
+            reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+            headers={"Tus-Resumable": tus_api_version},
+        )
+        assert result["Upload-Metadata"] == upload_metadata
+
+        # Cleanup file
+        upload.delete()
+
+    def test_create_queries(self):
+        # Prepare creation headers
+        headers = {
+            "Tus-Resumable": tus_api_version,
+            "Upload-Length": 100,
+            "Upload-Metadata": encode_upload_metadata(
+                {
+                    "filename": "test_file.jpg",
+                },
+            ),
+        }
+
+        # Perform request, which should only insert the upload
+        with self.assertNumQueries(1):
+            result = self.client.post(reverse("rest_framework_tus:api:upload-list"), headers=headers)
+
+        # Check status
+        assert result.status_code == status.HTTP_201_CREATED
+
+        # Retrieve upload
+        upload = get_upload_model().objects.all().first()
+
+        # Validate upload
+        assert upload.expires is not None
+        assert os.path.isfile(upload.temporary_file_path)
+
+        # Cleanup file
+        upload.delete()
+
+    def test_create_preallocated(self):
+        # Prepare creation headers
+        headers = {
+            "Tus-Resumable": tus_api_version,
+            "Upload-Length": 100,
+        }
+
+        # Perform request
+        with mock.patch.object(tus_settings, "TUS_PREALLOCATE", True):
+            result = self.client.post(reverse("rest_framework_tus:api:upload-list"), headers=headers)
+
+        # Check status
+        assert result.status_code == status.HTTP_201_CREATED
+
+        # Validate upload
+        upload = get_upload_model().objects.all().first()
+        assert os.path.getsize(upload.temporary_file_path) == 100
+
+        # Cleanup file
+        upload.delete()
+
+    def test_create_insufficient_storage(self):
+        # Prepare creation headers
+        headers = {
+            "Tus-Resumable": tus_api_version,
+            "Upload-Length": 100,
+        }
+
+        # Perform request
+        with mock.patch.object(tus_settings, "TUS_PREALLOCATE", True):
+            with mock.patch("os.posix_fallocate", side_effect=OSError(errno.ENOSPC, "No space left on device")):
+                result = self.client.post(reverse("rest_framework_tus:api:upload-list"), headers=headers)
+
+        # Check status
+        assert result.status_code == status.HTTP_507_INSUFFICIENT_STORAGE
+
+        # Validate upload
+        assert not get_upload_model().objects.exists()
+
+    def test_create_insert_failure(self):
+        # Prepare creation headers
+        headers = {
+            "Tus-Resumable": tus_api_version,
+            "Upload-Length": 100,
+        }
+
+        # Perform request, the INSERT fails
+        with mock.patch.object(UploadSerializer, "save", side_effect=DatabaseError("Insert failed")):
+            with mock.patch.object(LocalFileChunkStore, "discard", wraps=LocalFileChunkStore.discard) as discard:
+                with self.assertRaises(DatabaseError):
+                    self.client.post(reverse("rest_framework_tus:api:upload-list"), headers=headers)
+
+        # The temporary file has been removed
+        temporary_file_path = discard.call_args[0][1]
+        assert temporary_file_path is not None
+        assert not os.path.exists(temporary_file_path)
+
     def test_terminate_while_saving(self):
         # Create upload
         upload = UploadFactory(
@@ -205,6 +482,25 @@ class ViewTests(APITestCase):
         # Verify existence
         assert get_upload_model().objects.filter(guid=upload.guid).exists()
 
+    def test_terminate_failed(self):
+        # Create upload, which failed to be saved
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=100,
+            state=states.FAILED,
+        )
+
+        # Perform request
+        result = self.client.delete(
+            reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+            headers={"Tus-Resumable": tus_api_version},
+        )
+
+        # Check result
+        assert result.status_code == status.HTTP_204_NO_CONTENT
+        assert not get_upload_model().objects.filter(guid=upload.guid).exists()
+
     def test_terminate(self):
         # Create upload
         upload = UploadFactory(
@@ -252,13 +548,574 @@ class ViewTests(APITestCase):
     def test_upload_with_sha512_checksum(self):
         self._test_upload_with_checksum("sha512")
 
+    def test_upload_with_crc32_checksum(self):
+        self._test_upload_with_checksum("crc32")
+
+    @skipUnless(crc32c, "crc32c is not installed")
+    def test_upload_with_crc32c_checksum(self):
+        self._test_upload_with_checksum("crc32c")
+
+    @skipUnless(xxhash, "xxhash is not installed")
+    def test_upload_with_xxh3_checksum(self):
+        self._test_upload_with_checksum("xxh3")
+
+    def test_upload_with_registered_checksum(self):
+        algorithms = list(tus_api_checksum_algorithms)
+        try:
+            with mock.patch.dict(checksum_hasher_factories):
+                register_checksum_algorithm("adler32", lambda: CRCHasher("adler32", zlib.adler32, value=1))
+                self._test_upload_with_checksum("adler32")
+        finally:
+            tus_api_checksum_algorithms[:] = algorithms
+
     def test_upload_with_unsupported_checksum(self):
         self._test_upload_with_checksum("ripemd160", expected_failure=status.HTTP_400_BAD_REQUEST)
 
     def test_upload_with_mismatching_checksum(self):
         self._test_upload_with_checksum("md5", checksum="md5 blabla", expected_failure=460)
 
-    def _test_upload_with_checksum(self, checksum_algorithm, checksum=None, expected_failure=None):
+    def test_upload_streaming(self):
+        with mock.patch.object(tus_settings, "TUS_STREAMING_ENABLED", True):
+            with mock.patch.object(tus_settings, "TUS_STREAMING_BUFFER_SIZE", 3):
+                self._test_upload_with_checksum(None)
+
+    def test_upload_streaming_with_checksum(self):
+        with mock.patch.object(tus_settings, "TUS_STREAMING_ENABLED", True):
+            with mock.patch.object(tus_settings, "TUS_STREAMING_BUFFER_SIZE", 3):
+                self._test_upload_with_checksum("sha256")
+
+    def test_upload_validate_chunk_view(self):
+        # Create upload
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=8,
+        )
+
+        # Strip the chunk, without copying it
+        chunks = []
+
+        def validate_chunk(view, offset, chunk_bytes):
+            chunks.append(chunk_bytes)
+            return chunk_bytes[:2]
+
+        with mock.patch.object(UploadViewSet, "validate_chunk", autospec=True, side_effect=validate_chunk):
+            with mock.patch.object(UploadViewSet, "validate_chunk_memoryview", True):
+                result = self.client.patch(
+                    reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+                    data=b"1234",
+                    headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+                    content_type="application/offset+octet-stream",
+                )
+
+        # Check result
+        assert result.status_code == status.HTTP_204_NO_CONTENT
+        assert result["Upload-Offset"] == "2"
+        assert isinstance(chunks[0], memoryview)
+        upload.refresh_from_db()
+        assert read_bytes(upload.temporary_file_path) == b"12"
+
+    def test_upload_validate_chunk_bytes(self):
+        # Create upload
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=8,
+        )
+
+        # The validator receives bytes by default, and may return a wider memoryview
+        chunks = []
+
+        def validate_chunk(view, offset, chunk_bytes):
+            chunks.append((offset, chunk_bytes))
+            return memoryview(chunk_bytes).cast("H")
+
+        with mock.patch.object(tus_settings, "TUS_STREAMING_ENABLED", True):
+            with mock.patch.object(tus_settings, "TUS_STREAMING_BUFFER_SIZE", 2):
+                with mock.patch.object(UploadViewSet, "validate_chunk", autospec=True, side_effect=validate_chunk):
+                    result = self.client.patch(
+                        reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+                        data=b"1234",
+                        headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+                        content_type="application/offset+octet-stream",
+                    )
+
+        # Check result
+        assert result.status_code == status.HTTP_204_NO_CONTENT
+        assert result["Upload-Offset"] == "4"
+        assert chunks == [(0, b"12"), (2, b"34")]
+        upload.refresh_from_db()
+        assert read_bytes(upload.temporary_file_path) == b"1234"
+
+    def test_upload_streaming_pipelined(self):
+        with mock.patch.object(tus_settings, "TUS_STREAMING_ENABLED", True):
+            with mock.patch.object(tus_settings, "TUS_PIPELINING_ENABLED", True):
+                with mock.patch.object(tus_settings, "TUS_STREAMING_BUFFER_SIZE", 3):
+                    self._test_upload_with_checksum("sha256")
+
+    def test_upload_with_mismatching_checksum_rolls_back(self):
+        # Create upload
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=8,
+        )
+
+        # Perform request
+        with mock.patch.object(tus_settings, "TUS_STREAMING_ENABLED", True):
+            result = self.client.patch(
+                reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+                data=b"1234",
+                headers={
+                    "Tus-Resumable": tus_api_version,
+                    "Upload-Offset": 0,
+                    "Upload-Checksum": create_checksum_header(b"4321", "sha1"),
+                },
+                content_type="application/offset+octet-stream",
+            )
+
+        # Check result
+        assert result.status_code == 460
+
+        # Make sure the written data has been rolled back
+        upload = get_upload_model().objects.get(guid=upload.guid)
+        assert upload.upload_offset == 0
+        assert os.path.getsize(upload.temporary_file_path) == 0
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_with_file_handle_cache(self):
+        with mock.patch.object(tus_settings, "TUS_FILE_HANDLE_CACHE_SIZE", 4):
+            upload = self._test_upload_with_checksum(None, cleanup=False)
+
+        # The temporary file has been closed once the upload was complete
+        assert upload.temporary_file_path not in file_handle_cache
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_with_page_cache_hints(self):
+        with mock.patch.object(tus_settings, "TUS_PAGE_CACHE_HINTS", True):
+            with mock.patch.object(tus_settings, "TUS_DIRECT_IO", True):
+                with mock.patch("os.posix_fadvise") as posix_fadvise:
+                    self._test_upload_with_checksum(None)
+
+        # Every chunk has been dropped from the page cache, and the final file has been read sequentially
+        advices = [call.args[3] for call in posix_fadvise.call_args_list]
+        assert advices.count(os.POSIX_FADV_DONTNEED) > 1
+        assert os.POSIX_FADV_SEQUENTIAL in advices
+
+    def test_upload_with_file_system_save_handler(self):
+        with mock.patch(
+            "rest_framework_tus.storage.TUS_SAVE_HANDLER_CLASS", "rest_framework_tus.storage.FileSystemSaveHandler"
+        ):
+            upload = self._test_upload_with_checksum(None, cleanup=False)
+
+        # The temporary file has been moved into the storage, with the permissions of a saved file
+        assert not os.path.exists(upload.temporary_file_path)
+        assert upload.uploaded_file.name.startswith("uploaded/")
+        assert os.stat(upload.uploaded_file.path).st_mode & 0o777 == 0o666 & ~get_umask()
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_with_file_system_save_handler_directory_permissions(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        storage = FileSystemStorage(location=location, directory_permissions_mode=0o750)
+        with mock.patch(
+            "rest_framework_tus.storage.TUS_SAVE_HANDLER_CLASS", "rest_framework_tus.storage.FileSystemSaveHandler"
+        ):
+            with mock.patch.object(get_upload_model()._meta.get_field("uploaded_file"), "storage", storage):
+                upload = self._test_upload_with_checksum(None, cleanup=False)
+
+        # The destination directory has been created with the permissions of the storage
+        assert not os.path.exists(upload.temporary_file_path)
+        assert os.stat(os.path.dirname(upload.uploaded_file.path)).st_mode & 0o777 == 0o750
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_with_file_system_save_handler_custom_save(self):
+        class CustomStorage(FileSystemStorage):
+            def _save(self, name, content):
+                self.saved = True
+                return super()._save(name, content)
+
+        storage = CustomStorage()
+        with mock.patch(
+            "rest_framework_tus.storage.TUS_SAVE_HANDLER_CLASS", "rest_framework_tus.storage.FileSystemSaveHandler"
+        ):
+            with mock.patch.object(get_upload_model()._meta.get_field("uploaded_file"), "storage", storage):
+                upload = self._test_upload_with_checksum(None, cleanup=False)
+
+        # The file has been saved through the storage
+        assert storage.saved
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_concatenation(self):
+        # Create partial uploads, and upload their data
+        partial_upload_urls = []
+        for data in [b"1234", b"567"]:
+            result = self.client.post(
+                reverse("rest_framework_tus:api:upload-list"),
+                headers={"Tus-Resumable": tus_api_version, "Upload-Length": len(data), "Upload-Concat": "partial"},
+            )
+            assert result.status_code == status.HTTP_201_CREATED
+            partial_upload_urls.append(result["Location"])
+
+            # The final URL can only refer to complete partial uploads
+            result = self.client.post(
+                reverse("rest_framework_tus:api:upload-list"),
+                headers={"Tus-Resumable": tus_api_version, "Upload-Concat": f"final;{result['Location']}"},
+            )
+            assert result.status_code == status.HTTP_400_BAD_REQUEST
+
+            result = self.client.patch(
+                partial_upload_urls[-1],
+                data=data,
+                headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+                content_type="application/offset+octet-stream",
+            )
+            assert result.status_code == status.HTTP_204_NO_CONTENT
+
+        # Partial uploads are not saved by themselves
+        partial_uploads = list(get_upload_model().objects.all())
+        assert {partial_upload.state for partial_upload in partial_uploads} == {states.RECEIVING}
+
+        result = self.client.head(partial_upload_urls[0], headers={"Tus-Resumable": tus_api_version})
+        assert result["Upload-Concat"] == "partial"
+
+        # Create final upload (with a view that overrides `perform_create`)
+        upload_concat = "final;{}".format(" ".join(partial_upload_urls))
+        perform_create = UploadViewSet.perform_create
+
+        def custom_perform_create(view, serializer):
+            perform_create(view, serializer)
+
+        with mock.patch.object(UploadViewSet, "perform_create", custom_perform_create):
+            result = self.client.post(
+                reverse("rest_framework_tus:api:upload-list"),
+                headers={"Tus-Resumable": tus_api_version, "Upload-Concat": upload_concat},
+            )
+        assert result.status_code == status.HTTP_201_CREATED
+
+        # Check result
+        upload = (
+            get_upload_model().objects.exclude(pk__in=[partial_upload.pk for partial_upload in partial_uploads]).get()
+        )
+        assert upload.state == states.DONE
+        assert upload.upload_length == upload.upload_offset == 7
+        assert read_bytes_from_field_file(upload.uploaded_file.file) == b"1234567"
+
+        result = self.client.head(result["Location"], headers={"Tus-Resumable": tus_api_version})
+        assert result["Upload-Concat"] == upload_concat
+        assert result["Upload-Length"] == "7"
+
+        # Final uploads can't be modified
+        result = self.client.patch(
+            reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+            data=b"8",
+            headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 7},
+            content_type="application/offset+octet-stream",
+        )
+        assert result.status_code == status.HTTP_403_FORBIDDEN
+
+        # Cleanup files
+        upload.delete()
+        for partial_upload in partial_uploads:
+            partial_upload.delete()
+
+    def test_upload_concatenation_failures(self):
+        # Create partial uploads, and upload their data
+        partial_upload_urls = []
+        with mock.patch.object(tus_settings, "TUS_UPLOAD_EXPIRES", None):
+            for data in [b"1234", b"567"]:
+                result = self.client.post(
+                    reverse("rest_framework_tus:api:upload-list"),
+                    headers={"Tus-Resumable": tus_api_version, "Upload-Length": len(data), "Upload-Concat": "partial"},
+                )
+                partial_upload_urls.append(result["Location"])
+                self.client.patch(
+                    partial_upload_urls[-1],
+                    data=data,
+                    headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+                    content_type="application/offset+octet-stream",
+                )
+
+        # Partial uploads expire, even if uploads don't
+        partial_uploads = list(get_upload_model().objects.order_by("pk"))
+        assert all(partial_upload.expires is not None for partial_upload in partial_uploads)
+
+        upload_concat = "final;{}".format(" ".join(partial_upload_urls))
+
+        # A partial upload is deleted while the final upload is created
+        get_partial_uploads = UploadViewSet.get_partial_uploads
+
+        def delete_partial_upload(view, urls):
+            result = get_partial_uploads(view, urls)
+            get_upload_model().objects.filter(pk=partial_uploads[1].pk).delete()
+            return result
+
+        with mock.patch.object(UploadViewSet, "get_partial_uploads", delete_partial_upload):
+            with mock.patch.object(
+                tus_settings, "TUS_UPLOAD_LOCK_CLASS", "rest_framework_tus.locks.DatabaseUploadLock"
+            ):
+                result = self.client.post(
+                    reverse("rest_framework_tus:api:upload-list"),
+                    headers={"Tus-Resumable": tus_api_version, "Upload-Concat": upload_concat},
+                )
+        assert result.status_code == status.HTTP_400_BAD_REQUEST
+
+        # The data of a partial upload is gone
+        os.remove(partial_uploads[0].temporary_file_path)
+        result = self.client.post(
+            reverse("rest_framework_tus:api:upload-list"),
+            headers={"Tus-Resumable": tus_api_version, "Upload-Concat": f"final;{partial_upload_urls[0]}"},
+        )
+        assert result.status_code == status.HTTP_409_CONFLICT
+
+        # No final upload has been created
+        assert list(get_upload_model().objects.values_list("pk", flat=True)) == [partial_uploads[0].pk]
+
+        # Cleanup files
+        for partial_upload in partial_uploads:
+            partial_upload.delete()
+
+    def test_upload_parallel_writes(self):
+        # Create upload
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=10,
+        )
+        url = reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid})
+
+        with mock.patch.object(tus_settings, "TUS_PARALLEL_WRITES", True):
+            # Send the chunks out of order
+            for offset, chunk, expected_offset in [(4, b"5678", 0), (8, b"90", 0), (0, b"1234", 10)]:
+                result = self.client.patch(
+                    url,
+                    data=chunk,
+                    headers={"Tus-Resumable": tus_api_version, "Upload-Offset": offset},
+                    content_type="application/offset+octet-stream",
+                )
+                assert result.status_code == status.HTTP_204_NO_CONTENT
+                assert result["Upload-Offset"] == str(expected_offset)
+
+                if offset == 4:
+                    result = self.client.head(url, headers={"Tus-Resumable": tus_api_version})
+                    assert result["Upload-Offset"] == "0"
+                    assert result["Upload-Missing-Ranges"] == "0-3,8-9"
+
+                    # A chunk that overlaps a received range is rejected
+                    result = self.client.patch(
+                        url,
+                        data=b"xx",
+                        headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 3},
+                        content_type="application/offset+octet-stream",
+                    )
+                    assert result.status_code == status.HTTP_409_CONFLICT
+
+                    # A chunk with a mismatching checksum doesn't leave its data behind
+                    result = self.client.patch(
+                        url,
+                        data=b"xx",
+                        headers={
+                            "Tus-Resumable": tus_api_version,
+                            "Upload-Offset": 8,
+                            "Upload-Checksum": create_checksum_header(b"90", "sha1"),
+                        },
+                        content_type="application/offset+octet-stream",
+                    )
+                    assert result.status_code == 460
+
+            # The upload is complete
+            result = self.client.patch(
+                url,
+                data=b"1",
+                headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+                content_type="application/offset+octet-stream",
+            )
+            assert result.status_code == status.HTTP_409_CONFLICT
+
+        # Check result
+        upload = get_upload_model().objects.get(pk=upload.pk)
+        assert upload.state == states.DONE
+        assert read_bytes_from_field_file(upload.uploaded_file.file) == b"1234567890"
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_with_storage_chunk_store(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+
+        with mock.patch.object(
+            tus_settings, "TUS_CHUNK_STORE_CLASS", "rest_framework_tus.chunkstores.StorageChunkStore"
+        ):
+            with mock.patch.object(StorageChunkStore, "get_storage", return_value=FileSystemStorage(location=location)):
+                upload = self._test_upload_with_checksum("md5", cleanup=False)
+
+                # The chunks are stored as separate objects
+                assert upload.temporary_file_path is None
+                assert len(StorageChunkStore.get_chunks(upload.guid)) > 1
+
+                # Cleanup file
+                upload.delete()
+                assert StorageChunkStore.get_chunks(upload.guid) == []
+
+    def test_upload_digest(self):
+        # The chunks are 4 bytes each, so they're aligned with the leaves
+        for leaf_size in [2, 4]:
+            self._test_upload_digest(leaf_size)
+
+    def test_upload_digest_unaligned(self):
+        # The chunks are 4 bytes each, so the second chunk starts within a leaf, which isn't read back
+        with mock.patch.object(tus_settings, "TUS_UPLOAD_DIGEST_ALGORITHM", "sha256"):
+            with mock.patch.object(tus_settings, "TUS_UPLOAD_DIGEST_LEAF_SIZE", 6):
+                upload = self._test_upload_with_checksum(None, cleanup=False)
+
+        # Check result, the upload doesn't have a digest
+        assert upload.upload_digest == ""
+        assert upload.get_digest_peaks() is None
+
+        # Cleanup file
+        upload.delete()
+
+    def _test_upload_digest(self, leaf_size):
+        with mock.patch.object(tus_settings, "TUS_UPLOAD_DIGEST_ALGORITHM", "sha256"):
+            with mock.patch.object(tus_settings, "TUS_UPLOAD_DIGEST_LEAF_SIZE", leaf_size):
+                upload = self._test_upload_with_checksum(None, cleanup=False)
+
+                # Perform request
+                result = self.client.head(
+                    reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+                    headers={"Tus-Resumable": tus_api_version},
+                )
+
+        # Compute expected digest, from leaves of a fixed size
+        blob = read_bytes_from_field_file(upload.uploaded_file.file)
+        leaf_digests = []
+        for index in range(0, len(blob), leaf_size):
+            chunk_digest_hasher = create_chunk_digest_hasher("sha256")
+            chunk_digest_hasher.update(blob[index : index + leaf_size])
+            leaf_digests.append(chunk_digest_hasher.hexdigest())
+
+        # Check result
+        peaks = []
+        for leaf_digest in leaf_digests:
+            peaks = merkle_append(peaks, leaf_digest, "sha256")
+        assert upload.get_digest_peaks() == peaks
+        assert len(peaks) <= len(leaf_digests)
+        assert result["Upload-Digest"] == "sha256 {}".format(merkle_tree_root(leaf_digests, "sha256"))
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_chunk_queries(self):
+        # Create upload that already received its first chunk
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=8,
+        )
+        upload.get_or_create_temporary_file()
+        upload.write_data(b"1234", 4)
+
+        # Perform request, which should only select the upload and update its offset
+        with self.assertNumQueries(2):
+            result = self.client.patch(
+                reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+                data=b"56",
+                headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 4},
+                content_type="application/offset+octet-stream",
+            )
+
+        # Check result
+        assert result.status_code == status.HTTP_204_NO_CONTENT
+        assert result["Upload-Offset"] == "6"
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_chunk_locked(self):
+        # Create upload
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=4,
+        )
+
+        # Perform request while another request holds the lock
+        with mock.patch.object(tus_settings, "TUS_UPLOAD_LOCK_CLASS", "rest_framework_tus.locks.FileUploadLock"):
+            with FileUploadLock(upload):
+                result = self.client.patch(
+                    reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+                    data=b"1234",
+                    headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+                    content_type="application/offset+octet-stream",
+                )
+
+        # Check result
+        assert result.status_code == status.HTTP_423_LOCKED
+
+        # Cleanup file
+        upload.delete()
+
+    def test_upload_complete_removes_lock_file(self):
+        # Create upload
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=4,
+        )
+        lock_file_path = FileUploadLock(upload).get_lock_file_path()
+
+        # Perform request
+        with mock.patch.object(tus_settings, "TUS_UPLOAD_LOCK_CLASS", "rest_framework_tus.locks.FileUploadLock"):
+            result = self.client.patch(
+                reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+                data=b"1234",
+                headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+                content_type="application/offset+octet-stream",
+            )
+
+        # Check result
+        assert result.status_code == status.HTTP_204_NO_CONTENT
+        assert not os.path.exists(lock_file_path)
+
+        # Cleanup files
+        upload.refresh_from_db()
+        upload.uploaded_file.delete()
+        upload.delete()
+
+    def test_upload_chunk_exceeding_upload_length(self):
+        # Create upload
+        upload = UploadFactory(
+            filename="test_data.txt",
+            upload_metadata=json.dumps({"filename": "test_data.txt"}),
+            upload_length=4,
+        )
+
+        # Perform request
+        result = self.client.patch(
+            reverse("rest_framework_tus:api:upload-detail", kwargs={"guid": upload.guid}),
+            data=b"12345",
+            headers={"Tus-Resumable": tus_api_version, "Upload-Offset": 0},
+            content_type="application/offset+octet-stream",
+        )
+
+        # Check result
+        assert result.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+        # Cleanup file
+        upload.delete()
+
+    def _test_upload_with_checksum(self, checksum_algorithm, checksum=None, expected_failure=None, cleanup=True):
         # Define blob
         blob = "Şởოè śấოρļể ẮŞĈİĪ-ŧểхŧ".encode()  # Make sure the data are **BYTES**!!!!
 
@@ -337,5 +1194,8 @@ class ViewTests(APITestCase):
         uploaded_data = read_bytes_from_field_file(upload.uploaded_file.file)
         assert uploaded_data == blob
 
+        if not cleanup:
+            return upload
+
         # Cleanup file
         upload.delete()
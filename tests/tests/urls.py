@@ -1,7 +1,9 @@
 from django.urls import include, path
 
+from rest_framework_tus.async_urls import urlpatterns as rest_framework_tus_async_urlpatterns
 from rest_framework_tus.urls import urlpatterns as rest_framework_tus_urlpatterns
 
 urlpatterns = [
     path(r"", include((rest_framework_tus_urlpatterns, "rest_framework_tus"), namespace="api")),
+    path(r"async/", include((rest_framework_tus_async_urlpatterns, "rest_framework_tus_async"), namespace="async")),
 ]